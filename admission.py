@@ -0,0 +1,206 @@
+# admission.py - admission control in front of the prediction endpoints
+# Under overload it is better to turn some clients away at once than to let
+# every request queue inside the server until they all time out. For the
+# guarded paths this ASGI middleware:
+#   * caps requests in flight (503 + Retry-After when full)
+#   * rate-limits each client with a token bucket (429 + Retry-After)
+#   * gives each request a deadline, so work for a client that has given up
+#     is dropped before inference (see MicroBatcher.submit)
+#   * enforces the upload size while the body streams in (413), instead of
+#     after the whole file has been buffered
+import contextvars
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from fastapi import HTTPException
+
+from batching import DeadlineExceeded
+from metrics import REJECTED_REQUESTS
+from responses import dumps
+
+_deadline = contextvars.ContextVar("request_deadline", default=None)
+
+
+def current_deadline():
+    """time.monotonic() deadline of the request being handled, or None"""
+    return _deadline.get()
+
+
+def check_deadline():
+    """Raise DeadlineExceeded if the current request's deadline has passed"""
+    deadline = _deadline.get()
+    if deadline is not None and time.monotonic() > deadline:
+        raise DeadlineExceeded("Request deadline exceeded before inference")
+
+
+class TokenBucket:
+    """rate tokens per second, up to burst; one token per request"""
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self):
+        """0.0 if a token was taken, else seconds until one is available"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class AdmissionController:
+    """
+    Limits and counters shared by AdmissionMiddleware and /stats/admission.
+
+    limits maps a path to its maximum upload size in bytes; other paths
+    pass through untouched. A limit or rate of 0 disables that check.
+    """
+
+    def __init__(self, limits, max_in_flight=64, rate_per_second=0.0, burst=10,
+                 timeout_seconds=30.0, retry_after=1, trust_forwarded_for=False, max_clients=10000):
+        self.limits = limits
+        self.max_in_flight = max_in_flight
+        self.rate_per_second = rate_per_second
+        self.burst = burst
+        self.timeout_seconds = timeout_seconds
+        self.retry_after = retry_after
+        self.trust_forwarded_for = trust_forwarded_for
+        self.max_clients = max_clients
+        self.in_flight = 0
+        self._buckets = OrderedDict()  # client -> TokenBucket, least recently seen first
+        self._lock = threading.Lock()
+        self._rejected = {}
+
+    async def handle(self, app, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.limits:
+            return await app(scope, receive, send)
+
+        max_bytes = self.limits[scope["path"]]
+        headers = dict(scope["headers"])
+        length = headers.get(b"content-length")
+        if max_bytes and length is not None and length.isdigit() and int(length) > max_bytes:
+            return await self._reject(send, 413, "upload_too_large", self._too_large_message(max_bytes))
+
+        if self.max_in_flight and self.in_flight >= self.max_in_flight:
+            return await self._reject(send, 503, "overloaded", "Server is busy, try again shortly",
+                                      self.retry_after)
+
+        if self.rate_per_second:
+            wait = self._bucket(self._client(scope, headers)).take()
+            if wait:
+                return await self._reject(send, 429, "rate_limited", "Too many requests from this client",
+                                          math.ceil(wait))
+
+        token = _deadline.set(time.monotonic() + self._timeout(headers)) if self.timeout_seconds else None
+        received = 0
+        started = False
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if max_bytes and message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_bytes:
+                    self._count("upload_too_large")
+                    raise HTTPException(status_code=413, detail=self._too_large_message(max_bytes))
+            return message
+
+        async def tracked_send(message):
+            nonlocal started
+            started = started or message["type"] == "http.response.start"
+            await send(message)
+
+        self.in_flight += 1
+        try:
+            await app(scope, limited_receive, tracked_send)
+        except HTTPException as e:
+            # Raised from limited_receive outside FastAPI's own handling
+            if started or e.status_code != 413:
+                raise
+            await self._respond(send, 413, e.detail)
+        finally:
+            self.in_flight -= 1
+            if token is not None:
+                _deadline.reset(token)
+
+    def _timeout(self, headers):
+        """Server timeout, or the client's own X-Request-Timeout (seconds) if shorter"""
+        requested = headers.get(b"x-request-timeout")
+        try:
+            return min(self.timeout_seconds, float(requested)) if requested else self.timeout_seconds
+        except ValueError:
+            return self.timeout_seconds
+
+    def _client(self, scope, headers):
+        forwarded = headers.get(b"x-forwarded-for")
+        if self.trust_forwarded_for and forwarded:
+            return forwarded.split(b",")[0].strip().decode("latin-1")
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+    def _bucket(self, client):
+        with self._lock:
+            bucket = self._buckets.get(client)
+            if bucket is None:
+                bucket = self._buckets[client] = TokenBucket(self.rate_per_second, self.burst)
+                while len(self._buckets) > self.max_clients:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(client)
+            return bucket
+
+    @staticmethod
+    def _too_large_message(max_bytes):
+        return f"Upload too large, maximum is {max_bytes / (1024 * 1024):g} MB"
+
+    def _count(self, reason):
+        with self._lock:
+            self._rejected[reason] = self._rejected.get(reason, 0) + 1
+        REJECTED_REQUESTS.inc(reason)
+
+    async def _reject(self, send, status, reason, detail, retry_after=None):
+        self._count(reason)
+        await self._respond(send, status, detail, retry_after)
+
+    @staticmethod
+    async def _respond(send, status, detail, retry_after=None):
+        body = dumps({"detail": detail})
+        headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+        if retry_after is not None:
+            headers.append((b"retry-after", str(retry_after).encode()))
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+    def stats(self):
+        with self._lock:
+            rejected = dict(self._rejected)
+            clients = len(self._buckets)
+        return {
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "rate_per_second": self.rate_per_second,
+            "burst": self.burst,
+            "timeout_seconds": self.timeout_seconds,
+            "tracked_clients": clients,
+            "rejected": rejected,
+        }
+
+
+class AdmissionMiddleware:
+    """Pure ASGI middleware, so rejected requests never reach FastAPI's body parsing"""
+
+    def __init__(self, app, controller):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        await self.controller.handle(self.app, scope, receive, send)
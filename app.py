@@ -1,21 +1,100 @@
 # app.py - COMPLETE VERSION WITH FULL JSON OUTPUT
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi import FastAPI, File, Header, UploadFile, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from PIL import Image
-import tensorflow as tf
+from fastapi.responses import JSONResponse, PlainTextResponse
+from contextlib import asynccontextmanager
 import numpy as np
-import json
-import io
-from disease_info import DISEASE_DATABASE
+import asyncio
+import time
+from typing import List
+import config
+from admission import AdmissionController, AdmissionMiddleware, check_deadline, current_deadline
+from batching import DeadlineExceeded, QueueFullError
+from cache import PredictionCache
+from gate import ImageGate, ImageRejected
+from hot_swap import LoadedModel, ModelManager
+from inference import InferenceExecutor
+from metrics import ERRORS, IN_FLIGHT, PREDICTIONS, REGISTRY, REQUEST_SECONDS, STAGE_SECONDS, TILES, Gauge
+from model_registry import open_registry
+from preprocessing import RESAMPLE, decode, normalize, open_image, resize
+from responses import FastJSONResponse, join_batch
+from startup import StartupState
+from streaming import StreamSession, dhash
+from tiling import TileGrid, summarize
+from utils import extract_archive_images
+
+_import_started = time.perf_counter()
+
+startup = StartupState()
+
+async def load_models():
+    """Load and warm up the version to serve (and the shadow version, if configured)"""
+    print("="*60)
+    print("LOADING TOMATO DISEASE DETECTION MODEL")
+    print("="*60)
+    await models.start(config.MODEL_VERSION or None)
+    active = models.active
+    startup.phases.update(active.phases)
+    startup.warmup = active.warmup
+    print(f"✓ Model {active.version} loaded ({active.backend.name}: {active.metadata['model_path']}) "
+          f"with {len(active.class_names)} classes")
+    print(f"✓ Warm-up done for batch sizes {config.WARMUP_BATCH_SIZES}")
+    
+    if config.SHADOW_VERSION:
+        with startup.phase("load_shadow_model"):
+            await models.start_shadow(config.SHADOW_VERSION, config.SHADOW_SAMPLE_RATE, config.SHADOW_MAX_PENDING)
+        print(f"✓ Shadow model {config.SHADOW_VERSION} scoring {config.SHADOW_SAMPLE_RATE:.0%} of traffic")
+
+async def load_in_background():
+    try:
+        await load_models()
+    except Exception as e:
+        startup.fail(e)
+        print(f"✗ Model loading failed: {startup.error}")
+        return
+    startup.mark_ready()
+    print(f"✓ API Ready! Startup phases (ms): {startup.phases}")
+    print("="*60)
+    if config.MODEL_WATCH_SECONDS > 0:
+        await models.watch(config.MODEL_WATCH_SECONDS)
+
+@asynccontextmanager
+async def lifespan(app):
+    # The server starts answering /health right away; /ready waits for warm-up
+    startup.phases["import"] = round((time.perf_counter() - _import_started) * 1000, 2)
+    loader = asyncio.create_task(load_in_background())
+    yield
+    loader.cancel()
+    await models.stop()
+    decode_executor.shutdown()
+    inference_executor.shutdown()
+    shadow_executor.shutdown()
 
 # Initialize FastAPI
 app = FastAPI(
     title="Tomato Disease Detection API",
     description="ML API for Karnataka Smart Agriculture - Hackathon 2025",
-    version="1.0"
+    version="1.0",
+    lifespan=lifespan
 )
 
-# CORS - Allow frontend to call API
+# Admission control - shed load before a request is parsed or queued
+admission = AdmissionController(
+    limits={
+        "/predict": int(config.MAX_UPLOAD_MB * 1024 * 1024),
+        "/predict/batch": int(config.MAX_BATCH_UPLOAD_MB * 1024 * 1024),
+        "/predict/tiles": int(config.MAX_TILED_UPLOAD_MB * 1024 * 1024),
+    },
+    max_in_flight=config.ADMISSION_MAX_IN_FLIGHT,
+    rate_per_second=config.RATE_LIMIT_PER_SECOND,
+    burst=config.RATE_LIMIT_BURST,
+    timeout_seconds=config.REQUEST_TIMEOUT_SECONDS,
+    retry_after=config.RETRY_AFTER_SECONDS,
+    trust_forwarded_for=config.TRUST_FORWARDED_FOR,
+)
+app.add_middleware(AdmissionMiddleware, controller=admission)
+
+# CORS - Allow frontend to call API (added last so it wraps admission responses too)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -24,16 +103,59 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Load model
-print("="*60)
-print("LOADING TOMATO DISEASE DETECTION MODEL")
-print("="*60)
-model = tf.keras.models.load_model('models/best_model.h5')
-with open('models/class_names.json', 'r') as f:
-    class_names = json.load(f)
-print(f"✓ Model loaded with {len(class_names)} classes")
-print("✓ API Ready!")
-print("="*60)
+# Blocking work runs on these pools, never on the event loop
+decode_executor = InferenceExecutor(config.DECODE_WORKERS, name="decode")
+inference_executor = InferenceExecutor(config.INFERENCE_WORKERS, name="inference")
+shadow_executor = InferenceExecutor(1, name="shadow")
+
+# Model versions from the registry; each has its own micro-batcher, so
+# concurrent uploads share one forward pass of the version they started on
+models = ModelManager(
+    open_registry(),
+    inference_executor,
+    batcher_options={
+        "max_batch_size": config.MAX_BATCH_SIZE,
+        "max_wait_ms": config.MAX_BATCH_WAIT_MS,
+        "max_queue_size": config.MAX_QUEUE_SIZE,
+    },
+    shadow_executor=shadow_executor,
+    img_size=config.IMG_SIZE,
+    warmup_batch_sizes=config.WARMUP_BATCH_SIZES,
+    warmup_rounds=config.WARMUP_ROUNDS,
+    num_threads=config.TFLITE_THREADS
+)
+
+REGISTRY.register(Gauge(
+    "krishi_batch_queue_depth",
+    "Images waiting for the next forward pass",
+    callback=lambda: models.active.batcher.stats()["queue_depth"] if models.active else 0
+))
+
+# Open /ws/scan sessions
+streams = set()
+REGISTRY.register(Gauge(
+    "krishi_open_streams",
+    "WebSocket scanning sessions currently open",
+    callback=lambda: len(streams)
+))
+
+# Non-leaf uploads are turned away before they cost a forward pass
+image_gate = ImageGate(
+    enabled=config.GATE_ENABLED,
+    min_size=config.GATE_MIN_SIZE,
+    max_aspect_ratio=config.GATE_MAX_ASPECT_RATIO,
+    min_green_ratio=config.GATE_MIN_GREEN_RATIO,
+    min_contrast=config.GATE_MIN_CONTRAST
+)
+
+# Repeated uploads of the same photo skip decode and inference
+prediction_cache = PredictionCache(
+    max_entries=config.CACHE_MAX_ENTRIES,
+    max_bytes=int(config.CACHE_MAX_MB * 1024 * 1024),
+    ttl_seconds=config.CACHE_TTL_SECONDS,
+    disk_dir=config.CACHE_DIR,
+    executor=decode_executor
+) if config.CACHE_ENABLED else None
 
 @app.get("/")
 def home():
@@ -42,113 +164,513 @@ def home():
         "message": "Tomato Disease Detection API",
         "status": "Running",
         "version": "1.0",
+        "model_version": models.active.version if models.active else None,
         "model_accuracy": "88-90%",
-        "classes": len(class_names),
+        "classes": len(models.active.class_names) if models.active else 0,
         "endpoint": "POST /predict"
     }
 
 @app.get("/health")
 def health_check():
-    """Health check for deployment"""
+    """Health check for deployment (liveness, see /ready for traffic readiness)"""
     return {
         "status": "healthy",
-        "model_loaded": model is not None,
-        "classes_loaded": len(class_names)
+        "model_loaded": models.active is not None,
+        "backend": models.active.backend.name if models.active else None,
+        "model_version": models.active.version if models.active else None,
+        "classes_loaded": len(models.active.class_names) if models.active else 0,
+        "ready": startup.ready
     }
 
+@app.get("/ready")
+def readiness_check():
+    """Readiness probe: 200 only after the model is loaded and warmed up"""
+    return JSONResponse(
+        status_code=200 if startup.ready else 503,
+        content=startup.report()
+    )
+
 @app.get("/classes")
 def get_classes():
     """Get all disease classes"""
+    class_names = models.active.class_names if models.active else {}
     return {
         "total_classes": len(class_names),
         "classes": class_names
     }
 
+@app.get("/stats/batching")
+def batching_stats():
+    """Batch-size distribution of the inference scheduler"""
+    return {
+        **(models.active.batcher.stats() if models.active else {}),
+        "executors": [decode_executor.stats(), inference_executor.stats(), shadow_executor.stats()]
+    }
+
+@app.get("/metrics")
+def prometheus_metrics():
+    """Prometheus scrape endpoint: per-stage latency histograms, counters, memory"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/stats/cache")
+def cache_stats():
+    """Prediction cache hit/miss counters"""
+    if prediction_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **prediction_cache.stats()}
+
+@app.get("/stats/gate")
+def gate_stats():
+    """Images checked and rejected by the pre-inference gate"""
+    return image_gate.stats()
+
+@app.get("/stats/admission")
+def admission_stats():
+    """Requests in flight and requests turned away by admission control"""
+    return admission.stats()
+
+@app.get("/stats/streams")
+def stream_stats():
+    """Frame counters of every open /ws/scan session"""
+    return {
+        "open": len(streams),
+        "max_connections": config.STREAM_MAX_CONNECTIONS,
+        "sessions": [session.stats() for session in streams],
+    }
+
+@app.get("/stats/shadow")
+def shadow_stats():
+    """Agreement and latency of the shadow model against the active one"""
+    if models.shadow is None:
+        return {"enabled": False}
+    return {"enabled": True, **models.shadow.stats()}
+
+def require_admin(token):
+    if not config.ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Model administration is disabled (set KRISHI_ADMIN_TOKEN)")
+    if token != config.ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+@app.get("/models")
+def list_models():
+    """Published model versions and which ones are loaded"""
+    return {
+        **models.status(),
+        "versions": models.registry.versions(),
+    }
+
+@app.post("/models/activate/{version}")
+async def activate_model(version: str, x_admin_token: str = Header(None)):
+    """Load and warm up a version in the background, then switch traffic to it"""
+    require_admin(x_admin_token)
+    try:
+        return await models.activate(version)
+    except (KeyError, ValueError) as e:
+        raise HTTPException(status_code=404, detail=str(e).strip("'\""))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Could not load model {version}: {e}")
+
+@app.post("/models/rollback")
+async def rollback_model(x_admin_token: str = Header(None)):
+    """Switch back to the previous version (still loaded, so this is instant)"""
+    require_admin(x_admin_token)
+    try:
+        return await models.rollback()
+    except LookupError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@app.post("/models/shadow/{version}")
+async def start_shadow(version: str, sample_rate: float = config.SHADOW_SAMPLE_RATE,
+                       x_admin_token: str = Header(None)):
+    """Score a sampled fraction of live traffic with a candidate version, off the critical path"""
+    require_admin(x_admin_token)
+    if not 0 < sample_rate <= 1:
+        raise HTTPException(status_code=400, detail="sample_rate must be in (0, 1]")
+    try:
+        return await models.start_shadow(version, sample_rate, config.SHADOW_MAX_PENDING)
+    except (KeyError, ValueError) as e:
+        raise HTTPException(status_code=404, detail=str(e).strip("'\""))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Could not load model {version}: {e}")
+
+@app.delete("/models/shadow")
+async def stop_shadow(x_admin_token: str = Header(None)):
+    require_admin(x_admin_token)
+    return await models.stop_shadow()
+
+def decode_image(image_data: bytes) -> np.ndarray:
+    """
+    Decode uploaded bytes into a normalized (224, 224, 3) float32 array
+    Raises: ImageRejected if the image fails the gate
+    """
+    size = (config.IMG_SIZE, config.IMG_SIZE)
+    with STAGE_SECONDS.time("decode"):
+        image = open_image(image_data)
+        image_gate.check_header(image)  # before paying for the decode
+        image = decode(image, size)
+        image.load()
+    with STAGE_SECONDS.time("preprocess"):
+        pixels = np.asarray(resize(image, size), dtype=np.uint8)
+    with STAGE_SECONDS.time("gate"):
+        image_gate.check_pixels(pixels)
+    return normalize(pixels)
+
+def decode_full(image_data: bytes) -> np.ndarray:
+    """
+    Decode an upload as upright uint8 RGB at full resolution, for /predict/tiles
+    (images whose short side is below one window are scaled up to it)
+    """
+    with STAGE_SECONDS.time("decode"):
+        image = open_image(image_data)
+        image_gate.check_header(image)
+        width, height = image.size
+        if width * height > config.TILE_MAX_MEGAPIXELS * 1e6:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Image has {width * height / 1e6:.0f} megapixels, maximum is {config.TILE_MAX_MEGAPIXELS:g}"
+            )
+        image = decode(image, image.size)
+        if min(image.size) < config.IMG_SIZE:
+            scale = config.IMG_SIZE / min(image.size)
+            image = image.resize((max(config.IMG_SIZE, round(image.width * scale)),
+                                  max(config.IMG_SIZE, round(image.height * scale))), RESAMPLE)
+        return np.asarray(image, dtype=np.uint8)
+
+def decode_frame(frame_data: bytes):
+    """decode_image plus the frame's difference hash, in one pool task"""
+    pixels = decode_image(frame_data)
+    return pixels, dhash(pixels)
+
+def require_ready():
+    if not startup.ready:
+        raise HTTPException(
+            status_code=503,
+            detail="Model is still loading, try again shortly",
+            headers={"Retry-After": "5"}
+        )
+
+def retry_after() -> dict:
+    return {"Retry-After": str(config.RETRY_AFTER_SECONDS)}
+
+def render_prediction(model: LoadedModel, probabilities: np.ndarray, filename: str = None) -> bytes:
+    """Turn one row of class probabilities into the full disease analysis response (JSON bytes)"""
+    started = time.perf_counter()
+    predicted_class, body = model.renderer.render(probabilities, filename)
+    PREDICTIONS.inc(predicted_class)
+    STAGE_SECONDS.observe(time.perf_counter() - started, "postprocess")
+    return body
+
+async def predict_image(model: LoadedModel, image_data: bytes) -> np.ndarray:
+    """Decode one upload and run it through the model's batching scheduler"""
+    check_deadline()
+    img_array = await decode_executor.run(decode_image, image_data)
+    started = time.perf_counter()
+    probabilities = await model.batcher.submit(img_array, deadline=current_deadline())
+    
+    # Sampled images are scored again by the shadow model after this returns
+    shadow = models.shadow
+    if shadow is not None and shadow.should_sample():
+        shadow.submit(img_array, probabilities, (time.perf_counter() - started) * 1000, model)
+    return probabilities
+
+async def cache_key(image_data: bytes, model: LoadedModel) -> str:
+    # Hashing a multi-megabyte photo is too slow for the event loop
+    return await decode_executor.run(PredictionCache.key, image_data, model.version)
+
 @app.post("/predict")
 async def predict_disease(file: UploadFile = File(...)):
     """
     Main Prediction Endpoint
     Upload tomato leaf image and get complete disease analysis
     """
+    require_ready()
+    IN_FLIGHT.inc()
+    started = time.perf_counter()
     try:
-        # Read and preprocess image
-        image_data = await file.read()
-        image = Image.open(io.BytesIO(image_data)).convert('RGB')
-        
-        # Resize to model input size
-        image = image.resize((224, 224))
-        img_array = np.array(image) / 255.0
-        img_array = np.expand_dims(img_array, axis=0)
-        
-        # Predict
-        predictions = model.predict(img_array, verbose=0)
-        
-        # Get top prediction
-        predicted_idx = np.argmax(predictions[0])
-        confidence = float(predictions[0][predicted_idx] * 100)
-        predicted_class = class_names[str(predicted_idx)]
-        
-        # Get top 3 predictions
-        top_3_idx = np.argsort(predictions[0])[-3:][::-1]
-        top_3_predictions = [
-            {
-                "disease": class_names[str(i)],
-                "confidence": round(float(predictions[0][i] * 100), 2)
-            }
-            for i in top_3_idx
-        ]
-        
-        # Get complete disease information from database
-        disease_data = DISEASE_DATABASE.get(predicted_class, {
-            "disease_name": predicted_class,
-            "description": "Disease information not available",
-            "severity": "Unknown",
-            "treatment": {
-                "chemical": "Consult agricultural expert",
-                "organic": "Maintain plant hygiene",
-                "frequency": "As needed"
-            },
-            "prevention": ["Regular monitoring"],
-            "cultural_practices": ["Good sanitation"]
-        })
+        with STAGE_SECONDS.time("upload_read"):
+            image_data = await file.read()
         
-        # Calculate risk level
-        severity = disease_data.get("severity", "Unknown")
-        if severity == "None":
-            risk_level = "NONE"
-        elif severity == "Very High":
-            risk_level = "CRITICAL" if confidence > 80 else "HIGH"
-        elif severity == "High":
-            risk_level = "HIGH" if confidence > 75 else "MEDIUM"
-        elif severity == "Medium":
-            risk_level = "MEDIUM" if confidence > 70 else "LOW"
-        else:
-            risk_level = "LOW"
-        
-        # Build complete JSON response
-        response = {
-            "success": True,
-            "predicted_class": predicted_class,
-            "disease": disease_data["disease_name"],
-            "confidence": round(confidence, 2),
-            "risk_level": risk_level,
-            "description": disease_data["description"],
-            "severity": disease_data["severity"],
-            "treatment": disease_data["treatment"],
-            "prevention": disease_data["prevention"],
-            "cultural_practices": disease_data["cultural_practices"],
-            "top_3_predictions": top_3_predictions,
-            "model_version": "1.0",
-            "timestamp": None  # Frontend can add timestamp
-        }
-        
-        return response
+        # One model version serves the whole request, even across a hot swap
+        with models.active.use() as model:
+            # Predict (batched with other in-flight requests), reusing cached results
+            if prediction_cache is not None:
+                key = await cache_key(image_data, model)
+                probabilities = await prediction_cache.get_or_compute(
+                    key, lambda: predict_image(model, image_data)
+                )
+            else:
+                probabilities = await predict_image(model, image_data)
+            
+            body = render_prediction(model, probabilities)
+        with STAGE_SECONDS.time("serialize"):
+            return FastJSONResponse(body)
         
+    except ImageRejected as e:
+        ERRORS.inc("rejected")
+        raise HTTPException(status_code=422, detail={"error": str(e), "reason": e.reason})
+    except QueueFullError as e:
+        ERRORS.inc("queue_full")
+        raise HTTPException(status_code=503, detail=str(e), headers=retry_after())
+    except DeadlineExceeded as e:
+        ERRORS.inc("deadline_exceeded")
+        raise HTTPException(status_code=503, detail=str(e), headers=retry_after())
     except Exception as e:
+        ERRORS.inc("prediction_failed")
         raise HTTPException(
             status_code=500,
             detail=f"Prediction failed: {str(e)}"
         )
+    finally:
+        IN_FLIGHT.dec()
+        REQUEST_SECONDS.observe(time.perf_counter() - started, "predict")
+
+@app.post("/predict/batch")
+async def predict_batch(files: List[UploadFile] = File(...)):
+    """
+    Batch Prediction Endpoint
+    Upload many leaf images (or zip/tar archives of them) in one request.
+    Returns one result per image, in upload order; a bad image only fails its own entry.
+    """
+    require_ready()
+    IN_FLIGHT.inc()
+    started = time.perf_counter()
+    try:
+        with models.active.use() as model:
+            body = await score_uploads(files, model)
+        with STAGE_SECONDS.time("serialize"):
+            return FastJSONResponse(body)
+    finally:
+        IN_FLIGHT.dec()
+        REQUEST_SECONDS.observe(time.perf_counter() - started, "batch")
+
+@app.post("/predict/tiles")
+async def predict_tiles(file: UploadFile = File(...), overlap: float = config.TILE_OVERLAP,
+                        min_green: float = config.TILE_MIN_GREEN_RATIO):
+    """
+    Tiled Analysis Endpoint
+    Upload a high-resolution field or drone photo. Overlapping 224x224 windows of the
+    full image are scored; returns a per-tile class grid, a disease heatmap and
+    field-level disease proportions. Background and soil windows are skipped.
+    """
+    require_ready()
+    if not 0 <= overlap < 1:
+        raise HTTPException(status_code=422, detail="overlap must be at least 0 and below 1")
+    IN_FLIGHT.inc()
+    started = time.perf_counter()
+    try:
+        with STAGE_SECONDS.time("upload_read"):
+            image_data = await file.read()
+        with models.active.use() as model:
+            body = await analyze_tiles(image_data, model, overlap, min_green)
+        with STAGE_SECONDS.time("serialize"):
+            return FastJSONResponse(body)
+    
+    except HTTPException:
+        raise
+    except ImageRejected as e:
+        ERRORS.inc("rejected")
+        raise HTTPException(status_code=422, detail={"error": str(e), "reason": e.reason})
+    except DeadlineExceeded as e:
+        ERRORS.inc("deadline_exceeded")
+        raise HTTPException(status_code=503, detail=str(e), headers=retry_after())
+    except Exception as e:
+        ERRORS.inc("prediction_failed")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Prediction failed: {str(e)}"
+        )
+    finally:
+        IN_FLIGHT.dec()
+        REQUEST_SECONDS.observe(time.perf_counter() - started, "tiles")
+
+async def analyze_tiles(image_data: bytes, model: LoadedModel, overlap: float, min_green: float) -> dict:
+    """
+    Decode at full resolution, drop background windows, then score the rest
+    TILE_BATCH_SIZE at a time: the next batch is cut from the image while the
+    current one runs, so at most two batches of windows exist at once.
+    """
+    pixels = await decode_executor.run(decode_full, image_data)
+    grid = TileGrid(pixels.shape[0], pixels.shape[1], config.IMG_SIZE, overlap)
+    green = await decode_executor.run(grid.green_fractions, pixels)
+    cells = [(int(row), int(col)) for row, col in np.argwhere(green >= min_green)]
+    TILES.inc("analyzed", amount=len(cells))
+    TILES.inc("background", amount=green.size - len(cells))
+    if not cells:
+        raise ImageRejected("not_leaf")
+    
+    chunks = [cells[start:start + config.TILE_BATCH_SIZE] for start in range(0, len(cells), config.TILE_BATCH_SIZE)]
+    outputs = []
+    next_batch = asyncio.ensure_future(decode_executor.run(grid.batch, pixels, chunks[0]))
+    for i in range(len(chunks)):
+        batch = await next_batch
+        if i + 1 < len(chunks):
+            next_batch = asyncio.ensure_future(decode_executor.run(grid.batch, pixels, chunks[i + 1]))
+        try:
+            check_deadline()
+            outputs.append(np.asarray(await inference_executor.run(model.backend.predict, batch)))
+        except BaseException:
+            if i + 1 < len(chunks):
+                next_batch.cancel()
+            raise
+    probabilities = np.concatenate(outputs)
+    
+    return {
+        "success": True,
+        "model_version": model.version,
+        "image": {"width": int(pixels.shape[1]), "height": int(pixels.shape[0])},
+        "tile_size": grid.tile,
+        "stride": grid.stride,
+        "tiles": {"total": int(green.size), "analyzed": len(cells), "background": int(green.size - len(cells))},
+        **summarize(grid, cells, probabilities, model.class_names),
+    }
+
+async def score_uploads(files: List[UploadFile], model: LoadedModel) -> bytes:
+    """
+    Unpack, decode and score every uploaded image for /predict/batch.
+    Successful results are JSON bytes, failures small dicts; both are joined
+    into the response body at the end.
+    """
+    # Collect (filename, bytes), unpacking any archives. The body limit only
+    # bounds compressed bytes, so unpacked images get the /predict limit each
+    # and the /predict/batch limit together
+    uploads = []
+    unpacked_budget = int(config.MAX_BATCH_UPLOAD_MB * 1024 * 1024)
+    for file in files:
+        with STAGE_SECONDS.time("upload_read"):
+            data = await file.read()
+        try:
+            archive_images = extract_archive_images(
+                data, config.MAX_BATCH_FILES,
+                max_file_bytes=int(config.MAX_UPLOAD_MB * 1024 * 1024),
+                max_total_bytes=unpacked_budget
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Could not read archive {file.filename}: {e}")
+        
+        if archive_images is None:
+            uploads.append((file.filename, data))
+        else:
+            uploads.extend(archive_images)
+            unpacked_budget -= sum(len(image) for _, image in archive_images)
+        
+        if len(uploads) > config.MAX_BATCH_FILES:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Too many images, maximum is {config.MAX_BATCH_FILES} per request"
+            )
+    
+    results = [None] * len(uploads)
+    keys = [None] * len(uploads)
+    
+    # Answer repeated images from the cache
+    pending = list(range(len(uploads)))
+    if prediction_cache is not None:
+        keys = await asyncio.gather(*[cache_key(data, model) for _, data in uploads])
+        pending = []
+        cached = await asyncio.gather(*[prediction_cache.get(key) for key in keys])
+        for i, probabilities in enumerate(cached):
+            if probabilities is None:
+                pending.append(i)
+            else:
+                results[i] = render_prediction(model, probabilities, uploads[i][0])
+    
+    # Decode the rest in parallel
+    decoded = dict(zip(pending, await asyncio.gather(
+        *[decode_executor.run(decode_image, uploads[i][1]) for i in pending],
+        return_exceptions=True
+    )))
+    
+    good = []
+    for i in pending:
+        if isinstance(decoded[i], ImageRejected):
+            ERRORS.inc("rejected")
+            results[i] = {
+                "filename": uploads[i][0],
+                "success": False,
+                "error": str(decoded[i]),
+                "reason": decoded[i].reason
+            }
+        elif isinstance(decoded[i], Exception):
+            ERRORS.inc("invalid_image")
+            results[i] = {
+                "filename": uploads[i][0],
+                "success": False,
+                "error": f"Could not decode image: {decoded[i]}"
+            }
+        else:
+            good.append(i)
+    
+    # One forward pass per fixed-size chunk
+    for start in range(0, len(good), config.BATCH_CHUNK_SIZE):
+        chunk = good[start:start + config.BATCH_CHUNK_SIZE]
+        try:
+            check_deadline()
+        except DeadlineExceeded as e:
+            ERRORS.inc("deadline_exceeded")
+            raise HTTPException(status_code=503, detail=str(e), headers=retry_after())
+        images = np.stack([decoded[i] for i in chunk])
+        try:
+            predictions = await inference_executor.run(model.backend.predict, images)
+        except Exception as e:
+            ERRORS.inc("prediction_failed", amount=len(chunk))
+            for i in chunk:
+                results[i] = {
+                    "filename": uploads[i][0],
+                    "success": False,
+                    "error": f"Prediction failed: {e}"
+                }
+            continue
+        
+        if prediction_cache is not None:
+            await asyncio.gather(*[prediction_cache.put(keys[i], p) for i, p in zip(chunk, predictions)])
+        for i, probabilities in zip(chunk, predictions):
+            results[i] = render_prediction(model, probabilities, uploads[i][0])
+    
+    succeeded = sum(1 for result in results if isinstance(result, bytes))
+    return join_batch(
+        results,
+        success=succeeded > 0,
+        total_images=len(results),
+        succeeded=succeeded,
+        failed=len(results) - succeeded
+    )
+
+@app.websocket("/ws/scan")
+async def scan_stream(websocket: WebSocket):
+    """
+    Live Scanning Endpoint
+    Send camera frames (JPEG/PNG/WebP bytes) as binary messages; each frame
+    that gets scored is answered with a JSON prediction smoothed over recent frames.
+    """
+    if not startup.ready or len(streams) >= config.STREAM_MAX_CONNECTIONS:
+        await websocket.close(code=1013)  # try again later
+        return
+    await websocket.accept()
+
+    async def decode(frame_data):
+        return await decode_executor.run(decode_frame, frame_data)
+
+    async def predict(pixels):
+        # Frames share the batching queue (and forward passes) with every other stream and upload
+        with models.active.use() as model:
+            return model, await model.batcher.submit(pixels)
+
+    session = StreamSession(
+        websocket, decode, predict,
+        max_frame_bytes=int(config.STREAM_MAX_FRAME_MB * 1024 * 1024),
+        duplicate_distance=config.STREAM_DUPLICATE_DISTANCE,
+        scene_change_distance=config.STREAM_SCENE_CHANGE_DISTANCE,
+        smoothing=config.STREAM_SMOOTHING
+    )
+    streams.add(session)
+    try:
+        await session.run()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        streams.discard(session)
 
 if __name__ == "__main__":
     import uvicorn
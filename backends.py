@@ -0,0 +1,231 @@
+# backends.py - pluggable model runtimes for the API
+# Every backend exposes predict(images) taking a float32 (N, 224, 224, 3) batch
+# scaled to [0, 1] and returning (N, classes) softmax probabilities.
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+import config
+from inference import compile_predict_fn
+from metrics import CASCADE_IMAGES
+
+
+class KerasBackend:
+    """Full TensorFlow/Keras model (.h5) behind a traced forward pass"""
+
+    name = "keras"
+
+    def __init__(self, model_path, img_size=224):
+        import tensorflow as tf
+
+        self.model_path = model_path
+        self.model = tf.keras.models.load_model(model_path)
+        self._predict = compile_predict_fn(self.model, img_size)
+
+    def predict(self, images):
+        return self._predict(images)
+
+
+def _load_interpreter_class():
+    """Prefer the standalone tflite_runtime wheel so serving nodes don't need TensorFlow"""
+    try:
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError:
+        import tensorflow as tf
+        Interpreter = tf.lite.Interpreter
+    return Interpreter
+
+
+class TFLiteBackend:
+    """
+    TensorFlow Lite flatbuffer run through the TFLite interpreter.
+
+    An interpreter is not thread-safe and re-allocating its tensors for every
+    new batch size is slow, so batches are padded up to a power of two and
+    each padded size gets its own interpreter and lock. All interpreters
+    memory-map the same .tflite file.
+    """
+
+    name = "tflite"
+
+    def __init__(self, model_path, num_threads=None, max_batch_size=64):
+        self.model_path = model_path
+        self.num_threads = num_threads
+        self.max_batch_size = max_batch_size
+        self._Interpreter = _load_interpreter_class()
+        self._interpreters = {}
+        self._lock = threading.Lock()
+
+        # Load the batch-1 interpreter now so a bad file fails at startup
+        self._get_interpreter(1)
+
+    def _bucket(self, n):
+        size = 1
+        while size < n:
+            size *= 2
+        return min(size, self.max_batch_size)
+
+    def _get_interpreter(self, batch_size):
+        with self._lock:
+            entry = self._interpreters.get(batch_size)
+            if entry is None:
+                interpreter = self._Interpreter(model_path=self.model_path, num_threads=self.num_threads)
+                input_index = interpreter.get_input_details()[0]["index"]
+                output_index = interpreter.get_output_details()[0]["index"]
+                input_shape = interpreter.get_input_details()[0]["shape"]
+                interpreter.resize_tensor_input(
+                    input_index, [batch_size, *input_shape[1:]], strict=False
+                )
+                interpreter.allocate_tensors()
+                entry = (interpreter, input_index, output_index, threading.Lock())
+                self._interpreters[batch_size] = entry
+            return entry
+
+    def _run(self, images):
+        n = len(images)
+        batch_size = self._bucket(n)
+        if batch_size > n:
+            padding = np.zeros((batch_size - n, *images.shape[1:]), dtype=np.float32)
+            images = np.concatenate([images, padding])
+
+        interpreter, input_index, output_index, lock = self._get_interpreter(batch_size)
+        with lock:
+            interpreter.set_tensor(input_index, images)
+            interpreter.invoke()
+            return interpreter.get_tensor(output_index)[:n].copy()
+
+    def predict(self, images):
+        images = np.ascontiguousarray(images, dtype=np.float32)
+        if len(images) <= self.max_batch_size:
+            return self._run(images)
+        return np.concatenate([
+            self._run(images[start:start + self.max_batch_size])
+            for start in range(0, len(images), self.max_batch_size)
+        ])
+
+
+class FakeBackend:
+    """
+    Deterministic stand-in model for benchmarks: no TensorFlow, no weights.
+
+    Class scores are a fixed function of each image's mean colour, so the
+    same image always gets the same prediction. latency_ms per call plus
+    per_image_ms per image are slept to mimic a real forward pass.
+    """
+
+    name = "fake"
+
+    def __init__(self, num_classes=10, latency_ms=0.0, per_image_ms=0.0):
+        self.num_classes = num_classes
+        self.latency_ms = latency_ms
+        self.per_image_ms = per_image_ms
+        self._projection = np.random.default_rng(0).normal(size=(3, num_classes)).astype(np.float32)
+
+    def predict(self, images):
+        images = np.asarray(images, dtype=np.float32)
+        delay = self.latency_ms + self.per_image_ms * len(images)
+        if delay > 0:
+            time.sleep(delay / 1000.0)
+
+        means = images.reshape(len(images), -1, 3).mean(axis=1)
+        logits = np.sin(means @ self._projection * 20.0) * 4.0
+        exp = np.exp(logits - logits.max(axis=1, keepdims=True))
+        return exp / exp.sum(axis=1, keepdims=True)
+
+
+class CascadeBackend:
+    """
+    A cheap first-stage model answers when it is confident enough; the
+    remaining images go to the full model.
+
+    thresholds[c] is the top-1 confidence the fast model needs when it
+    predicts class c (None: always escalate that class). They are chosen
+    on the validation split by calibrate_cascade.py. Escalated images are
+    sent to the full model as one sub-batch, so a batch costs one fast
+    pass plus at most one full pass.
+    """
+
+    name = "cascade"
+
+    def __init__(self, fast, full, thresholds):
+        self.fast = fast
+        self.full = full
+        self.thresholds = np.array([np.inf if t is None else t for t in thresholds], dtype=np.float32)
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        """Forget counts so far (warm-up batches are not traffic)"""
+        self.images = 0
+        self.escalated = 0
+        self.fast_seconds = 0.0
+        self.full_seconds = 0.0
+
+    def predict(self, images):
+        started = time.perf_counter()
+        probabilities = np.array(self.fast.predict(images), dtype=np.float32)
+        fast_done = time.perf_counter()
+
+        predicted = probabilities.argmax(axis=1)
+        escalate = probabilities[np.arange(len(predicted)), predicted] < self.thresholds[predicted]
+        if escalate.any():
+            probabilities[escalate] = self.full.predict(images[escalate])
+        full_done = time.perf_counter()
+
+        escalated = int(escalate.sum())
+        with self._lock:
+            self.images += len(images)
+            self.escalated += escalated
+            self.fast_seconds += fast_done - started
+            self.full_seconds += full_done - fast_done
+        CASCADE_IMAGES.inc("fast", amount=len(images) - escalated)
+        CASCADE_IMAGES.inc("full", amount=escalated)
+        return probabilities
+
+    def stats(self):
+        with self._lock:
+            images, escalated = self.images, self.escalated
+            fast_seconds, full_seconds = self.fast_seconds, self.full_seconds
+        # Full-model cost per image, measured on the escalated sub-batches
+        full_per_image = full_seconds / escalated if escalated else None
+        saved = (images - escalated) * full_per_image - fast_seconds if full_per_image else None
+        return {
+            "images": images,
+            "escalated": escalated,
+            "escalation_rate": round(escalated / images, 4) if images else None,
+            "fast_ms_per_image": round(fast_seconds / images * 1000, 3) if images else None,
+            "full_ms_per_image": round(full_per_image * 1000, 3) if full_per_image else None,
+            "estimated_seconds_saved": round(saved, 3) if saved is not None else None,
+        }
+
+
+def load_cascade(spec_path, img_size=224, num_threads=None):
+    """
+    Build a CascadeBackend from a calibrate_cascade.py spec; model files in
+    it are relative to the spec's directory
+    """
+    with open(spec_path) as f:
+        spec = json.load(f)
+    directory = os.path.dirname(spec_path)
+    stages = [
+        load_backend(spec[stage]["backend"], os.path.join(directory, spec[stage]["model_file"]),
+                     img_size=img_size, num_threads=num_threads)
+        for stage in ("fast", "full")
+    ]
+    return CascadeBackend(*stages, spec["thresholds"])
+
+
+def load_backend(name, model_path, img_size=224, num_threads=None):
+    """Create the backend selected in config (MODEL_BACKEND)"""
+    if name == "keras":
+        return KerasBackend(model_path, img_size)
+    if name == "tflite":
+        return TFLiteBackend(model_path, num_threads=num_threads)
+    if name == "cascade":
+        return load_cascade(model_path, img_size=img_size, num_threads=num_threads)
+    if name == "fake":
+        return FakeBackend(latency_ms=config.FAKE_LATENCY_MS, per_image_ms=config.FAKE_PER_IMAGE_MS)
+    raise ValueError(f"Unknown model backend '{name}' (expected 'keras', 'tflite', 'cascade' or 'fake')")
@@ -0,0 +1,152 @@
+# batching.py - dynamic micro-batching for model inference
+import asyncio
+import time
+from collections import Counter
+
+import numpy as np
+
+from metrics import BATCH_SIZE, STAGE_SECONDS
+
+
+class QueueFullError(Exception):
+    """Raised when the batching queue already holds max_queue_size images"""
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a request's deadline passes before its forward pass starts"""
+
+
+class MicroBatcher:
+    """
+    Groups single images from concurrent requests into one forward pass.
+
+    A batch is flushed as soon as it holds max_batch_size images or the
+    first image in it has waited max_wait_ms. Each caller gets back its
+    own row of the batched prediction.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=16, max_wait_ms=5.0, max_queue_size=256,
+                 executor=None):
+        self.predict_fn = predict_fn
+        # InferenceExecutor the forward pass runs on (default: the loop's executor)
+        self.executor = executor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_queue_size = max_queue_size
+
+        # Batch size -> number of forward passes run at that size
+        self.batch_sizes = Counter()
+        self._queue = None
+        self._worker = None
+
+    async def start(self):
+        """Start the background task that drains the queue"""
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the worker and fail any request still waiting in the queue"""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+        while self._queue is not None and not self._queue.empty():
+            _, future, _, _ = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("Batcher stopped"))
+
+    async def submit(self, image, deadline=None):
+        """
+        Queue one preprocessed image (H, W, 3) and wait for its prediction row.
+        If the time.monotonic() deadline passes while the image is still
+        queued, it is dropped from its batch and DeadlineExceeded is raised.
+        """
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((image, future, time.perf_counter(), deadline))
+        except asyncio.QueueFull:
+            raise QueueFullError(
+                f"Prediction queue is full ({self.max_queue_size} images waiting)"
+            )
+        return await future
+
+    async def _collect(self):
+        """Wait for the first image, then gather more until the batch is full or times out"""
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            # Take everything that is already waiting without yielding
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+
+            # Drop requests whose client already went away or whose deadline passed
+            now = time.monotonic()
+            for _, future, _, deadline in batch:
+                if deadline is not None and now > deadline and not future.done():
+                    future.set_exception(DeadlineExceeded("Request deadline exceeded before inference"))
+            batch = [item for item in batch if not item[1].done()]
+            if not batch:
+                continue
+
+            started = time.perf_counter()
+            for _, _, enqueued_at, _ in batch:
+                STAGE_SECONDS.observe(started - enqueued_at, "queue_wait")
+            self.batch_sizes[len(batch)] += 1
+            BATCH_SIZE.observe(len(batch))
+            images = np.stack([image for image, _, _, _ in batch])
+
+            try:
+                if self.executor is not None:
+                    predictions = await self.executor.run(self.predict_fn, images)
+                else:
+                    predictions = await loop.run_in_executor(None, self.predict_fn, images)
+            except Exception as e:
+                for _, future, _, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            STAGE_SECONDS.observe(time.perf_counter() - started, "forward")
+
+            for row, (_, future, _, _) in zip(predictions, batch):
+                if not future.done():
+                    future.set_result(row)
+
+    def stats(self):
+        """Batch-size distribution and queue depth, for tuning throughput vs latency"""
+        batches = sum(self.batch_sizes.values())
+        images = sum(size * count for size, count in self.batch_sizes.items())
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "max_queue_size": self.max_queue_size,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "total_batches": batches,
+            "total_images": images,
+            "mean_batch_size": round(images / batches, 2) if batches else 0.0,
+            "batch_size_distribution": {
+                str(size): self.batch_sizes[size] for size in sorted(self.batch_sizes)
+            },
+        }
@@ -0,0 +1,282 @@
+# bench_api.py - reproducible load test for the prediction API
+#
+# In-process (default): drives app.py through httpx's ASGI transport with the
+# deterministic fake model, so it runs anywhere without models/best_model.h5:
+#     python bench_api.py --concurrency 32 --requests 2000 --output results.json
+# Against a running server:
+#     python bench_api.py --url http://localhost:8001 --duration 60
+# Fail (exit 1) if throughput or tail latency regressed against a saved run:
+#     python bench_api.py --output new.json --compare results.json --tolerance 0.10
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+DEFAULT_MIX = "predict=8,batch=1,health=1"
+
+
+def parse_mix(text):
+    """'predict=8,batch=1' -> {'predict': 8.0, 'batch': 1.0}"""
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight or 1)
+    unknown = set(mix) - set(ENDPOINTS)
+    if unknown:
+        raise SystemExit(f"Unknown endpoint(s) in --mix: {', '.join(sorted(unknown))}")
+    return mix
+
+
+def synthetic_images(count, seed, size=(640, 480)):
+    """Distinct, leaf-coloured JPEGs; the same seed always gives the same bytes"""
+    from PIL import Image
+
+    rng = np.random.default_rng(seed)
+    images = []
+    for _ in range(count):
+        pixels = rng.integers(0, 120, (size[1] // 8, size[0] // 8, 3), dtype=np.uint8)
+        pixels[..., 1] += rng.integers(60, 130, dtype=np.uint8)
+        image = Image.fromarray(pixels).resize(size, Image.BILINEAR)
+        buffer = io.BytesIO()
+        image.save(buffer, "JPEG", quality=85)
+        images.append(buffer.getvalue())
+    return images
+
+
+def load_images(directory, limit):
+    from utils import is_image_filename
+
+    paths = []
+    for root, _, files in os.walk(directory):
+        paths.extend(os.path.join(root, f) for f in files if is_image_filename(f))
+    paths.sort()
+    return [open(path, "rb").read() for path in paths[:limit]]
+
+
+# Each endpoint: (method, path, build request kwargs from (rng, images, args))
+ENDPOINTS = {
+    "predict": ("POST", "/predict", lambda rng, images, args: {
+        "files": {"file": ("leaf.jpg", rng.choice(images), "image/jpeg")}
+    }),
+    "batch": ("POST", "/predict/batch", lambda rng, images, args: {
+        "files": [("files", (f"leaf{i}.jpg", rng.choice(images), "image/jpeg"))
+                  for i in range(args.batch_files)]
+    }),
+    "health": ("GET", "/health", lambda rng, images, args: {}),
+    "classes": ("GET", "/classes", lambda rng, images, args: {}),
+}
+
+
+async def run_load(client, args, images):
+    """Closed-loop load: `concurrency` users each send requests back to back"""
+    mix = parse_mix(args.mix)
+    names, weights = list(mix), list(mix.values())
+    samples = {name: [] for name in names}
+    errors = {name: 0 for name in names}
+    sent = 0
+    stop_at = time.monotonic() + args.duration if args.duration else None
+
+    async def user(user_id):
+        nonlocal sent
+        # Per-user RNG: the request sequence is the same on every run
+        rng = random.Random(args.seed * 1000 + user_id)
+        while True:
+            if stop_at is not None:
+                if time.monotonic() >= stop_at:
+                    return
+            elif sent >= args.requests:
+                return
+            sent += 1
+
+            name = rng.choices(names, weights)[0]
+            method, path, build = ENDPOINTS[name]
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, path, **build(rng, images, args))
+                ok = response.status_code == 200
+            except Exception:
+                ok = False
+            elapsed = time.perf_counter() - start
+            if ok:
+                samples[name].append(elapsed)
+            else:
+                errors[name] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*[user(i) for i in range(args.concurrency)])
+    wall = time.perf_counter() - start
+    return summarize(samples, errors, wall)
+
+
+def latency_summary(latencies):
+    if not latencies:
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None, "mean_ms": None}
+    ms = np.array(latencies) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {"p50_ms": round(p50, 2), "p95_ms": round(p95, 2), "p99_ms": round(p99, 2),
+            "mean_ms": round(float(ms.mean()), 2)}
+
+
+def summarize(samples, errors, wall):
+    endpoints = {}
+    for name, latencies in samples.items():
+        total = len(latencies) + errors[name]
+        endpoints[name] = {
+            "requests": total,
+            "errors": errors[name],
+            "error_rate": round(errors[name] / total, 4) if total else 0.0,
+            "throughput_rps": round(len(latencies) / wall, 2),
+            **latency_summary(latencies),
+        }
+
+    all_latencies = [x for latencies in samples.values() for x in latencies]
+    total = len(all_latencies) + sum(errors.values())
+    return {
+        "wall_seconds": round(wall, 3),
+        "requests": total,
+        "errors": sum(errors.values()),
+        "error_rate": round(sum(errors.values()) / total, 4) if total else 0.0,
+        "throughput_rps": round(len(all_latencies) / wall, 2),
+        **latency_summary(all_latencies),
+        "endpoints": endpoints,
+    }
+
+
+async def run_in_process(args, images):
+    import httpx
+    import app as api
+
+    async with api.app.router.lifespan_context(api.app):
+        while not api.startup.ready:
+            if api.startup.error:
+                raise SystemExit(f"Model failed to load: {api.startup.error}")
+            await asyncio.sleep(0.05)
+
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=args.timeout) as client:
+            return await run_load(client, args, images)
+
+
+async def run_remote(args, images):
+    import httpx
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+        return await run_load(client, args, images)
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, baseline, tolerance):
+    """Regressions beyond tolerance (fractional) in throughput, p95/p99 or error rate"""
+    problems = []
+    for name in ["overall", *current["results"]["endpoints"]]:
+        now = current["results"] if name == "overall" else current["results"]["endpoints"][name]
+        base = baseline["results"] if name == "overall" else baseline["results"]["endpoints"].get(name)
+        if not base:
+            continue
+        if base["throughput_rps"] and now["throughput_rps"] < base["throughput_rps"] * (1 - tolerance):
+            problems.append(f"{name}: throughput {base['throughput_rps']} -> {now['throughput_rps']} req/s")
+        for key in ("p95_ms", "p99_ms"):
+            if base[key] and now[key] and now[key] > base[key] * (1 + tolerance):
+                problems.append(f"{name}: {key} {base[key]} -> {now[key]}")
+        if now["error_rate"] > base["error_rate"] + 0.01:
+            problems.append(f"{name}: error rate {base['error_rate']:.2%} -> {now['error_rate']:.2%}")
+    return problems
+
+
+def print_report(results):
+    print(f"\n{'endpoint':10} {'requests':>8} {'errors':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    print("-" * 64)
+    rows = [*results["endpoints"].items(), ("TOTAL", results)]
+    for name, r in rows:
+        latencies = [f"{r[k]:8.1f}" if r[k] is not None else f"{'-':>8}" for k in ("p50_ms", "p95_ms", "p99_ms")]
+        print(f"{name:10} {r['requests']:8} {r['errors']:7} {r['throughput_rps']:8.1f} {' '.join(latencies)}")
+    print(f"\nError rate: {results['error_rate']:.2%}   Wall time: {results['wall_seconds']:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the prediction API")
+    parser.add_argument("--url", default=None, help="server to test (default: in-process app)")
+    parser.add_argument("--real-model", action="store_true",
+                        help="in-process mode: use the configured model instead of the fake one")
+    parser.add_argument("--cache", action="store_true", help="leave the prediction cache enabled")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--duration", type=float, default=None, help="run for N seconds instead")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"endpoint weights (default: {DEFAULT_MIX})")
+    parser.add_argument("--batch-files", type=int, default=8, help="images per /predict/batch request")
+    parser.add_argument("--images", default=None, help="directory of images to upload")
+    parser.add_argument("--num-images", type=int, default=64)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--output", default=None, help="save results as JSON")
+    parser.add_argument("--compare", default=None, help="baseline JSON to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    args = parser.parse_args()
+
+    if args.url is None:
+        # config.py is read when app is imported, so set these first
+        if not args.real_model:
+            os.environ.setdefault("KRISHI_MODEL_BACKEND", "fake")
+        if not args.cache:
+            os.environ["KRISHI_CACHE_ENABLED"] = "0"
+        os.environ.setdefault("KRISHI_WARMUP_ROUNDS", "1")
+
+    images = load_images(args.images, args.num_images) if args.images else synthetic_images(args.num_images, args.seed)
+    if not images:
+        raise SystemExit("No images to upload")
+
+    target = args.url or f"in-process ({os.environ.get('KRISHI_MODEL_BACKEND', 'keras')} backend)"
+    print("=" * 64)
+    print("API LOAD TEST")
+    print("=" * 64)
+    print(f"Target: {target}")
+    print(f"Concurrency: {args.concurrency}   Mix: {args.mix}   "
+          + (f"Duration: {args.duration}s" if args.duration else f"Requests: {args.requests}"))
+
+    runner = run_remote if args.url else run_in_process
+    results = asyncio.run(runner(args, images))
+    print_report(results)
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "host": {"python": platform.python_version(), "cpus": os.cpu_count(), "machine": platform.machine()},
+        "settings": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+        "target": target,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"✓ Results saved to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        problems = compare(report, baseline, args.tolerance)
+        print(f"\nCompared with {args.compare} (commit {baseline.get('commit')}, tolerance {args.tolerance:.0%}):")
+        if problems:
+            for problem in problems:
+                print(f"  ✗ {problem}")
+            sys.exit(1)
+        print("  ✓ No regressions")
+
+
+if __name__ == "__main__":
+    main()
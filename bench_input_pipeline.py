@@ -0,0 +1,130 @@
+# bench_input_pipeline.py - ImageDataGenerator vs tf.data training input
+# Usage: python bench_input_pipeline.py [--dataset dataset] [--batches 50] [--epochs 2]
+#
+# 1. Input only: images/sec produced by each pipeline, no model.
+# 2. End to end: images/sec and seconds per epoch of model.fit on the
+#    train.py model (weights=None so nothing is downloaded; the compute is
+#    the same as with ImageNet weights).
+import argparse
+import time
+
+import tensorflow as tf
+from tensorflow.keras import layers, models
+from tensorflow.keras.applications import MobileNetV2
+from tensorflow.keras.preprocessing.image import ImageDataGenerator
+
+from data_pipeline import make_augmenter, make_dataset
+from utils import list_image_files
+
+IMG_SIZE = 224
+BATCH_SIZE = 32
+
+# train.py's augmentation settings
+AUGMENTATION = dict(
+    rotation_range=20,
+    width_shift_range=0.2,
+    height_shift_range=0.2,
+    shear_range=0.2,
+    zoom_range=0.2,
+    horizontal_flip=True,
+    vertical_flip=True,
+    fill_mode='nearest'
+)
+
+
+def legacy_input(dataset_path):
+    datagen = ImageDataGenerator(rescale=1./255, validation_split=0.2, **AUGMENTATION)
+    return datagen.flow_from_directory(
+        dataset_path,
+        target_size=(IMG_SIZE, IMG_SIZE),
+        batch_size=BATCH_SIZE,
+        class_mode='categorical',
+        subset='training',
+        shuffle=True
+    )
+
+
+def tfdata_input(dataset_path):
+    class_names, (files, labels), _ = list_image_files(dataset_path, validation_split=0.2)
+    dataset = make_dataset(
+        files, labels, len(class_names),
+        batch_size=BATCH_SIZE,
+        training=True,
+        augment=make_augmenter(**AUGMENTATION)
+    )
+    return dataset.repeat()
+
+
+def input_only(batches, iterator):
+    next(iterator)  # first batch pays start-up cost
+    start = time.perf_counter()
+    images = 0
+    for _ in range(batches):
+        x, _ = next(iterator)
+        images += len(x)
+    return images / (time.perf_counter() - start)
+
+
+class EpochTimer(tf.keras.callbacks.Callback):
+    def on_epoch_begin(self, epoch, logs=None):
+        self.start = time.perf_counter()
+
+    def on_epoch_end(self, epoch, logs=None):
+        self.times.append(time.perf_counter() - self.start)
+
+    def on_train_begin(self, logs=None):
+        self.times = []
+
+
+def end_to_end(data, num_classes, batches, epochs):
+    base_model = MobileNetV2(input_shape=(IMG_SIZE, IMG_SIZE, 3), include_top=False, weights=None)
+    base_model.trainable = False
+    model = models.Sequential([
+        base_model,
+        layers.GlobalAveragePooling2D(),
+        layers.Dropout(0.3),
+        layers.Dense(256, activation='relu'),
+        layers.Dropout(0.3),
+        layers.Dense(num_classes, activation='softmax')
+    ])
+    model.compile(optimizer='adam', loss='categorical_crossentropy', metrics=['accuracy'])
+    timer = EpochTimer()
+    model.fit(data, steps_per_epoch=batches, epochs=epochs, callbacks=[timer], verbose=0)
+    return timer.times
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark training input pipelines")
+    parser.add_argument("--dataset", default="dataset")
+    parser.add_argument("--batches", type=int, default=50, help="batches per measurement / epoch")
+    parser.add_argument("--epochs", type=int, default=2)
+    parser.add_argument("--skip-fit", action="store_true", help="input-only numbers")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print(f"INPUT PIPELINE BENCHMARK ({args.batches} batches of {BATCH_SIZE})")
+    print("=" * 60)
+
+    pipelines = {
+        "ImageDataGenerator": lambda: legacy_input(args.dataset),
+        "tf.data": lambda: tfdata_input(args.dataset),
+    }
+    num_classes = len(list_image_files(args.dataset)[0])
+
+    print(f"\n{'pipeline':22} {'input img/s':>12}" + ("" if args.skip_fit else f" {'fit img/s':>10} {'s/epoch':>18}"))
+    print("-" * 66)
+    for name, build in pipelines.items():
+        data = build()
+        input_rate = input_only(args.batches, iter(data))
+        line = f"{name:22} {input_rate:12.1f}"
+        if not args.skip_fit:
+            epoch_times = end_to_end(build(), num_classes, args.batches, args.epochs)
+            fit_rate = args.batches * BATCH_SIZE / min(epoch_times)
+            line += f" {fit_rate:10.1f} {' / '.join(f'{t:.1f}' for t in epoch_times):>18}"
+        print(line)
+
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
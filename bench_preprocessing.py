@@ -0,0 +1,98 @@
+# bench_preprocessing.py - per-stage cost of image preprocessing
+# Usage: python bench_preprocessing.py [image.jpg ...]
+# Without arguments a synthetic 12 MP phone-style JPEG is used.
+import io
+import statistics
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+import preprocessing
+from gate import ImageGate
+
+RUNS = 20
+GATE = ImageGate()
+
+
+def synthetic_photo(width=4032, height=3024):
+    """Noisy green 12 MP JPEG, roughly what a phone camera uploads"""
+    rng = np.random.default_rng(0)
+    pixels = rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+    pixels[..., 1] = np.maximum(pixels[..., 1], 120)
+    # Some large-scale structure, so the image is not flat once downscaled
+    pixels[..., 2] //= np.linspace(1, 4, width, dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, "JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def timed(stages, name, fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    stages.setdefault(name, []).append((time.perf_counter() - start) * 1000)
+    return result
+
+
+def legacy_pipeline(data, stages):
+    """What app.py did before: full decode, default resize, float64 / 255"""
+    image = timed(stages, "open", Image.open, io.BytesIO(data))
+    image = timed(stages, "decode + convert RGB", lambda: image.convert("RGB"))
+    image = timed(stages, "resize", image.resize, (224, 224))
+    pixels = timed(stages, "to array", np.array, image)
+    timed(stages, "normalize", lambda: pixels / 255.0)
+
+
+def new_pipeline(data, stages):
+    """preprocessing.py: draft-mode decode, bilinear resize, float32 normalize, plus the API's image gate"""
+    size = (preprocessing.IMG_SIZE, preprocessing.IMG_SIZE)
+    image = timed(stages, "open", preprocessing.open_image, data)
+    timed(stages, "gate (header)", GATE.check_header, image)
+    image = timed(stages, "decode + convert RGB", lambda: preprocessing.decode(image, size).copy())
+    image = timed(stages, "resize", preprocessing.resize, image, size)
+    pixels = timed(stages, "to array", np.asarray, image, np.uint8)
+    timed(stages, "gate (pixels)", GATE.check_pixels, pixels)
+    timed(stages, "normalize", preprocessing.normalize, pixels)
+
+
+def report(title, stages):
+    print(f"\n{title}")
+    print("-" * 60)
+    total = 0.0
+    for name, samples in stages.items():
+        median = statistics.median(samples)
+        total += median
+        print(f"  {name:25} : {median:8.2f} ms")
+    print(f"  {'TOTAL':25} : {total:8.2f} ms")
+    return total
+
+
+def main():
+    if len(sys.argv) > 1:
+        images = [open(path, "rb").read() for path in sys.argv[1:]]
+        source = f"{len(images)} file(s)"
+    else:
+        images = [synthetic_photo()]
+        source = "synthetic 4032x3024 JPEG"
+
+    print("=" * 60)
+    print(f"PREPROCESSING BENCHMARK ({source}, median of {RUNS} runs)")
+    print("=" * 60)
+
+    legacy, new = {}, {}
+    for _ in range(RUNS):
+        for data in images:
+            legacy_pipeline(data, legacy)
+            new_pipeline(data, new)
+
+    legacy_total = report("Legacy (full decode, float64)", legacy)
+    new_total = report("preprocessing.py (draft decode, float32)", new)
+
+    print("\n" + "=" * 60)
+    print(f"Speedup: {legacy_total / new_total:.1f}x per image")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+# bench_serialization.py - per-request cost of building the /predict response body
+# Usage: python bench_serialization.py [--requests 20000] [--batch 32]
+#
+# Compares, for the same probabilities:
+# 1. legacy: build the response dict, jsonable_encoder, JSONResponse
+#    (what FastAPI does when the endpoint returns a dict)
+# 2. dict + JSONResponse: the dict returned as a JSONResponse directly
+# 3. precomputed: PredictionRenderer splicing cached per-class bytes
+import argparse
+import json
+import os
+import statistics
+import time
+
+import numpy as np
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from disease_info import DISEASE_DATABASE
+from responses import UNKNOWN_DISEASE, FastJSONResponse, PredictionRenderer, join_batch, orjson
+from utils import get_risk_level
+
+ROUNDS = 5
+
+
+def legacy_build(probabilities, class_names, model_version="1.0"):
+    """The dict app.py used to build per request"""
+    predicted_idx = np.argmax(probabilities)
+    confidence = float(probabilities[predicted_idx] * 100)
+    predicted_class = class_names[str(predicted_idx)]
+    top_3_idx = np.argsort(probabilities)[-3:][::-1]
+    top_3_predictions = [
+        {"disease": class_names[str(i)], "confidence": round(float(probabilities[i] * 100), 2)}
+        for i in top_3_idx
+    ]
+    disease_data = DISEASE_DATABASE.get(predicted_class, {"disease_name": predicted_class, **UNKNOWN_DISEASE})
+    return {
+        "success": True,
+        "predicted_class": predicted_class,
+        "disease": disease_data["disease_name"],
+        "confidence": round(confidence, 2),
+        "risk_level": get_risk_level(confidence, disease_data.get("severity", "Unknown")),
+        "description": disease_data["description"],
+        "severity": disease_data["severity"],
+        "treatment": disease_data["treatment"],
+        "prevention": disease_data["prevention"],
+        "cultural_practices": disease_data["cultural_practices"],
+        "top_3_predictions": top_3_predictions,
+        "model_version": model_version,
+        "timestamp": None
+    }
+
+
+def load_class_names(path):
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {str(i): name for i, name in enumerate(DISEASE_DATABASE)}
+
+
+def per_request_us(fn, rows):
+    """Median over ROUNDS of the mean microseconds per call"""
+    rounds = []
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        for row in rows:
+            fn(row)
+        rounds.append((time.perf_counter() - start) / len(rows) * 1e6)
+    return statistics.median(rounds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark /predict response serialization")
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--batch", type=int, default=32, help="results per /predict/batch body")
+    parser.add_argument("--class-names", default="models/class_names.json")
+    args = parser.parse_args()
+
+    class_names = load_class_names(args.class_names)
+    renderer = PredictionRenderer(class_names, DISEASE_DATABASE, "1.0")
+    rng = np.random.default_rng(0)
+    rows = rng.dirichlet(np.full(len(class_names), 0.3), size=args.requests).astype(np.float32)
+
+    # The fast path has to produce exactly the same bytes
+    for row in rows[:1000]:
+        expected = JSONResponse(jsonable_encoder(legacy_build(row, class_names))).body
+        assert FastJSONResponse(renderer.render(row)[1]).body == expected
+
+    print("=" * 60)
+    print(f"SERIALIZATION BENCHMARK ({args.requests} responses, {len(class_names)} classes)")
+    print(f"JSON encoder for other responses: {'orjson' if orjson else 'stdlib json'}")
+    print("=" * 60)
+
+    single = {
+        "legacy (dict + jsonable_encoder)": lambda row: JSONResponse(jsonable_encoder(legacy_build(row, class_names))),
+        "dict + JSONResponse": lambda row: JSONResponse(legacy_build(row, class_names)),
+        "precomputed bytes": lambda row: FastJSONResponse(renderer.render(row)[1]),
+    }
+    print(f"\n{'/predict':34} {'us/request':>11} {'speedup':>8}")
+    print("-" * 56)
+    baseline = None
+    for name, fn in single.items():
+        us = per_request_us(fn, rows)
+        baseline = baseline or us
+        print(f"{name:34} {us:11.1f} {baseline / us:7.1f}x")
+
+    batches = [rows[i:i + args.batch] for i in range(0, len(rows) - args.batch + 1, args.batch)]
+
+    def legacy_batch(batch):
+        results = [{"filename": f"leaf{i}.jpg", **legacy_build(row, class_names)} for i, row in enumerate(batch)]
+        body = {"success": True, "total_images": len(results), "succeeded": len(results), "failed": 0,
+                "results": results}
+        return JSONResponse(jsonable_encoder(body))
+
+    def fast_batch(batch):
+        results = [renderer.render(row, f"leaf{i}.jpg")[1] for i, row in enumerate(batch)]
+        return FastJSONResponse(join_batch(results, success=True, total_images=len(results),
+                                           succeeded=len(results), failed=0))
+
+    print(f"\n{f'/predict/batch ({args.batch} images)':34} {'us/image':>11} {'speedup':>8}")
+    print("-" * 56)
+    legacy_us = per_request_us(legacy_batch, batches) / args.batch
+    fast_us = per_request_us(fast_batch, batches) / args.batch
+    print(f"{'legacy (dict + jsonable_encoder)':34} {legacy_us:11.1f} {1.0:7.1f}x")
+    print(f"{'precomputed bytes':34} {fast_us:11.1f} {legacy_us / fast_us:7.1f}x")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+# bench_serving.py - requests/sec and memory per worker for each serving layout
+# Usage: python bench_serving.py [--workers 4] [--image leaf.jpg] [--duration 30]
+#
+# Layouts compared:
+#   single   - one uvicorn process (what `python app.py` runs)
+#   uvicorn  - uvicorn --workers N, every worker loads its own model copy
+#   prefork  - serve.py, workers forked from one master sharing pages
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+
+from bench_api import synthetic_images
+
+PORT = 8055
+
+
+def layout_command(layout, workers):
+    if layout == "single":
+        return [sys.executable, "-m", "uvicorn", "app:app", "--port", str(PORT), "--log-level", "warning"]
+    if layout == "uvicorn":
+        return [sys.executable, "-m", "uvicorn", "app:app", "--port", str(PORT),
+                "--workers", str(workers), "--log-level", "warning"]
+    if layout == "prefork":
+        return [sys.executable, "serve.py", "--port", str(PORT), "--workers", str(workers)]
+    raise ValueError(layout)
+
+
+def process_tree(root_pid):
+    """root_pid and all its descendants (Linux /proc)"""
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+
+    pids, stack = [], [root_pid]
+    while stack:
+        pid = stack.pop()
+        pids.append(pid)
+        stack.extend(children.get(pid, []))
+    return pids
+
+
+def is_resource_tracker(pid):
+    try:
+        with open(f"/proc/{pid}/cmdline", "rb") as f:
+            return b"multiprocessing.resource_tracker" in f.read()
+    except OSError:
+        return False
+
+
+def memory_mb(pid):
+    """RSS counts shared pages in full; PSS splits them between the sharing processes"""
+    usage = {"rss": 0.0, "pss": 0.0}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in ("Rss", "Pss"):
+                    usage[key.lower()] = int(value.split()[0]) / 1024
+    except OSError:
+        pass
+    return usage
+
+
+async def wait_ready(client, workers, timeout=600):
+    """Every worker must be warm, so require several ready answers in a row"""
+    deadline = time.monotonic() + timeout
+    streak = 0
+    while time.monotonic() < deadline:
+        try:
+            response = await client.get("/ready")
+            streak = streak + 1 if response.status_code == 200 else 0
+        except httpx.TransportError:
+            streak = 0
+        if streak >= 4 * workers:
+            return
+        await asyncio.sleep(0.1)
+    raise TimeoutError("Server did not become ready")
+
+
+async def drive_load(client, image, concurrency, duration):
+    done = errors = 0
+    first_error = None
+    stop_at = time.monotonic() + duration
+
+    async def user():
+        nonlocal done, errors, first_error
+        while time.monotonic() < stop_at:
+            response = await client.post("/predict", files={"file": ("leaf.jpg", image, "image/jpeg")})
+            if response.status_code == 200:
+                done += 1
+            else:
+                errors += 1
+                first_error = first_error or f"{response.status_code} {response.text[:200]}"
+
+    start = time.monotonic()
+    await asyncio.gather(*[user() for _ in range(concurrency)])
+    return done / (time.monotonic() - start), errors, first_error
+
+
+async def bench_layout(layout, args, image):
+    workers = 1 if layout == "single" else args.workers
+    env = {**os.environ, "KRISHI_CACHE_ENABLED": "0"}  # measure the model, not the cache
+    server = subprocess.Popen(layout_command(layout, workers), env=env)
+    try:
+        limits = httpx.Limits(max_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{PORT}", timeout=60, limits=limits) as client:
+            await wait_ready(client, workers)
+            rps, errors, first_error = await drive_load(client, image, args.concurrency, args.duration)
+        if errors:
+            print(f"✗ {layout}: {errors} requests failed, first: {first_error}")
+
+        # Workers are the children of the (idle) uvicorn/serve.py master,
+        # apart from multiprocessing's resource tracker next to uvicorn's
+        pids = process_tree(server.pid)
+        worker_pids = [pid for pid in pids if pid != server.pid and not is_resource_tracker(pid)] or [server.pid]
+        memory = [memory_mb(pid) for pid in worker_pids]
+        total = [memory_mb(pid) for pid in pids]
+        return {
+            "layout": layout,
+            "workers": workers,
+            "requests_per_sec": round(rps, 1),
+            "errors": errors,
+            "rss_mb_per_worker": round(sum(m["rss"] for m in memory) / len(memory), 1),
+            "pss_mb_per_worker": round(sum(m["pss"] for m in memory) / len(memory), 1),
+            "pss_mb_total": round(sum(m["pss"] for m in total), 1),
+        }
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare serving layouts")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--image", default=None, help="leaf photo to upload (default: synthetic)")
+    parser.add_argument("--layouts", nargs="+", default=["single", "uvicorn", "prefork"])
+    parser.add_argument("--output", default=None, help="write results as JSON")
+    args = parser.parse_args()
+
+    # Textured and leaf-coloured, so the image gate lets it through
+    image = open(args.image, "rb").read() if args.image else synthetic_images(1, seed=0)[0]
+
+    print("=" * 60)
+    print("SERVING LAYOUT BENCHMARK")
+    print("=" * 60)
+    results = []
+    for layout in args.layouts:
+        print(f"\n→ {layout} ...")
+        results.append(asyncio.run(bench_layout(layout, args, image)))
+
+    print(f"\n{'layout':10} {'workers':>7} {'req/s':>8} {'RSS/worker':>11} {'PSS/worker':>11} {'PSS total':>10}")
+    print("-" * 62)
+    for r in results:
+        # Throughput of a run with failed requests is not comparable
+        rps = "failed" if r["errors"] else f"{r['requests_per_sec']:.1f}"
+        print(f"{r['layout']:10} {r['workers']:7} {rps:>8} "
+              f"{r['rss_mb_per_worker']:9.0f}MB {r['pss_mb_per_worker']:9.0f}MB {r['pss_mb_total']:8.0f}MB")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n✓ Results saved to {args.output}")
+
+    failed = [r["layout"] for r in results if r["errors"]]
+    if failed:
+        print(f"\n✗ Requests failed in: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,393 @@
+# bulk_score.py - score large sets of photos offline, resumably
+# Usage:
+#     python bulk_score.py drone_week42/ field_photos.zip uploads.tar.gz --output week42.jsonl
+#     python bulk_score.py photos/ --output week42.csv --workers 8 --batch-size 256
+#     python bulk_score.py photos/ --output week42.parquet      # needs pyarrow
+#     python bulk_score.py ...same arguments...                 # resumes after an interruption
+#
+# Images come from folders (recursively), zip and tar archives in a stable
+# order. A process pool reads and decodes them a few chunks ahead while
+# the model scores large batches, so decoding overlaps inference. Every
+# --checkpoint-every images the output is flushed and the position saved;
+# rerunning the same command continues from the last checkpoint.
+import argparse
+import csv
+import glob
+import json
+import os
+import tarfile
+import time
+import zipfile
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import numpy as np
+
+import config
+from disease_info import DISEASE_DATABASE
+from gate import ImageGate, ImageRejected
+from preprocessing import decode, normalize, open_image, resize
+from utils import get_risk_level, is_image_filename
+
+FORMATS = ("jsonl", "csv", "parquet")
+FIELDS = ("source", "status", "predicted_class", "disease", "confidence", "risk_level", "severity",
+          "top2_class", "top2_confidence", "top3_class", "top3_confidence", "error")
+
+_gate = None  # per decode worker
+
+
+def iter_sources(inputs):
+    """
+    Yield (source id, read) for every image, always in the same order.
+    read() returns a path or the image bytes; it must be called before the
+    next item is taken (tar members are streamed).
+    """
+    for path in inputs:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    if is_image_filename(name):
+                        full = os.path.join(root, name)
+                        yield full, lambda full=full: full
+        elif not os.path.isfile(path):
+            print(f"⚠️  Skipping {path}: not found")
+        elif zipfile.is_zipfile(path):
+            with zipfile.ZipFile(path) as archive:
+                for info in archive.infolist():
+                    if not info.is_dir() and is_image_filename(info.filename):
+                        yield f"{path}!{info.filename}", lambda info=info: archive.read(info)
+        elif tarfile.is_tarfile(path):
+            # Streaming mode: compressed tars are read once, front to back
+            with tarfile.open(path, "r|*") as archive:
+                for member in archive:
+                    if member.isfile() and is_image_filename(member.name):
+                        yield f"{path}!{member.name}", lambda member=member: archive.extractfile(member).read()
+        elif is_image_filename(path):
+            yield path, lambda path=path: path
+        else:
+            print(f"⚠️  Skipping {path}: not a folder, archive or image")
+
+
+def init_worker(gate_enabled):
+    global _gate
+    _gate = ImageGate(
+        enabled=gate_enabled,
+        min_size=config.GATE_MIN_SIZE,
+        max_aspect_ratio=config.GATE_MAX_ASPECT_RATIO,
+        min_green_ratio=config.GATE_MIN_GREEN_RATIO,
+        min_contrast=config.GATE_MIN_CONTRAST
+    )
+
+
+def decode_chunk(items):
+    """
+    Decode [(source, path or bytes)] in a worker process, the way the API
+    does (gate included). Returns [(source, uint8 pixels or None, status,
+    error)] in the same order; uint8 keeps the transfer back 4x smaller.
+    """
+    size = (config.IMG_SIZE, config.IMG_SIZE)
+    decoded = []
+    for source, payload in items:
+        try:
+            image = open_image(payload)
+            _gate.check_header(image)
+            pixels = np.asarray(resize(decode(image, size), size), dtype=np.uint8)
+            _gate.check_pixels(pixels)
+            decoded.append((source, pixels, "ok", None))
+        except ImageRejected as e:
+            decoded.append((source, None, "rejected", e.reason))
+        except Exception as e:
+            decoded.append((source, None, "failed", f"Could not decode image: {e}"))
+    return decoded
+
+
+def chunked(sources, chunk_size, skip):
+    """Lists of (source, path or bytes), after skipping the first skip images"""
+    chunk = []
+    for n, (source, read) in enumerate(sources):
+        if n < skip:
+            continue
+        chunk.append((source, read()))
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class RowBuilder:
+    """Flat result rows from class probabilities, with the API's disease and risk logic"""
+
+    def __init__(self, class_names):
+        self.class_names = {int(idx): name for idx, name in class_names.items()}
+
+    def row(self, source, probabilities):
+        percent = np.asarray(probabilities, dtype=np.float64) * 100
+        ranked = np.argsort(percent)[::-1][:3]
+        name = self.class_names[int(ranked[0])]
+        info = DISEASE_DATABASE.get(name, {"disease_name": name, "severity": "Unknown"})
+        confidence = round(float(percent[ranked[0]]), 2)
+        runners_up = [(self.class_names[int(i)], round(float(percent[i]), 2)) for i in ranked[1:]]
+        runners_up += [(None, None)] * (2 - len(runners_up))
+        return {
+            "source": source,
+            "status": "ok",
+            "predicted_class": name,
+            "disease": info["disease_name"],
+            "confidence": confidence,
+            "risk_level": get_risk_level(confidence, info["severity"]),
+            "severity": info["severity"],
+            "top2_class": runners_up[0][0],
+            "top2_confidence": runners_up[0][1],
+            "top3_class": runners_up[1][0],
+            "top3_confidence": runners_up[1][1],
+            "error": None,
+        }
+
+    @staticmethod
+    def failure(source, status, error):
+        return {**{field: None for field in FIELDS}, "source": source, "status": status, "error": error}
+
+
+class FileWriter:
+    """JSONL or CSV appended to one file; position = bytes written so far"""
+
+    def __init__(self, path, fmt, position=0):
+        self.fmt = fmt
+        exists = os.path.exists(path)
+        self.file = open(path, "r+" if exists else "w", newline="", encoding="utf-8")
+        # Anything after the last checkpoint is from an interrupted run
+        self.file.truncate(position)
+        self.file.seek(position)
+        if fmt == "csv":
+            self.csv = csv.DictWriter(self.file, fieldnames=FIELDS)
+            if position == 0:
+                self.csv.writeheader()
+
+    def write(self, rows):
+        if self.fmt == "csv":
+            self.csv.writerows(rows)
+        else:
+            self.file.writelines(json.dumps(row, ensure_ascii=False) + "\n" for row in rows)
+
+    def flush(self) -> int:
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return self.file.tell()
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetWriter:
+    """One part file per checkpoint in a folder; position = parts written so far"""
+
+    def __init__(self, path, position=0):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:  # optional, only the parquet format needs it
+            raise SystemExit("✗ Parquet output needs pyarrow (pip install pyarrow), or use .jsonl / .csv")
+
+        self.path = path
+        self.parts = position
+        self.rows = []
+        os.makedirs(path, exist_ok=True)
+        for part in glob.glob(os.path.join(path, "part-*.parquet")):
+            if int(os.path.basename(part)[5:10]) >= position:
+                os.remove(part)  # written after the last checkpoint
+
+    def write(self, rows):
+        self.rows.extend(rows)
+
+    def flush(self) -> int:
+        if self.rows:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pylist(self.rows, schema=pa.schema([
+                (field, pa.float64() if field.endswith("confidence") else pa.string()) for field in FIELDS
+            ]))
+            pq.write_table(table, os.path.join(self.path, f"part-{self.parts:05d}.parquet"))
+            self.parts += 1
+            self.rows = []
+        return self.parts
+
+    def close(self):
+        pass
+
+
+def load_checkpoint(path, identity):
+    """Saved progress for the same inputs, model and output, else None"""
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        checkpoint = json.load(f)
+    if checkpoint["identity"] != identity:
+        raise SystemExit(f"✗ {path} belongs to a different run (inputs, model or output changed); "
+                         f"use --restart to start over")
+    return checkpoint
+
+
+def save_checkpoint(path, checkpoint):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score folders and archives of photos offline")
+    parser.add_argument("inputs", nargs="+", help="folders, .zip / .tar(.gz) archives or image files")
+    parser.add_argument("--output", required=True, help=".jsonl, .csv or .parquet (a folder of parts)")
+    parser.add_argument("--format", choices=FORMATS, default=None, help="default: from the output extension")
+    parser.add_argument("--version", default=config.MODEL_VERSION or None,
+                        help="registry version (default: the one the API serves)")
+    parser.add_argument("--batch-size", type=int, default=256, help="images per forward pass")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="decode processes")
+    parser.add_argument("--chunk-size", type=int, default=32, help="images per decode task")
+    parser.add_argument("--checkpoint-every", type=int, default=5000, help="images between checkpoints")
+    parser.add_argument("--no-gate", action="store_true", help="score images the API's gate would reject")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and start over")
+    args = parser.parse_args()
+
+    fmt = args.format or os.path.splitext(args.output)[1].lstrip(".").lower()
+    if fmt not in FORMATS:
+        raise SystemExit(f"✗ Cannot tell the format of {args.output}, pass --format ({', '.join(FORMATS)})")
+
+    from model_registry import open_registry
+
+    metadata = open_registry().resolve(args.version)
+    identity = {
+        "inputs": [os.path.abspath(path) for path in args.inputs],
+        "model_version": metadata["version"],
+        "model_path": os.path.abspath(metadata["model_path"]) if metadata["model_path"] else "",
+        "output": os.path.abspath(args.output),
+        "format": fmt,
+        "gate": not args.no_gate,
+    }
+    checkpoint_path = f"{args.output}.checkpoint.json"
+    checkpoint = None if args.restart else load_checkpoint(checkpoint_path, identity)
+    if checkpoint and checkpoint["complete"]:
+        print(f"✓ {args.output} is already complete ({checkpoint['done']} images); use --restart to score again")
+        return
+    done = checkpoint["done"] if checkpoint else 0
+    counts = Counter(checkpoint["counts"] if checkpoint else {})
+
+    print("=" * 60)
+    print("BULK SCORING")
+    print("=" * 60)
+    print(f"Model: {metadata['version']} ({metadata['backend']}: {metadata['model_path']})")
+    print(f"Output: {args.output} ({fmt})")
+    if done:
+        print(f"Resuming after {done} images (last: {checkpoint['last_source']})")
+
+    # Spawned, not forked, so the workers never inherit TensorFlow's threads
+    context = get_context("spawn")
+    pool = ProcessPoolExecutor(max_workers=args.workers, mp_context=context,
+                               initializer=init_worker, initargs=(not args.no_gate,))
+
+    from backends import load_backend
+
+    with open(metadata["class_names_path"]) as f:
+        rows = RowBuilder(json.load(f))
+    backend = load_backend(metadata["backend"], metadata["model_path"], img_size=config.IMG_SIZE,
+                           num_threads=config.TFLITE_THREADS)
+    print(f"✓ Model loaded, {args.workers} decode workers, batch size {args.batch_size}")
+
+    position = checkpoint["position"] if checkpoint else 0
+    writer = ParquetWriter(args.output, position) if fmt == "parquet" else FileWriter(args.output, fmt, position)
+
+    buffered = []      # decoded entries waiting for the next forward pass, in input order
+    ready = 0          # how many of them have pixels
+    last_source = checkpoint["last_source"] if checkpoint else None
+    since_checkpoint = 0
+    model_seconds = 0.0
+    model_images = 0
+    scored_this_run = 0
+    started = time.perf_counter()
+
+    def score_buffered():
+        nonlocal buffered, ready, done, last_source, since_checkpoint, model_seconds, model_images, scored_this_run
+        if not buffered:
+            return
+        pixels = [entry[1] for entry in buffered if entry[1] is not None]
+        if pixels:
+            model_start = time.perf_counter()
+            probabilities = iter(np.asarray(backend.predict(normalize(np.stack(pixels)))))
+            model_seconds += time.perf_counter() - model_start
+            model_images += len(pixels)
+        out = []
+        for source, image, status, error in buffered:
+            out.append(rows.row(source, next(probabilities)) if image is not None
+                       else RowBuilder.failure(source, status, error))
+            counts[status] += 1
+        writer.write(out)
+        done += len(buffered)
+        scored_this_run += len(buffered)
+        since_checkpoint += len(buffered)
+        last_source = buffered[-1][0]
+        buffered, ready = [], 0
+
+        rate = scored_this_run / (time.perf_counter() - started)
+        print(f"\r  {done} images ({counts['ok']} ok, {counts['rejected']} rejected, "
+              f"{counts['failed']} failed)  {rate:.1f} img/s", end="", flush=True)
+        if since_checkpoint >= args.checkpoint_every:
+            checkpoint_now(complete=False)
+
+    def checkpoint_now(complete):
+        nonlocal since_checkpoint
+        save_checkpoint(checkpoint_path, {
+            "identity": identity,
+            "done": done,
+            "last_source": last_source,
+            "position": writer.flush(),
+            "counts": dict(counts),
+            "complete": complete,
+        })
+        since_checkpoint = 0
+
+    # Keep a few chunks decoding ahead of the model
+    in_flight = deque()
+    max_in_flight = max(2, 2 * args.workers)
+    try:
+        for chunk in chunked(iter_sources(args.inputs), args.chunk_size, done):
+            in_flight.append(pool.submit(decode_chunk, chunk))
+            while len(in_flight) >= max_in_flight or (in_flight and in_flight[0].done()):
+                for entry in in_flight.popleft().result():
+                    buffered.append(entry)
+                    ready += entry[1] is not None
+                if ready >= args.batch_size:
+                    score_buffered()
+        while in_flight:
+            for entry in in_flight.popleft().result():
+                buffered.append(entry)
+                ready += entry[1] is not None
+            if ready >= args.batch_size:
+                score_buffered()
+        score_buffered()
+        checkpoint_now(complete=True)
+    except KeyboardInterrupt:
+        # The scored images after the last checkpoint are redone on resume
+        print(f"\n✗ Interrupted; rerun the same command to resume after image {done - since_checkpoint}")
+        raise SystemExit(130)
+    finally:
+        pool.shutdown(cancel_futures=True)
+        writer.close()
+
+    seconds = time.perf_counter() - started
+    print()
+    print("\n" + "=" * 60)
+    print("SCORING COMPLETE!")
+    print("=" * 60)
+    print(f"Images: {done} ({counts['ok']} scored, {counts['rejected']} rejected by the gate, "
+          f"{counts['failed']} unreadable)")
+    print(f"This run: {scored_this_run} images in {seconds:.1f}s = {scored_this_run / seconds:.1f} img/s end to end, "
+          f"{model_images / model_seconds if model_seconds else 0:.1f} img/s model only")
+    print(f"✓ Results: {args.output}")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+# cache.py - content-addressed prediction cache with request coalescing
+import asyncio
+import hashlib
+import os
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+# Rough per-entry bookkeeping cost (key string, tuple, OrderedDict node)
+ENTRY_OVERHEAD_BYTES = 200
+
+
+class PredictionCache:
+    """
+    Caches class probabilities by sha256(model version + uploaded bytes).
+
+    Memory tier: LRU with a TTL, bounded by entry count and bytes.
+    Disk tier (optional): one .npy file per key, survives restarts and is
+    promoted back into memory on a hit. Its reads, writes and deletes run on
+    executor (an InferenceExecutor, default: asyncio's thread pool) so a
+    slow disk never blocks the event loop.
+    Concurrent misses for the same key share one computation (single-flight).
+    """
+
+    def __init__(self, max_entries=10000, max_bytes=64 * 1024 * 1024, ttl_seconds=86400,
+                 disk_dir=None, executor=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl_seconds
+        self.disk_dir = disk_dir or None
+        self.executor = executor
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+        self._entries = OrderedDict()  # key -> (expires_at, probabilities)
+        self._bytes = 0
+        self._inflight = {}            # key -> Future shared by concurrent misses
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(image_data: bytes, model_version: str) -> str:
+        digest = hashlib.sha256(model_version.encode())
+        digest.update(b"\0")
+        digest.update(image_data)
+        return digest.hexdigest()
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, key[:2], f"{key}.npy")
+
+    def _store(self, key, probabilities, expires_at):
+        if key in self._entries:
+            self._bytes -= self._entries.pop(key)[1].nbytes + ENTRY_OVERHEAD_BYTES
+        self._entries[key] = (expires_at, probabilities)
+        self._bytes += probabilities.nbytes + ENTRY_OVERHEAD_BYTES
+
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self._bytes -= evicted.nbytes + ENTRY_OVERHEAD_BYTES
+            self.evictions += 1
+
+    async def _run_disk(self, fn, *args):
+        if self.executor is not None:
+            return await self.executor.run(fn, *args)
+        return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+    def _read_disk(self, key):
+        """Blocking: (probabilities, age in seconds) from the disk tier, or None"""
+        path = self._disk_path(key)
+        try:
+            age = time.time() - os.path.getmtime(path)
+            if age > self.ttl:
+                os.remove(path)
+                return None
+            return np.load(path), age
+        except (OSError, ValueError):
+            return None
+
+    async def _get_disk(self, key):
+        entry = await self._run_disk(self._read_disk, key)
+        if entry is None:
+            return None
+        probabilities, age = entry
+        self._store(key, probabilities, time.monotonic() + self.ttl - age)
+        return probabilities
+
+    def _write_disk(self, key, probabilities):
+        """Blocking: save one entry with an atomic replace"""
+        path = self._disk_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                np.save(f, probabilities)
+            os.replace(tmp_path, path)
+        except OSError:
+            # The disk tier is best effort, memory still has the entry
+            pass
+
+    async def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, probabilities = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                return probabilities
+            self._bytes -= probabilities.nbytes + ENTRY_OVERHEAD_BYTES
+            del self._entries[key]
+
+        if self.disk_dir:
+            probabilities = await self._get_disk(key)
+            if probabilities is not None:
+                self.disk_hits += 1
+                return probabilities
+        return None
+
+    async def get(self, key):
+        """Cached probabilities for key, or None"""
+        probabilities = await self._lookup(key)
+        if probabilities is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return probabilities
+
+    async def put(self, key, probabilities):
+        probabilities = np.asarray(probabilities, dtype=np.float32)
+        self._store(key, probabilities, time.monotonic() + self.ttl)
+        if self.disk_dir:
+            await self._run_disk(self._write_disk, key, probabilities)
+
+    async def get_or_compute(self, key, compute):
+        """
+        Return cached probabilities or await compute() once for this key.
+        Callers arriving while compute() is running wait for the same result.
+        """
+        probabilities = await self._lookup(key)
+        if probabilities is not None:
+            self.hits += 1
+            return probabilities
+
+        future = self._inflight.get(key)
+        if future is not None:
+            # Shares another request's inference: neither a hit nor a new miss
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # The request doing the work was cancelled, not this one: take over
+                if not future.cancelled():
+                    raise
+                return await self.get_or_compute(key, compute)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            probabilities = await compute()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so a failure nobody else waited for isn't logged
+            future.exception()
+            raise
+        else:
+            # Waiters get the result before this request writes the disk tier
+            future.set_result(probabilities)
+            await self.put(key, probabilities)
+            return probabilities
+        finally:
+            del self._inflight[key]
+
+    def stats(self):
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "entries": len(self._entries),
+            "memory_bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl,
+            "disk_dir": self.disk_dir,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            # Fraction of lookups that did not start a new inference
+            "hit_rate": round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,216 @@
+# calibrate_cascade.py - choose confidence thresholds for the cascade backend
+# Usage:
+#     python calibrate_cascade.py --fast models/fast_model.h5 --full models/best_model.h5
+#     python calibrate_cascade.py ... --target-accuracy 0.95 --output models/cascade.json
+#     python model_registry.py publish models/cascade.json --version 1.2-cascade
+#
+# Both models score the validation split once. For each class the fast
+# model can predict, the threshold is the lowest top-1 confidence at which
+# letting the fast model answer still keeps the cascade within --max-drop
+# accuracy of the full model on those images (or meets --target-accuracy
+# overall). The report shows the escalation rate and the latency saved
+# against running the full model on every image.
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import config
+from check_dataset import MANIFEST_PATH, load_manifest
+from evaluate import compiled_batches, file_batches, list_labelled_files
+from model_registry import BACKEND_BY_EXTENSION
+
+LATENCY_ROUNDS = 20
+
+
+def calibrate(labels, fast, full, max_drop, min_accepted=10):
+    """
+    Per-class thresholds from validation probabilities.
+
+    Among images the fast model predicts as class c, sorted by confidence,
+    accepting the top k costs fast-model mistakes and saves full-model
+    passes. The largest k whose cascade accuracy on those images is within
+    max_drop of the full model's is kept; classes with fewer than
+    min_accepted acceptable images always escalate (threshold None).
+    """
+    fast_pred = fast.argmax(axis=1)
+    confidence = fast.max(axis=1)
+    fast_correct = fast_pred == labels
+    full_correct = full.argmax(axis=1) == labels
+
+    thresholds = []
+    for c in range(fast.shape[1]):
+        members = np.flatnonzero(fast_pred == c)
+        members = members[np.argsort(-confidence[members], kind="stable")]
+        if len(members) == 0:
+            thresholds.append(None)
+            continue
+
+        # Correct answers if the first k (most confident) are accepted
+        accepted_correct = np.concatenate([[0], np.cumsum(fast_correct[members])])
+        escalated_correct = np.concatenate([np.cumsum(full_correct[members][::-1])[::-1], [0]])
+        cascade_correct = accepted_correct + escalated_correct
+        allowed = full_correct[members].sum() - max_drop * len(members)
+
+        best = None
+        for k in range(min_accepted, len(members) + 1):
+            # Only cut between distinct confidences, a threshold cannot split ties
+            if k < len(members) and confidence[members[k]] == confidence[members[k - 1]]:
+                continue
+            if cascade_correct[k] >= allowed:
+                best = k
+        thresholds.append(float(confidence[members[best - 1]]) if best else None)
+    return thresholds
+
+
+def apply_thresholds(fast, full, thresholds):
+    """Cascade probabilities and the escalation mask for the given thresholds"""
+    limits = np.array([np.inf if t is None else t for t in thresholds])
+    predicted = fast.argmax(axis=1)
+    escalate = fast.max(axis=1) < limits[predicted]
+    return np.where(escalate[:, None], full, fast), escalate
+
+
+def latency_ms(backend, batch_size):
+    """Median milliseconds per image at a batch size, after one warm-up call"""
+    images = np.random.default_rng(0).random((batch_size, config.IMG_SIZE, config.IMG_SIZE, 3), dtype=np.float32)
+    backend.predict(images)
+    times = []
+    for _ in range(LATENCY_ROUNDS):
+        start = time.perf_counter()
+        backend.predict(images)
+        times.append((time.perf_counter() - start) * 1000 / batch_size)
+    return float(np.median(times))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibrate cascade thresholds on the validation split")
+    parser.add_argument("--fast", required=True, help="first-stage model file")
+    parser.add_argument("--full", default=config.DEFAULT_MODEL_PATHS["keras"], help="full model file")
+    parser.add_argument("--fast-backend", default=None, help="default: from the file extension")
+    parser.add_argument("--full-backend", default=None, help="default: from the file extension")
+    parser.add_argument("--class-names", default=config.CLASS_NAMES_PATH)
+    parser.add_argument("--data", default="dataset")
+    parser.add_argument("--compiled", default="dataset_compiled")
+    parser.add_argument("--manifest", default=MANIFEST_PATH)
+    parser.add_argument("--max-drop", type=float, default=0.005,
+                        help="accuracy the cascade may lose against the full model (0.005 = half a point)")
+    parser.add_argument("--target-accuracy", type=float, default=None,
+                        help="overall accuracy to keep instead of --max-drop")
+    parser.add_argument("--min-accepted", type=int, default=10,
+                        help="validation images a class needs before the fast model may answer it")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=config.DECODE_WORKERS)
+    parser.add_argument("--output", default="models/cascade.json")
+    args = parser.parse_args()
+
+    from backends import load_backend
+
+    with open(args.class_names) as f:
+        class_names = {int(idx): name for idx, name in json.load(f).items()}
+    stages = {}
+    for stage, path, backend_name in (("fast", args.fast, args.fast_backend), ("full", args.full, args.full_backend)):
+        backend_name = backend_name or BACKEND_BY_EXTENSION.get(os.path.splitext(path)[1].lower())
+        if backend_name is None:
+            raise SystemExit(f"✗ Cannot tell the backend of {path}, pass --{stage}-backend")
+        stages[stage] = {"backend": backend_name, "path": path,
+                         "model": load_backend(backend_name, path, img_size=config.IMG_SIZE)}
+
+    print("=" * 60)
+    print("CASCADE CALIBRATION")
+    print("=" * 60)
+    for stage, info in stages.items():
+        print(f"{stage:5} model: {info['backend']} ({info['path']})")
+
+    use_compiled = args.data == "dataset" and os.path.exists(os.path.join(args.compiled, "index.json"))
+    if use_compiled:
+        from dataset_compiler import CompiledDataset
+
+        compiled = CompiledDataset(args.compiled)
+        _, indices = compiled.split(0.2, load_manifest(args.manifest))
+        total = len(indices)
+    else:
+        files, labels = list_labelled_files(args.data, class_names, "val", args.manifest)
+        total = len(files)
+    if not total:
+        raise SystemExit("✗ No validation images")
+
+    outputs = {"fast": [], "full": []}
+    scored_labels = []
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        batches = (compiled_batches(compiled, indices, args.batch_size) if use_compiled
+                   else file_batches(files, labels, args.batch_size, pool))
+        for images, batch_labels in batches:
+            for stage, info in stages.items():
+                outputs[stage].append(np.asarray(info["model"].predict(images)))
+            scored_labels.append(batch_labels)
+            print(f"\r  {sum(len(l) for l in scored_labels)}/{total} images", end="", flush=True)
+    print()
+    labels = np.concatenate(scored_labels)
+    fast, full = np.concatenate(outputs["fast"]), np.concatenate(outputs["full"])
+    if fast.shape[1] != len(class_names) or full.shape[1] != len(class_names):
+        raise SystemExit(f"✗ Both models need {len(class_names)} outputs (fast: {fast.shape[1]}, full: {full.shape[1]})")
+
+    full_accuracy = float(np.mean(full.argmax(axis=1) == labels))
+    max_drop = args.max_drop if args.target_accuracy is None else max(0.0, full_accuracy - args.target_accuracy)
+    thresholds = calibrate(labels, fast, full, max_drop, args.min_accepted)
+    cascade, escalate = apply_thresholds(fast, full, thresholds)
+    fast_pred = fast.argmax(axis=1)
+
+    print(f"\n{'class':35} {'threshold':>11} {'answered fast':>14}")
+    print("-" * 62)
+    for c, threshold in enumerate(thresholds):
+        predicted_c = fast_pred == c
+        answered = np.mean(~escalate[predicted_c]) if predicted_c.any() else 0.0
+        shown = f"{threshold:.4f}" if threshold is not None else "always full"
+        print(f"{class_names[c]:35} {shown:>11} {answered:14.1%}")
+
+    # Per-image latency of each stage on this machine
+    fast_ms = {size: latency_ms(stages["fast"]["model"], size) for size in (1, 16)}
+    full_ms = {size: latency_ms(stages["full"]["model"], size) for size in (1, 16)}
+    escalation_rate = float(escalate.mean())
+    summary = {
+        "images": int(len(labels)),
+        "fast_accuracy": float(np.mean(fast_pred == labels)),
+        "full_accuracy": full_accuracy,
+        "cascade_accuracy": float(np.mean(cascade.argmax(axis=1) == labels)),
+        "max_drop": max_drop,
+        "escalation_rate": escalation_rate,
+        "latency_ms_per_image": {
+            str(size): {
+                "fast": round(fast_ms[size], 3),
+                "full": round(full_ms[size], 3),
+                "cascade": round(fast_ms[size] + escalation_rate * full_ms[size], 3),
+            }
+            for size in fast_ms
+        },
+    }
+
+    print(f"\nAccuracy: fast {summary['fast_accuracy']:.2%}, full {full_accuracy:.2%}, "
+          f"cascade {summary['cascade_accuracy']:.2%} (allowed drop {max_drop:.2%})")
+    print(f"Escalated to the full model: {escalation_rate:.1%} of images")
+    for size, ms in summary["latency_ms_per_image"].items():
+        print(f"Batch {size:>2}: {ms['full']:.2f} ms/image full only -> {ms['cascade']:.2f} ms/image cascade "
+              f"({1 - ms['cascade'] / ms['full']:.0%} saved)")
+
+    output_dir = os.path.dirname(args.output) or "."
+    spec = {
+        stage: {"backend": info["backend"], "model_file": os.path.relpath(info["path"], output_dir) if info["path"] else ""}
+        for stage, info in stages.items()
+    }
+    spec["thresholds"] = thresholds
+    spec["class_names"] = {str(idx): name for idx, name in class_names.items()}
+    spec["calibration"] = summary
+    os.makedirs(output_dir, exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(spec, f, indent=2)
+    print(f"\n✓ Cascade spec saved to {args.output} (serve it with KRISHI_MODEL_BACKEND=cascade "
+          f"KRISHI_MODEL_PATH={args.output}, or publish it with model_registry.py)")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,220 @@
-# check_dataset.py
+# check_dataset.py - scan dataset/, keep a manifest and report problems
+# Usage: python check_dataset.py [--dataset dataset] [--manifest dataset_manifest.json]
+#
+# Class folders are scanned in parallel with os.scandir. Every image gets a
+# manifest entry (size, mtime, sha256, width, height, split); on later runs
+# only new or changed files are read and hashed again. The report lists the
+# per-class counts, corrupt/undecodable files, exact duplicates and images
+# that appear in more than one class.
+#
+# The manifest also pins the train/validation split: a file's split is
+# chosen once, from its content hash, and kept. Training, evaluation and the
+# compiled dataset read it with load_split() instead of recomputing it.
+import argparse
+import hashlib
+import json
 import os
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 
-dataset_path = "dataset"
-print("="*60)
-print("DATASET DISTRIBUTION")
-print("="*60)
-
-total = 0
-for folder in os.listdir(dataset_path):
-    folder_path = os.path.join(dataset_path, folder)
-    if os.path.isdir(folder_path):
-        count = len([f for f in os.listdir(folder_path) if f.endswith(('.jpg', '.jpeg', '.png'))])
-        total += count
-        print(f"{folder:30} : {count:5} images")
-
-print("="*60)
-print(f"TOTAL: {total} images")
+from preprocessing import open_image
+from utils import is_image_filename, list_image_files
+
+MANIFEST_PATH = "dataset_manifest.json"
+MANIFEST_VERSION = 1
+VALIDATION_SPLIT = 0.2
+
+
+def _scan_class(folder):
+    """[(name, size, mtime_ns)] for the images in one class folder"""
+    with os.scandir(folder) as entries:
+        files = []
+        for entry in entries:
+            if entry.is_file() and is_image_filename(entry.name):
+                stat = entry.stat()
+                files.append((entry.name, stat.st_size, stat.st_mtime_ns))
+        return files
+
+
+def _inspect(path):
+    """sha256, dimensions and decode error (None if the image is fine) for one file"""
+    with open(path, "rb") as f:
+        data = f.read()
+    record = {"sha256": hashlib.sha256(data).hexdigest(), "width": None, "height": None, "error": None}
+    try:
+        image = open_image(path)  # a path (not the bytes) keeps error messages readable
+        record["width"], record["height"] = image.size
+        # Decoding at reduced scale still reads the whole compressed stream
+        image.draft("RGB", (64, 64))
+        image.load()
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+    return record
+
+
+def assign_split(sha256, validation_split):
+    """Deterministic split from the content hash, so copies of an image always land together"""
+    return "val" if int(sha256[:8], 16) / 0x100000000 < validation_split else "train"
+
+
+def load_manifest(manifest_path=MANIFEST_PATH):
+    if not manifest_path or not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path) as f:
+        return json.load(f)
+
+
+def scan_dataset(dataset_path, manifest_path=MANIFEST_PATH, validation_split=VALIDATION_SPLIT,
+                 workers=None, resplit=False):
+    """
+    Update (or create) the manifest for dataset_path.
+    Unchanged files keep their hash and split; resplit=True reassigns every
+    split with the given validation_split.
+    Returns: manifest, scan stats {rehashed, removed, seconds}
+    """
+    workers = workers or min(16, (os.cpu_count() or 1) * 2)
+    previous = load_manifest(manifest_path)
+    if previous is not None and previous.get("version") != MANIFEST_VERSION:
+        previous = None
+    known = previous["files"] if previous else {}
+    if previous and not resplit:
+        validation_split = previous["validation_split"]
+
+    classes = sorted(d.name for d in os.scandir(dataset_path) if d.is_dir())
+    with ThreadPoolExecutor(max_workers=min(16, len(classes) or 1)) as pool:
+        listings = list(pool.map(_scan_class, [os.path.join(dataset_path, c) for c in classes]))
+
+    files, changed = {}, []
+    for class_name, listing in zip(classes, listings):
+        for name, size, mtime_ns in listing:
+            path = f"{class_name}/{name}"
+            old = known.get(path)
+            if old is not None and old["size"] == size and old["mtime_ns"] == mtime_ns:
+                files[path] = dict(old)
+            else:
+                files[path] = {"class": class_name, "size": size, "mtime_ns": mtime_ns}
+                changed.append(path)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        records = pool.map(_inspect, [os.path.join(dataset_path, p) for p in changed])
+        for path, record in zip(changed, records):
+            files[path].update(record)
+    hash_seconds = time.perf_counter() - start
+
+    for entry in files.values():
+        if resplit or "split" not in entry:
+            entry["split"] = assign_split(entry["sha256"], validation_split)
+
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "dataset": dataset_path,
+        "validation_split": validation_split,
+        "classes": classes,
+        "files": dict(sorted(files.items())),
+    }
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp_path, manifest_path)
+
+    stats = {"rehashed": len(changed), "removed": len(set(known) - set(files)), "seconds": hash_seconds}
+    return manifest, stats
+
+
+def find_problems(manifest):
+    """corrupt [(path, error)], duplicates {sha256: [paths]} within a class, cross-class {sha256: [paths]}"""
+    corrupt = [(path, e["error"]) for path, e in manifest["files"].items() if e["error"]]
+    by_hash = defaultdict(list)
+    for path, entry in manifest["files"].items():
+        by_hash[entry["sha256"]].append(path)
+
+    duplicates, cross_class = {}, {}
+    for digest, paths in by_hash.items():
+        if len(paths) < 2:
+            continue
+        classes = {manifest["files"][p]["class"] for p in paths}
+        (cross_class if len(classes) > 1 else duplicates)[digest] = paths
+    return corrupt, duplicates, cross_class
+
+
+def load_split(dataset_path, manifest_path=MANIFEST_PATH, validation_split=VALIDATION_SPLIT):
+    """
+    Same return value as utils.list_image_files, but with the split pinned
+    in the manifest (corrupt files left out). Falls back to list_image_files
+    when there is no manifest for this dataset.
+    Returns: class_names {index: name}, (train_files, train_labels), (val_files, val_labels)
+    """
+    manifest = load_manifest(manifest_path)
+    if manifest is None or os.path.normpath(manifest["dataset"]) != os.path.normpath(dataset_path):
+        return list_image_files(dataset_path, validation_split)
+
+    label_of = {name: idx for idx, name in enumerate(manifest["classes"])}
+    splits = {"train": ([], []), "val": ([], [])}
+    for path, entry in manifest["files"].items():
+        if entry["error"]:
+            continue
+        files, labels = splits[entry["split"]]
+        files.append(os.path.join(dataset_path, *path.split("/")))
+        labels.append(label_of[entry["class"]])
+
+    class_names = dict(enumerate(manifest["classes"]))
+    return class_names, splits["train"], splits["val"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scan the dataset, update its manifest and report problems")
+    parser.add_argument("--dataset", default="dataset")
+    parser.add_argument("--manifest", default=MANIFEST_PATH)
+    parser.add_argument("--validation-split", type=float, default=VALIDATION_SPLIT,
+                        help="used for new manifests and with --resplit")
+    parser.add_argument("--resplit", action="store_true", help="reassign every file's split")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.dataset):
+        print(f"✗ Dataset folder '{args.dataset}' not found!")
+        raise SystemExit(1)
+
+    manifest, scan = scan_dataset(args.dataset, args.manifest, args.validation_split, args.workers, args.resplit)
+    corrupt, duplicates, cross_class = find_problems(manifest)
+
+    print("=" * 60)
+    print("DATASET DISTRIBUTION")
+    print("=" * 60)
+
+    counts = defaultdict(lambda: {"train": 0, "val": 0})
+    for entry in manifest["files"].values():
+        if not entry["error"]:
+            counts[entry["class"]][entry["split"]] += 1
+    total = 0
+    for class_name in manifest["classes"]:
+        c = counts[class_name]
+        total += c["train"] + c["val"]
+        print(f"{class_name:30} : {c['train'] + c['val']:5} images  (train {c['train']:5}, val {c['val']:4})")
+
+    print("=" * 60)
+    print(f"TOTAL: {total} images")
+    print(f"Manifest: {args.manifest} ({scan['rehashed']} files hashed in {scan['seconds']:.1f}s, "
+          f"{scan['removed']} removed)")
+
+    if corrupt:
+        print(f"\n✗ {len(corrupt)} corrupt or undecodable images (left out of training):")
+        for path, error in corrupt:
+            print(f"  {path}: {error}")
+    if duplicates:
+        extra = sum(len(paths) - 1 for paths in duplicates.values())
+        print(f"\n⚠️  {extra} exact duplicates within a class:")
+        for paths in duplicates.values():
+            print(f"  {' = '.join(paths)}")
+    if cross_class:
+        print(f"\n✗ {len(cross_class)} images appear in more than one class (conflicting labels):")
+        for paths in cross_class.values():
+            print(f"  {' = '.join(paths)}")
+    if not (corrupt or duplicates or cross_class):
+        print("\n✓ No corrupt files or duplicates")
+
+
+if __name__ == "__main__":
+    main()
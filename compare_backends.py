@@ -0,0 +1,149 @@
+# compare_backends.py - parity, latency and memory check across model backends
+# Usage: python compare_backends.py [--per-class 20] [--backend tflite:models/best_model_int8.tflite ...]
+import argparse
+import json
+import os
+import resource
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import numpy as np
+
+from export_tflite import VARIANTS, output_path
+from preprocessing import preprocess
+from utils import is_image_filename
+
+BATCH_SIZE = 16
+LATENCY_RUNS = 20
+
+
+def load_sample_set(dataset_path, class_names, per_class):
+    """First per_class images (sorted) of every class folder, preprocessed like the API"""
+    class_to_idx = {name: int(idx) for idx, name in class_names.items()}
+    images, labels = [], []
+    for class_name in sorted(class_to_idx):
+        folder = os.path.join(dataset_path, class_name)
+        if not os.path.isdir(folder):
+            continue
+        files = sorted(f for f in os.listdir(folder) if is_image_filename(f))[:per_class]
+        for filename in files:
+            images.append(preprocess(os.path.join(folder, filename)))
+            labels.append(class_to_idx[class_name])
+    return np.stack(images), np.array(labels)
+
+
+def measure_backend(spec, images):
+    """Runs in a fresh process so load time and peak RSS belong to this backend alone"""
+    from backends import load_backend
+
+    name, model_path = spec.split(":", 1)
+    start = time.perf_counter()
+    backend = load_backend(name, model_path)
+    load_time = time.perf_counter() - start
+
+    # First call builds the graph / allocates tensors, keep it out of the timings
+    backend.predict(images[:1])
+
+    probabilities = np.concatenate([
+        backend.predict(images[i:i + BATCH_SIZE]) for i in range(0, len(images), BATCH_SIZE)
+    ])
+
+    single = []
+    for i in range(LATENCY_RUNS):
+        start = time.perf_counter()
+        backend.predict(images[i % len(images)][None])
+        single.append((time.perf_counter() - start) * 1000)
+
+    batch = images[:BATCH_SIZE]
+    start = time.perf_counter()
+    for _ in range(5):
+        backend.predict(batch)
+    throughput = 5 * len(batch) / (time.perf_counter() - start)
+
+    return {
+        "backend": spec,
+        "file_mb": os.path.getsize(model_path) / 1e6,
+        "load_s": load_time,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "latency_ms_p50": statistics.median(single),
+        "throughput_ips": throughput,
+        "probabilities": probabilities,
+    }
+
+
+def compare(reference, candidate, labels):
+    """Top-1/top-3 agreement of candidate with the reference predictions"""
+    ref_top1 = reference.argmax(axis=1)
+    cand_top1 = candidate.argmax(axis=1)
+    ref_top3 = np.argsort(reference, axis=1)[:, -3:]
+    cand_top3 = np.argsort(candidate, axis=1)[:, -3:]
+    return {
+        "top1_agreement": float(np.mean(ref_top1 == cand_top1)),
+        "top3_agreement": float(np.mean([set(a) == set(b) for a, b in zip(ref_top3, cand_top3)])),
+        "ref_top1_in_top3": float(np.mean([r in c for r, c in zip(ref_top1, cand_top3)])),
+        "max_prob_diff": float(np.abs(reference - candidate).max()),
+        "accuracy": float(np.mean(cand_top1 == labels)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare Keras and TFLite backends")
+    parser.add_argument("--dataset", default="dataset")
+    parser.add_argument("--class-names", default="models/class_names.json")
+    parser.add_argument("--model", default="models/best_model.h5", help="Keras reference model")
+    parser.add_argument("--backend", action="append", default=None,
+                        help="extra backend as name:path (default: all exported TFLite variants)")
+    parser.add_argument("--per-class", type=int, default=20)
+    parser.add_argument("--output", default=None, help="write the report as JSON")
+    args = parser.parse_args()
+
+    with open(args.class_names) as f:
+        class_names = json.load(f)
+
+    specs = [f"keras:{args.model}"]
+    if args.backend:
+        specs += args.backend
+    else:
+        specs += [f"tflite:{output_path(args.model, v)}" for v in VARIANTS
+                  if os.path.exists(output_path(args.model, v))]
+
+    print("=" * 60)
+    print("BACKEND PARITY CHECK")
+    print("=" * 60)
+
+    images, labels = load_sample_set(args.dataset, class_names, args.per_class)
+    print(f"✓ Sample set: {len(images)} images from {len(set(labels))} classes")
+
+    results = []
+    context = get_context("spawn")
+    for spec in specs:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            results.append(pool.submit(measure_backend, spec, images).result())
+
+    reference = results[0]["probabilities"]
+    print(f"\n{'backend':48} {'MB':>6} {'load s':>7} {'RSS MB':>7} {'p50 ms':>7} {'img/s':>7}")
+    print("-" * 88)
+    for r in results:
+        print(f"{r['backend']:48} {r['file_mb']:6.1f} {r['load_s']:7.2f} {r['peak_rss_mb']:7.0f} "
+              f"{r['latency_ms_p50']:7.1f} {r['throughput_ips']:7.1f}")
+
+    print(f"\n{'backend':48} {'top1 agr':>8} {'top3 agr':>8} {'max diff':>8} {'acc':>6}")
+    print("-" * 84)
+    report = []
+    for r in results:
+        parity = compare(reference, r.pop("probabilities"), labels)
+        print(f"{r['backend']:48} {parity['top1_agreement']:8.2%} {parity['top3_agreement']:8.2%} "
+              f"{parity['max_prob_diff']:8.4f} {parity['accuracy']:6.2%}")
+        report.append({**r, **parity})
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n✓ Report saved to {args.output}")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
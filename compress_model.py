@@ -0,0 +1,393 @@
+# compress_model.py - pruning, weight clustering and quantization-aware variants of the model
+# Usage:
+#     python compress_model.py                                  # every variant of models/best_model.h5
+#     python compress_model.py --variants baseline prune qat --sparsity 0.6 --epochs 3
+#     python compress_model.py --model models/student_model.h5 --scope head
+#
+# Every variant starts from the trained model, is fine-tuned on the training
+# split and exported twice: as a plain .h5 for the keras backend and as an
+# int8 .tflite for the tflite backend. Each artifact is then loaded in a
+# fresh process and measured (file size, load time, peak RSS, single-image
+# latency, batch throughput) and scored on the validation split, so a
+# variant can be chosen on the numbers and published with model_registry.py.
+#
+#   baseline   the model as trained; post-training int8 only
+#   prune      magnitude pruning to --sparsity, ramped up during fine-tuning
+#   prune-2by4 structured 2:4 sparsity (two zeros in every block of four weights)
+#   cluster    weight clustering: each kernel shares --clusters distinct values
+#   qat        quantization-aware fine-tuning, exported to int8 only
+#
+# pruning, clustering and QAT need the optional tensorflow-model-optimization
+# package (tfmot); without it only the baseline variant runs.
+import argparse
+import importlib.util
+import json
+import math
+import os
+import resource
+import statistics
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import get_context
+
+import numpy as np
+
+import config
+from check_dataset import MANIFEST_PATH, load_manifest
+from evaluate import compiled_batches, file_batches, list_labelled_files
+
+VARIANTS = ("baseline", "prune", "prune-2by4", "cluster", "qat")
+DATASET_PATH = 'dataset'
+COMPILED_PATH = 'dataset_compiled'
+LATENCY_RUNS = 20
+THROUGHPUT_RUNS = 5
+
+
+def flatten(model):
+    """
+    (resizing layer or None, flat model, head layer names) for a model built
+    like train.py's (MobileNetV2 nested in a Sequential, optionally behind a
+    Resizing layer). tfmot cannot wrap layers inside a nested model, so the
+    head is re-attached to the base's own graph; the layers (and weights) are
+    shared with the original model.
+    """
+    from tensorflow.keras import layers, models
+
+    stack = [layer for layer in model.layers if not isinstance(layer, layers.InputLayer)]
+    resize = stack.pop(0) if isinstance(stack[0], layers.Resizing) else None
+    if not isinstance(stack[0], models.Model):
+        # Already flat: the Dense layers are the head
+        return None, model, {layer.name for layer in model.layers if isinstance(layer, layers.Dense)}
+    base = stack.pop(0)
+    x = base.output
+    for layer in stack:
+        x = layer(x)
+    return resize, models.Model(base.input, x), {layer.name for layer in stack}
+
+
+def unflatten(resize, flat, input_size=config.IMG_SIZE):
+    """Put the Resizing layer back in front, so the model takes the API's input size again"""
+    from tensorflow.keras import layers, models
+
+    if resize is None:
+        return flat
+    inputs = layers.Input(shape=(input_size, input_size, 3))
+    return models.Model(inputs, flat(resize(inputs)))
+
+
+def in_scope(layer, scope, head, kinds):
+    return isinstance(layer, kinds) and (scope == "all" or layer.name in head)
+
+
+def freeze_batch_norm(model):
+    """Fine-tune every layer but BatchNorm, whose statistics a small dataset must not move"""
+    import tensorflow as tf
+
+    model.trainable = True
+    for layer in model.layers:
+        if isinstance(layer, tf.keras.layers.BatchNormalization):
+            layer.trainable = False
+
+
+def fine_tune(model, train_dataset, epochs, learning_rate, callbacks=()):
+    import tensorflow as tf
+
+    model.compile(
+        optimizer=tf.keras.optimizers.Adam(learning_rate=learning_rate),
+        loss='categorical_crossentropy',
+        metrics=['accuracy']
+    )
+    model.fit(train_dataset, epochs=epochs, callbacks=list(callbacks), verbose=2)
+
+
+def prune(flat, head, args, steps_per_epoch, structured=False):
+    """Model with PruneLowMagnitude wrappers on the kernels in scope, and its training callbacks"""
+    import tensorflow as tf
+    import tensorflow_model_optimization as tfmot
+
+    sparsity = tfmot.sparsity.keras
+    if structured:
+        # 2:4 is defined for Conv2D and Dense kernels only
+        kinds = (tf.keras.layers.Conv2D, tf.keras.layers.Dense)
+        options = {"sparsity_m_by_n": (2, 4)}
+    else:
+        kinds = (tf.keras.layers.Conv2D, tf.keras.layers.DepthwiseConv2D, tf.keras.layers.Dense)
+        # Reach the target sparsity after 70% of the steps, then recover at it
+        end_step = max(1, int(steps_per_epoch * args.epochs * 0.7))
+        options = {"pruning_schedule": sparsity.PolynomialDecay(0.0, args.sparsity, begin_step=0, end_step=end_step)}
+
+    def wrap(layer):
+        if in_scope(layer, args.scope, head, kinds):
+            return sparsity.prune_low_magnitude(layer, **options)
+        return layer
+
+    pruned = tf.keras.models.clone_model(flat, clone_function=wrap)
+    pruned.set_weights(flat.get_weights())
+    return pruned, [sparsity.UpdatePruningStep()], sparsity.strip_pruning
+
+
+def cluster(flat, head, args):
+    """Model with ClusterWeights wrappers on the kernels in scope"""
+    import tensorflow as tf
+    import tensorflow_model_optimization as tfmot
+
+    clustering = tfmot.clustering.keras
+    kinds = (tf.keras.layers.Conv2D, tf.keras.layers.DepthwiseConv2D, tf.keras.layers.Dense)
+
+    def wrap(layer):
+        if in_scope(layer, args.scope, head, kinds):
+            return clustering.cluster_weights(
+                layer,
+                number_of_clusters=args.clusters,
+                cluster_centroids_init=clustering.CentroidInitialization.KMEANS_PLUS_PLUS
+            )
+        return layer
+
+    clustered = tf.keras.models.clone_model(flat, clone_function=wrap)
+    clustered.set_weights(flat.get_weights())
+    return clustered, [], clustering.strip_clustering
+
+
+def quantize_aware(flat):
+    """Whole model with fake-quantization nodes; the int8 export then needs no calibration"""
+    import tensorflow_model_optimization as tfmot
+
+    return tfmot.quantization.keras.quantize_model(flat), [], None
+
+
+def representative_dataset(train_dataset, count):
+    """Calibration images for full-integer quantization, from the training split"""
+    def generate():
+        seen = 0
+        for images, _ in train_dataset:
+            for image in images:
+                yield [image[None]]
+                seen += 1
+                if seen >= count:
+                    return
+    return generate
+
+
+def kernel_sparsity(model):
+    """Fraction of exactly-zero weights over all Conv/Dense kernels"""
+    zeros = total = 0
+    for weight in model.weights:
+        if "kernel" in weight.name:
+            values = weight.numpy()
+            zeros += int(np.count_nonzero(values == 0))
+            total += values.size
+    return zeros / total if total else 0.0
+
+
+def gzipped_mb(path):
+    """Size after gzip: what pruned and clustered weights save in transfer and storage"""
+    with open(path, "rb") as f:
+        return len(zlib.compress(f.read(), 9)) / 1e6
+
+
+def validation_batches(data, batch_size, pool):
+    """The validation split exactly as evaluate.py reads it"""
+    if data["compiled"]:
+        from dataset_compiler import CompiledDataset
+
+        compiled = CompiledDataset(data["compiled"])
+        _, indices = compiled.split(0.2, load_manifest(data["manifest"]))
+        yield from compiled_batches(compiled, indices, batch_size)
+    else:
+        files, labels = list_labelled_files(data["dataset"], data["class_names"], "val", data["manifest"])
+        yield from file_batches(files, labels, batch_size, pool)
+
+
+def measure_artifact(backend_name, model_path, data, batch_size):
+    """Runs in a fresh process so load time and peak RSS belong to this artifact alone"""
+    from backends import load_backend
+
+    start = time.perf_counter()
+    backend = load_backend(backend_name, model_path, img_size=config.IMG_SIZE)
+    load_s = time.perf_counter() - start
+
+    timings = None
+    outputs, labels = [], []
+    with ThreadPoolExecutor(max_workers=config.DECODE_WORKERS) as pool:
+        for images, batch_labels in validation_batches(data, batch_size, pool):
+            if timings is None:
+                # First calls build the graph / allocate tensors, keep them out of the timings
+                backend.predict(images[:1])
+                backend.predict(images)
+                single = []
+                for i in range(LATENCY_RUNS):
+                    start = time.perf_counter()
+                    backend.predict(images[i % len(images)][None])
+                    single.append((time.perf_counter() - start) * 1000)
+                start = time.perf_counter()
+                for _ in range(THROUGHPUT_RUNS):
+                    backend.predict(images)
+                timings = {
+                    "latency_ms_p50": statistics.median(single),
+                    "throughput_ips": THROUGHPUT_RUNS * len(images) / (time.perf_counter() - start),
+                    # Before the validation pass, whose decoding would count too
+                    "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+                }
+            outputs.append(np.asarray(backend.predict(images)))
+            labels.append(batch_labels)
+
+    probabilities, labels = np.concatenate(outputs), np.concatenate(labels)
+    top3 = np.argsort(probabilities, axis=1)[:, -3:]
+    return {
+        "file_mb": os.path.getsize(model_path) / 1e6,
+        "gzip_mb": gzipped_mb(model_path),
+        "load_s": load_s,
+        **timings,
+        "images": int(len(labels)),
+        "accuracy": float(np.mean(probabilities.argmax(axis=1) == labels)),
+        "top3_accuracy": float(np.mean((top3 == labels[:, None]).any(axis=1))),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and compare compressed variants of the model")
+    parser.add_argument("--model", default="models/best_model.h5")
+    parser.add_argument("--class-names", default=config.CLASS_NAMES_PATH)
+    parser.add_argument("--variants", nargs="+", default=list(VARIANTS), choices=VARIANTS)
+    parser.add_argument("--scope", choices=["all", "head"], default="all",
+                        help="compress the base and head, or the Dense head only")
+    parser.add_argument("--sparsity", type=float, default=0.5, help="final sparsity of the prune variant")
+    parser.add_argument("--clusters", type=int, default=16, help="distinct weights per kernel (cluster variant)")
+    parser.add_argument("--epochs", type=int, default=3, help="fine-tuning epochs per variant")
+    parser.add_argument("--learning-rate", type=float, default=1e-4)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--calibration-images", type=int, default=200,
+                        help="training images that calibrate post-training int8 activations")
+    parser.add_argument("--output-dir", default="models/compressed")
+    args = parser.parse_args()
+
+    # tfmot needs Keras 2, which TensorFlow >= 2.16 ships separately as tf_keras
+    legacy_keras = (any(v != "baseline" for v in args.variants) and "TF_USE_LEGACY_KERAS" not in os.environ
+                    and importlib.util.find_spec("tf_keras") is not None)
+    if legacy_keras:
+        os.environ["TF_USE_LEGACY_KERAS"] = "1"
+
+    import tensorflow as tf
+    from data_pipeline import load_datasets
+    from export_tflite import convert
+
+    print("=" * 60)
+    print("MODEL COMPRESSION")
+    print("=" * 60)
+
+    if importlib.util.find_spec("tensorflow_model_optimization") is None:
+        skipped = [v for v in args.variants if v != "baseline"]
+        if skipped:
+            print(f"⚠️  tensorflow-model-optimization is not installed, skipping: {', '.join(skipped)}")
+            print("   pip install tensorflow-model-optimization tf_keras")
+        args.variants = [v for v in args.variants if v == "baseline"]
+    if not args.variants:
+        raise SystemExit("✗ No variants to build")
+
+    with open(args.class_names) as f:
+        class_names = {int(idx): name for idx, name in json.load(f).items()}
+
+    print("\nLoading training data...")
+    dataset_classes, (train_dataset, train_labels), _ = load_datasets(
+        DATASET_PATH,
+        batch_size=args.batch_size,
+        validation_split=0.2,
+        compiled_path=COMPILED_PATH,
+        img_size=config.IMG_SIZE
+    )
+    if dataset_classes != class_names:
+        raise SystemExit(f"✗ Dataset classes differ from {args.class_names}")
+    steps_per_epoch = math.ceil(len(train_labels) / args.batch_size)
+    calibration = representative_dataset(train_dataset, args.calibration_images)
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    # (variant, artifact, backend, path)
+    artifacts = []
+    built = {}
+    for variant in args.variants:
+        print(f"\n--- {variant} ---")
+        model = tf.keras.models.load_model(args.model)
+        try:
+            if variant == "baseline":
+                keras_path, export_model, calibrate = args.model, model, calibration
+            else:
+                resize, flat, head = flatten(model)
+                if variant == "prune" or variant == "prune-2by4":
+                    wrapped, callbacks, strip = prune(flat, head, args, steps_per_epoch,
+                                                      structured=variant == "prune-2by4")
+                elif variant == "cluster":
+                    wrapped, callbacks, strip = cluster(flat, head, args)
+                else:
+                    wrapped, callbacks, strip = quantize_aware(flat)
+                freeze_batch_norm(wrapped)
+                # Trained through the Resizing wrapper; the wrapped layers are shared with it
+                fine_tune(unflatten(resize, wrapped), train_dataset, args.epochs, args.learning_rate, callbacks)
+
+                if strip is None:
+                    # QAT: the fake-quant graph only makes sense as a TFLite int8 model
+                    keras_path, export_model, calibrate = None, unflatten(resize, wrapped), None
+                else:
+                    export_model = unflatten(resize, strip(wrapped))
+                    export_model.compile(optimizer='adam', loss='categorical_crossentropy', metrics=['accuracy'])
+                    keras_path = os.path.join(args.output_dir, f"{variant}.h5")
+                    export_model.save(keras_path)
+                    print(f"✓ keras -> {keras_path}")
+
+            int8_path = os.path.join(args.output_dir, f"{variant}_int8.tflite")
+            with open(int8_path, "wb") as f:
+                f.write(convert(export_model, "int8", representative_dataset=calibrate))
+            print(f"✓ int8  -> {int8_path}")
+        except Exception as e:
+            print(f"✗ {variant} failed: {type(e).__name__}: {e}")
+            continue
+
+        built[variant] = {"kernel_sparsity": kernel_sparsity(export_model)}
+        if keras_path:
+            artifacts.append((variant, "keras", keras_path))
+        artifacts.append((variant, "int8", int8_path))
+
+    # Measure with the Keras the API serves with, not the tf_keras set up for tfmot
+    if legacy_keras:
+        del os.environ["TF_USE_LEGACY_KERAS"]
+    data = {
+        "dataset": DATASET_PATH,
+        "compiled": COMPILED_PATH if os.path.exists(os.path.join(COMPILED_PATH, "index.json")) else None,
+        "manifest": MANIFEST_PATH,
+        "class_names": class_names,
+    }
+    print(f"\nMeasuring {len(artifacts)} artifacts on the validation split...")
+    results = []
+    context = get_context("spawn")
+    for variant, kind, path in artifacts:
+        backend_name = "keras" if kind == "keras" else "tflite"
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            try:
+                measured = pool.submit(measure_artifact, backend_name, path, data, args.batch_size).result()
+            except Exception as e:
+                print(f"✗ {variant} {kind} ({path}): {type(e).__name__}: {e}")
+                continue
+        results.append({"variant": variant, "artifact": kind, "backend": backend_name, "path": path,
+                        **built[variant], **measured})
+
+    print(f"\n{'variant':18} {'MB':>6} {'gzip MB':>7} {'load s':>7} {'RSS MB':>7} {'p50 ms':>7} "
+          f"{'img/s':>7} {'zeros':>6} {'top-1':>7} {'top-3':>7}")
+    print("-" * 92)
+    for r in results:
+        name = f"{r['variant']} {r['artifact']}"
+        print(f"{name:18} {r['file_mb']:6.1f} {r['gzip_mb']:7.1f} {r['load_s']:7.2f} {r['peak_rss_mb']:7.0f} "
+              f"{r['latency_ms_p50']:7.1f} {r['throughput_ips']:7.1f} {r['kernel_sparsity']:6.1%} "
+              f"{r['accuracy']:7.2%} {r['top3_accuracy']:7.2%}")
+
+    report_path = os.path.join(args.output_dir, "report.json")
+    with open(report_path, "w") as f:
+        json.dump({"model": args.model, "settings": {k: v for k, v in vars(args).items() if k != "variants"},
+                   "results": results}, f, indent=2)
+    print(f"\n✓ Report saved to {report_path}")
+    print("Publish a variant with: python model_registry.py publish "
+          f"{args.output_dir}/<variant>_int8.tflite --version <version>")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
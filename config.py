@@ -0,0 +1,98 @@
+# config.py - API runtime settings
+# Every setting can be overridden with a KRISHI_* environment variable.
+import os
+
+
+def _env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+def _env_float(name, default):
+    return float(os.environ.get(name, default))
+
+
+# Model runtime: "keras" (full TensorFlow), "tflite" (see export_tflite.py)
+# or "fake" (deterministic stand-in for benchmarks, see bench_api.py)
+MODEL_BACKEND = os.environ.get("KRISHI_MODEL_BACKEND", "keras")
+TFLITE_THREADS = _env_int("KRISHI_TFLITE_THREADS", os.cpu_count() or 1)
+FAKE_LATENCY_MS = _env_float("KRISHI_FAKE_LATENCY_MS", 20)     # per forward pass
+FAKE_PER_IMAGE_MS = _env_float("KRISHI_FAKE_PER_IMAGE_MS", 2)  # per image in the batch
+
+# Versioned models (model_registry.py). The API serves KRISHI_MODEL_VERSION if
+# set, else the registry's active version, else the newest published one
+MODEL_REGISTRY_DIR = os.environ.get("KRISHI_MODEL_REGISTRY_DIR", "models/registry")
+MODEL_VERSION = os.environ.get("KRISHI_MODEL_VERSION", "")
+MODEL_WATCH_SECONDS = _env_float("KRISHI_MODEL_WATCH_SECONDS", 5)  # poll active.json, 0 disables
+SHADOW_VERSION = os.environ.get("KRISHI_SHADOW_VERSION", "")       # candidate scored on sampled traffic
+SHADOW_SAMPLE_RATE = _env_float("KRISHI_SHADOW_SAMPLE_RATE", 0.05)
+SHADOW_MAX_PENDING = _env_int("KRISHI_SHADOW_MAX_PENDING", 32)     # drop samples beyond this backlog
+ADMIN_TOKEN = os.environ.get("KRISHI_ADMIN_TOKEN", "")             # /models/* admin endpoints, empty = disabled
+
+# Unversioned model files, served while the registry is empty
+DEFAULT_MODEL_PATHS = {
+    "keras": "models/best_model.h5",
+    "tflite": "models/best_model_float16.tflite",
+}
+MODEL_PATH = os.environ.get("KRISHI_MODEL_PATH", DEFAULT_MODEL_PATHS.get(MODEL_BACKEND, ""))
+CLASS_NAMES_PATH = os.environ.get("KRISHI_CLASS_NAMES_PATH", "models/class_names.json")
+LEGACY_MODEL_VERSION = "1.0"
+IMG_SIZE = 224
+
+# Micro-batching: concurrent /predict requests are grouped into one forward pass
+MAX_BATCH_SIZE = _env_int("KRISHI_MAX_BATCH_SIZE", 16)      # images per forward pass
+MAX_BATCH_WAIT_MS = _env_float("KRISHI_MAX_BATCH_WAIT_MS", 5)  # wait for more images
+MAX_QUEUE_SIZE = _env_int("KRISHI_MAX_QUEUE_SIZE", 256)      # pending images before rejecting
+
+# POST /predict/batch
+BATCH_CHUNK_SIZE = _env_int("KRISHI_BATCH_CHUNK_SIZE", 32)  # images per forward pass
+MAX_BATCH_FILES = _env_int("KRISHI_MAX_BATCH_FILES", 100)   # images per request (after unpacking archives)
+
+# POST /predict/tiles (tiling.py): overlapping 224x224 windows over a high-resolution photo
+TILE_OVERLAP = _env_float("KRISHI_TILE_OVERLAP", 0.5)                  # share of a window its neighbour covers
+TILE_MIN_GREEN_RATIO = _env_float("KRISHI_TILE_MIN_GREEN_RATIO", 0.15)  # below this a window is background
+TILE_BATCH_SIZE = _env_int("KRISHI_TILE_BATCH_SIZE", 32)               # windows per forward pass
+TILE_MAX_MEGAPIXELS = _env_float("KRISHI_TILE_MAX_MEGAPIXELS", 50)
+MAX_TILED_UPLOAD_MB = _env_float("KRISHI_MAX_TILED_UPLOAD_MB", 50)
+
+# Admission control (admission.py) for /predict and /predict/batch
+ADMISSION_MAX_IN_FLIGHT = _env_int("KRISHI_ADMISSION_MAX_IN_FLIGHT", 64)  # concurrent requests, 0 = unlimited
+RATE_LIMIT_PER_SECOND = _env_float("KRISHI_RATE_LIMIT_PER_SECOND", 0)    # per client, 0 disables
+RATE_LIMIT_BURST = _env_int("KRISHI_RATE_LIMIT_BURST", 20)
+REQUEST_TIMEOUT_SECONDS = _env_float("KRISHI_REQUEST_TIMEOUT_SECONDS", 30)  # queued work is dropped after this
+MAX_UPLOAD_MB = _env_float("KRISHI_MAX_UPLOAD_MB", 20)              # /predict body
+MAX_BATCH_UPLOAD_MB = _env_float("KRISHI_MAX_BATCH_UPLOAD_MB", 200)  # /predict/batch body
+RETRY_AFTER_SECONDS = _env_int("KRISHI_RETRY_AFTER_SECONDS", 1)
+TRUST_FORWARDED_FOR = os.environ.get("KRISHI_TRUST_FORWARDED_FOR", "0") == "1"  # behind a reverse proxy
+
+# WebSocket camera-frame scanning (streaming.py)
+STREAM_MAX_CONNECTIONS = _env_int("KRISHI_STREAM_MAX_CONNECTIONS", 64)   # open scanning sockets
+STREAM_MAX_FRAME_MB = _env_float("KRISHI_STREAM_MAX_FRAME_MB", 2)        # one compressed frame
+STREAM_DUPLICATE_DISTANCE = _env_int("KRISHI_STREAM_DUPLICATE_DISTANCE", 4)  # hash bits (of 64) to count as a repeat
+STREAM_SCENE_CHANGE_DISTANCE = _env_int("KRISHI_STREAM_SCENE_CHANGE_DISTANCE", 20)  # restart smoothing beyond this
+STREAM_SMOOTHING = _env_float("KRISHI_STREAM_SMOOTHING", 0.3)            # weight of the newest frame
+
+# Executors that keep decode and inference off the event loop
+DECODE_WORKERS = _env_int("KRISHI_DECODE_WORKERS", min(8, os.cpu_count() or 1))
+INFERENCE_WORKERS = _env_int("KRISHI_INFERENCE_WORKERS", 1)  # TensorFlow already uses all cores per call
+
+# Pre-inference image gate (gate.py): reject non-leaf images before the model
+GATE_ENABLED = os.environ.get("KRISHI_GATE_ENABLED", "1") == "1"
+GATE_MIN_SIZE = _env_int("KRISHI_GATE_MIN_SIZE", 50)                       # shortest side, pixels
+GATE_MAX_ASPECT_RATIO = _env_float("KRISHI_GATE_MAX_ASPECT_RATIO", 10)
+GATE_MIN_GREEN_RATIO = _env_float("KRISHI_GATE_MIN_GREEN_RATIO", 0.05)     # 0 disables the colour check
+GATE_MIN_CONTRAST = _env_float("KRISHI_GATE_MIN_CONTRAST", 4)              # grey-level std, 0 disables
+
+# Prediction cache, keyed on sha256(model version + uploaded bytes)
+CACHE_ENABLED = os.environ.get("KRISHI_CACHE_ENABLED", "1") == "1"
+CACHE_MAX_ENTRIES = _env_int("KRISHI_CACHE_MAX_ENTRIES", 10000)
+CACHE_MAX_MB = _env_float("KRISHI_CACHE_MAX_MB", 64)
+CACHE_TTL_SECONDS = _env_float("KRISHI_CACHE_TTL_SECONDS", 24 * 3600)
+CACHE_DIR = os.environ.get("KRISHI_CACHE_DIR", "")  # empty = memory only
+
+# Startup warm-up: synthetic batches run before /ready reports ready
+WARMUP_BATCH_SIZES = [
+    int(size) for size in os.environ.get(
+        "KRISHI_WARMUP_BATCH_SIZES", f"1,{MAX_BATCH_SIZE},{BATCH_CHUNK_SIZE}"
+    ).split(",") if size.strip()
+]
+WARMUP_ROUNDS = _env_int("KRISHI_WARMUP_ROUNDS", 2)
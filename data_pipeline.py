@@ -0,0 +1,192 @@
+# data_pipeline.py - parallel tf.data input pipeline for training
+# Replaces ImageDataGenerator.flow_from_directory: files are listed in
+# parallel, decoded on all cores, augmented a whole batch at a time on the
+# graph, optionally cached and prefetched while the model trains.
+import math
+import os
+
+import numpy as np
+import tensorflow as tf
+
+from check_dataset import MANIFEST_PATH, load_manifest, load_split
+from preprocessing import load_image
+
+AUTOTUNE = tf.data.AUTOTUNE
+IMG_SIZE = 224
+
+
+def decode_file(path, img_size=IMG_SIZE):
+    """
+    Read, decode and resize one image to uint8 (img_size, img_size, 3) with
+    the API's preprocessing.load_image (EXIF orientation, draft decode,
+    bilinear resize), like the compiled dataset, so training sees every
+    photo exactly as serving does. PIL releases the GIL while decoding and
+    resizing, so the parallel map still uses all cores.
+    """
+    image = tf.numpy_function(
+        lambda p: load_image(p.decode(), (img_size, img_size)), [path], tf.uint8, stateful=False
+    )
+    image.set_shape((img_size, img_size, 3))
+    return image
+
+
+def make_augmenter(rotation_range=0.0, width_shift_range=0.0, height_shift_range=0.0,
+                   shear_range=0.0, zoom_range=0.0, horizontal_flip=False,
+                   vertical_flip=False, fill_mode="nearest", seed=None):
+    """
+    Batched equivalent of ImageDataGenerator's random affine augmentation.
+
+    Arguments mean the same as in ImageDataGenerator: rotation and shear in
+    degrees, shifts as a fraction of width/height, zoom as [1 - z, 1 + z]
+    drawn independently per axis. One projective transform per image is
+    built with vectorized ops and the whole batch is warped in a single
+    ImageProjectiveTransformV3 call.
+    """
+    rng = tf.random.Generator.from_seed(seed) if seed is not None else tf.random.Generator.from_non_deterministic_state()
+    needs_warp = any((rotation_range, width_shift_range, height_shift_range, shear_range, zoom_range))
+
+    def uniform(n, limit):
+        return rng.uniform([n], -limit, limit)
+
+    def augment(images):
+        shape = tf.shape(images)
+        n = shape[0]
+        height = tf.cast(shape[1], tf.float32)
+        width = tf.cast(shape[2], tf.float32)
+
+        if needs_warp:
+            theta = uniform(n, rotation_range * math.pi / 180.0)
+            shear = uniform(n, shear_range * math.pi / 180.0)
+            zoom_x = 1.0 + uniform(n, zoom_range)
+            zoom_y = 1.0 + uniform(n, zoom_range)
+            shift_x = uniform(n, width_shift_range) * width
+            shift_y = uniform(n, height_shift_range) * height
+
+            # Output pixel (x, y) samples input at A @ (x - c) + c + shift, with
+            # A = rotation @ shear @ zoom, all around the image centre c
+            cos, sin = tf.cos(theta), tf.sin(theta)
+            a00 = cos * zoom_x
+            a01 = (-sin * tf.cos(shear) - cos * tf.sin(shear)) * zoom_y
+            a10 = sin * zoom_x
+            a11 = (cos * tf.cos(shear) - sin * tf.sin(shear)) * zoom_y
+            cx, cy = (width - 1) / 2.0, (height - 1) / 2.0
+            a02 = cx - a00 * cx - a01 * cy + shift_x
+            a12 = cy - a10 * cx - a11 * cy + shift_y
+            zeros = tf.zeros_like(a00)
+            transforms = tf.stack([a00, a01, a02, a10, a11, a12, zeros, zeros], axis=1)
+
+            images = tf.raw_ops.ImageProjectiveTransformV3(
+                images=images,
+                transforms=transforms,
+                output_shape=shape[1:3],
+                fill_value=0.0,
+                interpolation="BILINEAR",
+                fill_mode=fill_mode.upper()
+            )
+
+        if horizontal_flip:
+            flip = rng.uniform([n]) < 0.5
+            images = tf.where(flip[:, None, None, None], tf.reverse(images, axis=[2]), images)
+        if vertical_flip:
+            flip = rng.uniform([n]) < 0.5
+            images = tf.where(flip[:, None, None, None], tf.reverse(images, axis=[1]), images)
+        return images
+
+    return augment
+
+
+def make_dataset(files, labels, num_classes, batch_size=32, training=False, augment=None,
+                 cache=None, shuffle_buffer=2048, img_size=IMG_SIZE, seed=None):
+    """
+    Build a batched (images, one-hot labels) dataset.
+
+    images are float32 in [0, 1], like the API's preprocessing. cache=""
+    keeps decoded uint8 images in memory after the first epoch; a file path
+    caches them on disk instead. Training datasets are reshuffled every
+    epoch and give up element order for throughput.
+    """
+    dataset = tf.data.Dataset.from_tensor_slices((files, labels))
+    if training and cache is None:
+        # Shuffling paths is free; shuffle before the expensive decode
+        dataset = dataset.shuffle(len(files), seed=seed, reshuffle_each_iteration=True)
+
+    dataset = dataset.map(
+        lambda path, label: (decode_file(path, img_size), label),
+        num_parallel_calls=AUTOTUNE,
+        deterministic=not training
+    )
+    if cache is not None:
+        dataset = dataset.cache(cache)
+        if training:
+            dataset = dataset.shuffle(shuffle_buffer, seed=seed, reshuffle_each_iteration=True)
+
+    dataset = dataset.batch(batch_size)
+    dataset = dataset.map(_finisher(num_classes, augment), num_parallel_calls=AUTOTUNE,
+                          deterministic=not training)
+    return dataset.prefetch(AUTOTUNE)
+
+
+def _finisher(num_classes, augment):
+    """uint8 batch -> float32 [0, 1] (augmented) images and one-hot labels"""
+    def finish(images, labels):
+        images = tf.cast(images, tf.float32) / 255.0
+        if augment is not None:
+            images = augment(images)
+        return images, tf.one_hot(labels, num_classes)
+    return finish
+
+
+def make_compiled_dataset(compiled, indices, num_classes, batch_size=32, training=False,
+                          augment=None, seed=None):
+    """
+    Same output as make_dataset, read from a dataset_compiler.CompiledDataset
+    instead of image files: no decoding, batches come straight from the
+    memory-mapped shards. Training order is reshuffled every epoch.
+    """
+    indices = np.asarray(indices)
+    rng = np.random.default_rng(seed)
+    size = compiled.img_size
+
+    def generator():
+        order = rng.permutation(indices) if training else indices
+        yield from compiled.batches(order, batch_size)
+
+    dataset = tf.data.Dataset.from_generator(generator, output_signature=(
+        tf.TensorSpec((None, size, size, 3), tf.uint8),
+        tf.TensorSpec((None,), tf.int32)
+    ))
+    dataset = dataset.map(_finisher(num_classes, augment), num_parallel_calls=AUTOTUNE,
+                          deterministic=not training)
+    return dataset.prefetch(AUTOTUNE)
+
+
+def load_datasets(dataset_path, batch_size=32, augment=None, validation_split=0.2,
+                  compiled_path=None, img_size=IMG_SIZE, manifest_path=MANIFEST_PATH):
+    """
+    Training and validation datasets for the training scripts, read from
+    compiled_path if it holds a compiled dataset and from the image files
+    otherwise. The split is the one pinned in the check_dataset.py manifest
+    when there is one, validation_split per class otherwise.
+    Returns: class_names, (train_dataset, train_labels), (val_dataset, val_labels)
+    """
+    if compiled_path and os.path.exists(os.path.join(compiled_path, "index.json")):
+        from dataset_compiler import CompiledDataset
+
+        compiled = CompiledDataset(compiled_path)
+        if compiled.img_size != img_size:
+            raise ValueError(f"{compiled_path} was compiled at {compiled.img_size}px, not {img_size}px")
+        print(f"Reading compiled dataset from {compiled_path}")
+        class_names = compiled.class_names
+        train_idx, val_idx = compiled.split(validation_split, load_manifest(manifest_path))
+        train = make_compiled_dataset(compiled, train_idx, len(class_names), batch_size,
+                                      training=True, augment=augment)
+        val = make_compiled_dataset(compiled, val_idx, len(class_names), batch_size)
+        return class_names, (train, compiled.labels[train_idx].tolist()), (val, compiled.labels[val_idx].tolist())
+
+    class_names, (train_files, train_labels), (val_files, val_labels) = load_split(
+        dataset_path, manifest_path, validation_split
+    )
+    train = make_dataset(train_files, train_labels, len(class_names), batch_size,
+                         training=True, augment=augment, img_size=img_size)
+    val = make_dataset(val_files, val_labels, len(class_names), batch_size, img_size=img_size)
+    return class_names, (train, train_labels), (val, val_labels)
@@ -0,0 +1,281 @@
+# dataset_compiler.py - compile dataset/ into pre-decoded uint8 shards
+# Usage: python dataset_compiler.py [--dataset dataset] [--output dataset_compiled]
+#
+# Every image is decoded and resized once (with the API's preprocessing) and
+# written to shard_NNNNN.npy files of shape (n, IMG_SIZE, IMG_SIZE, 3) uint8,
+# listed in index.json together with each source file's size, mtime and
+# label. Labels follow models/class_names.json when it exists. Re-running
+# only decodes files that were added or changed; shards whose files are all
+# unchanged are kept as they are.
+#
+# CompiledDataset reads the shards as memory maps; contiguous batches are
+# zero-copy slices of a shard.
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from preprocessing import IMG_SIZE, load_image
+from utils import is_image_filename
+
+INDEX_FILE = "index.json"
+INDEX_VERSION = 1
+SHARD_SIZE = 1024  # images per shard, ~150 MB at 224x224
+
+
+def scan(dataset_path):
+    """{relative path: (size, mtime_ns)} for every image in the class folders"""
+    found = {}
+    for class_dir in os.scandir(dataset_path):
+        if not class_dir.is_dir():
+            continue
+        with os.scandir(class_dir.path) as entries:
+            for entry in entries:
+                if entry.is_file() and is_image_filename(entry.name):
+                    stat = entry.stat()
+                    found[f"{class_dir.name}/{entry.name}"] = (stat.st_size, stat.st_mtime_ns)
+    return found
+
+
+def load_class_names(dataset_path, class_names_path):
+    """class_names.json if it exists ({index: name}), else the sorted folder names"""
+    if class_names_path and os.path.exists(class_names_path):
+        with open(class_names_path) as f:
+            return {int(idx): name for idx, name in json.load(f).items()}
+    classes = sorted(d.name for d in os.scandir(dataset_path) if d.is_dir())
+    return dict(enumerate(classes))
+
+
+def read_index(output):
+    path = os.path.join(output, INDEX_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def _write_shard(output, shard_id, dataset_path, entries, img_size, workers):
+    """Decode entries into shard_<id>.npy; returns (shard or None, entries that failed)"""
+    def decode(entry):
+        try:
+            return load_image(os.path.join(dataset_path, entry[0]), (img_size, img_size))
+        except Exception as e:
+            print(f"  ✗ Skipping {entry[0]}: {e}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        images = list(pool.map(decode, entries))
+    kept = [(entry, image) for entry, image in zip(entries, images) if image is not None]
+    failed = [entry[:3] for entry, image in zip(entries, images) if image is None]
+    if not kept:
+        return None, failed
+
+    name = f"shard_{shard_id:05d}.npy"
+    tmp_path = os.path.join(output, name + ".tmp")
+    shard = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.uint8,
+                                      shape=(len(kept), img_size, img_size, 3))
+    for i, (_, image) in enumerate(kept):
+        shard[i] = image
+    shard.flush()
+    del shard
+    os.replace(tmp_path, os.path.join(output, name))
+    return {"file": name, "entries": [entry for entry, _ in kept]}, failed
+
+
+def compile_dataset(dataset_path, output, class_names_path="models/class_names.json",
+                    img_size=IMG_SIZE, shard_size=SHARD_SIZE, workers=None, rebuild=False):
+    """
+    Build or update the compiled dataset in output. Returns a summary dict.
+
+    Raises ValueError if dataset_path has a class folder that is not in
+    class_names.json, since its images could not be given a label.
+    """
+    workers = workers or min(16, os.cpu_count() or 1)
+    class_names = load_class_names(dataset_path, class_names_path)
+    label_of = {name: idx for idx, name in class_names.items()}
+    found = scan(dataset_path)
+    unknown = sorted({path.split("/", 1)[0] for path in found} - set(label_of))
+    if unknown:
+        raise ValueError(f"Class folders not in {class_names_path}: {', '.join(unknown)}")
+
+    os.makedirs(output, exist_ok=True)
+    index = None if rebuild else read_index(output)
+    if index is not None and (index.get("version") != INDEX_VERSION
+                              or index["img_size"] != img_size
+                              or index["class_names"] != {str(k): v for k, v in class_names.items()}):
+        print("Settings or class names changed, rebuilding everything")
+        index = None
+
+    # Keep shards whose files are all still there and unchanged
+    kept_shards, compiled = [], set()
+    for shard in (index or {}).get("shards", []):
+        if all(found.get(path) == (size, mtime) for path, size, mtime, _ in shard["entries"]):
+            kept_shards.append(shard)
+            compiled.update(entry[0] for entry in shard["entries"])
+
+    # Files that failed to decode last time are only retried once they change
+    skipped = [entry for entry in (index or {}).get("skipped", []) if found.get(entry[0]) == tuple(entry[1:])]
+    compiled.update(entry[0] for entry in skipped)
+
+    pending = [[path, size, mtime, label_of[path.split("/", 1)[0]]]
+               for path, (size, mtime) in sorted(found.items()) if path not in compiled]
+
+    # New shards never reuse a name, so the old index stays valid until it is replaced
+    existing = [name for name in os.listdir(output) if name.startswith("shard_") and name.endswith(".npy")]
+    next_id = max((int(name[6:11]) for name in existing), default=-1) + 1
+    new_shards = []
+    start = time.perf_counter()
+    for offset in range(0, len(pending), shard_size):
+        shard, failed = _write_shard(output, next_id, dataset_path, pending[offset:offset + shard_size],
+                                     img_size, workers)
+        skipped += failed
+        if shard is not None:
+            new_shards.append(shard)
+            next_id += 1
+            print(f"  ✓ {shard['file']}: {len(shard['entries'])} images")
+    elapsed = time.perf_counter() - start
+
+    shards = kept_shards + new_shards
+    index = {
+        "version": INDEX_VERSION,
+        "img_size": img_size,
+        "class_names": {str(k): v for k, v in class_names.items()},
+        "shards": shards,
+        "skipped": skipped,
+    }
+    tmp_path = os.path.join(output, INDEX_FILE + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(index, f)
+    os.replace(tmp_path, os.path.join(output, INDEX_FILE))
+
+    # Shards no longer in the index (their files changed or were removed)
+    live = {shard["file"] for shard in shards}
+    removed = [name for name in os.listdir(output)
+               if name.startswith("shard_") and name.endswith(".npy") and name not in live]
+    for name in removed:
+        os.remove(os.path.join(output, name))
+
+    return {
+        "images": sum(len(s["entries"]) for s in shards),
+        "reused_shards": len(kept_shards),
+        "new_shards": len(new_shards),
+        "removed_shards": len(removed),
+        "skipped": len(skipped),
+        "decoded": sum(len(s["entries"]) for s in new_shards),
+        "seconds": elapsed,
+    }
+
+
+class CompiledDataset:
+    """Read-only view of a compiled dataset; images are uint8 memory maps"""
+
+    def __init__(self, path):
+        index = read_index(path)
+        if index is None:
+            raise FileNotFoundError(f"No compiled dataset in {path} (run dataset_compiler.py)")
+        self.path = path
+        self.img_size = index["img_size"]
+        self.class_names = {int(idx): name for idx, name in index["class_names"].items()}
+        self._shards = [np.load(os.path.join(path, s["file"]), mmap_mode="r") for s in index["shards"]]
+        entries = [entry for s in index["shards"] for entry in s["entries"]]
+        self.paths = [entry[0] for entry in entries]
+        self.labels = np.array([entry[3] for entry in entries], dtype=np.int32)
+        # Global index of the first image in each shard
+        self._starts = np.cumsum([0] + [len(s) for s in self._shards])
+
+    def __len__(self):
+        return len(self.labels)
+
+    def _locate(self, i):
+        shard = int(np.searchsorted(self._starts, i, side="right")) - 1
+        return shard, i - self._starts[shard]
+
+    def __getitem__(self, i):
+        shard, offset = self._locate(i)
+        return self._shards[shard][offset]
+
+    def split(self, validation_split=0.2, manifest=None):
+        """
+        (train_indices, val_indices). With a check_dataset.py manifest each
+        image keeps the split pinned there (images missing from it are left
+        out); otherwise list_image_files' rule is used: per class, the first
+        validation_split of the sorted file names go to validation.
+        """
+        if manifest is not None:
+            pinned = {path: entry["split"] for path, entry in manifest["files"].items()}
+            train = [i for i, path in enumerate(self.paths) if pinned.get(path) == "train"]
+            val = [i for i, path in enumerate(self.paths) if pinned.get(path) == "val"]
+            return np.array(train, dtype=np.int64), np.array(val, dtype=np.int64)
+
+        train, val = [], []
+        for label in sorted(set(self.labels.tolist())):
+            members = sorted(np.flatnonzero(self.labels == label), key=lambda i: self.paths[i])
+            cut = int(validation_split * len(members))
+            val += members[:cut]
+            train += members[cut:]
+        return np.array(train, dtype=np.int64), np.array(val, dtype=np.int64)
+
+    def batches(self, indices=None, batch_size=32):
+        """
+        Yield (images, labels) batches. Without indices the whole dataset is
+        walked shard by shard and every batch is a slice of the memory map
+        (no copy); runs of consecutive indices inside one shard are sliced
+        the same way, anything else is gathered into a new array.
+        """
+        if indices is None:
+            for shard, start in zip(self._shards, self._starts):
+                for offset in range(0, len(shard), batch_size):
+                    images = shard[offset:offset + batch_size]
+                    yield images, self.labels[start + offset:start + offset + len(images)]
+            return
+
+        indices = np.asarray(indices)
+        for offset in range(0, len(indices), batch_size):
+            chunk = indices[offset:offset + batch_size]
+            first_shard, first = self._locate(chunk[0])
+            last_shard, _ = self._locate(chunk[-1])
+            if first_shard == last_shard and np.all(np.diff(chunk) == 1):
+                images = self._shards[first_shard][first:first + len(chunk)]
+            else:
+                images = np.stack([self[i] for i in chunk])
+            yield images, self.labels[chunk]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile dataset/ into pre-decoded uint8 shards")
+    parser.add_argument("--dataset", default="dataset")
+    parser.add_argument("--output", default="dataset_compiled")
+    parser.add_argument("--class-names", default="models/class_names.json")
+    parser.add_argument("--img-size", type=int, default=IMG_SIZE)
+    parser.add_argument("--shard-size", type=int, default=SHARD_SIZE)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--rebuild", action="store_true", help="ignore the existing shards")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("DATASET COMPILER")
+    print("=" * 60)
+    print(f"{args.dataset} -> {args.output}")
+
+    try:
+        summary = compile_dataset(args.dataset, args.output, args.class_names, args.img_size,
+                                  args.shard_size, args.workers, args.rebuild)
+    except ValueError as e:
+        print(f"✗ {e}")
+        raise SystemExit(1)
+
+    rate = summary["decoded"] / summary["seconds"] if summary["seconds"] else 0.0
+    print(f"\n✓ {summary['images']} images in {summary['reused_shards'] + summary['new_shards']} shards")
+    print(f"✓ Reused {summary['reused_shards']} shards, wrote {summary['new_shards']}, "
+          f"removed {summary['removed_shards']}")
+    if summary["skipped"]:
+        print(f"⚠️  {summary['skipped']} unreadable files skipped (retried when they change)")
+    print(f"✓ Decoded {summary['decoded']} images in {summary['seconds']:.1f}s ({rate:.0f} img/s)")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
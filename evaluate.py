@@ -0,0 +1,257 @@
+# evaluate.py - score a model backend on the whole validation split (or any folder)
+# Usage:
+#     python evaluate.py                                  # validation split of dataset/
+#     python evaluate.py --backend tflite --model models/best_model_float16.tflite
+#     python evaluate.py --data field_photos/ --split all  # any folder of class folders
+#     python evaluate.py --output eval.json --compare baseline.json   # exit 1 on regression
+#
+# Images are decoded by a thread pool a few batches ahead of the model, so
+# decoding overlaps inference. A compiled dataset (dataset_compiler.py) is
+# read directly from its shards and skips decoding altogether.
+import argparse
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import config
+from check_dataset import MANIFEST_PATH, load_manifest, load_split
+from preprocessing import load_image, normalize
+from utils import list_image_files
+
+PREFETCH_BATCHES = 2
+
+
+def list_labelled_files(data_path, class_names, split, manifest_path):
+    """
+    (files, labels) from a folder of class folders, labelled with the model's
+    class indices. split is "val" or "train" (as pinned in the manifest, or
+    the 80/20 rule without one) or "all". Folders that are not model classes
+    are reported and skipped.
+    """
+    label_of = {name: idx for idx, name in class_names.items()}
+    if split == "all":
+        folders, (train_files, train_labels), (val_files, val_labels) = list_image_files(data_path, 0.0)
+    else:
+        folders, (train_files, train_labels), (val_files, val_labels) = load_split(data_path, manifest_path)
+    unknown = sorted(set(folders.values()) - set(label_of))
+    if unknown:
+        print(f"⚠️  Skipping folders that are not model classes: {', '.join(unknown)}")
+
+    files, labels = (val_files, val_labels) if split == "val" else (train_files, train_labels)
+    pairs = [(f, label_of[folders[label]]) for f, label in zip(files, labels)
+             if folders[label] in label_of]
+    return [f for f, _ in pairs], np.array([label for _, label in pairs], dtype=np.int64)
+
+
+def _load(path):
+    try:
+        return load_image(path)
+    except Exception as e:
+        print(f"\n  ✗ Skipping {path}: {e}")
+        return None
+
+
+def file_batches(files, labels, batch_size, pool):
+    """Yield (float32 images, labels), keeping PREFETCH_BATCHES batches decoding ahead"""
+    pending = deque()
+    for start in range(0, len(files) + batch_size * PREFETCH_BATCHES, batch_size):
+        if start < len(files):
+            futures = [pool.submit(_load, f) for f in files[start:start + batch_size]]
+            pending.append((futures, labels[start:start + batch_size]))
+        if len(pending) > PREFETCH_BATCHES or (start >= len(files) and pending):
+            futures, batch_labels = pending.popleft()
+            images = [future.result() for future in futures]
+            decoded = [i for i, image in enumerate(images) if image is not None]
+            if decoded:
+                yield normalize(np.stack([images[i] for i in decoded])), batch_labels[decoded]
+
+
+def compiled_batches(compiled, indices, batch_size):
+    for images, labels in compiled.batches(indices, batch_size):
+        yield normalize(images), labels.astype(np.int64)
+
+
+def confusion_matrix(labels, predicted, num_classes):
+    matrix = np.zeros((num_classes, num_classes), dtype=np.int64)
+    np.add.at(matrix, (labels, predicted), 1)
+    return matrix
+
+
+def summarize(labels, probabilities, class_names, seconds, model_seconds):
+    num_classes = len(class_names)
+    predicted = probabilities.argmax(axis=1)
+    top3 = np.argsort(probabilities, axis=1)[:, -3:]
+    matrix = confusion_matrix(labels, predicted, num_classes)
+
+    true_positives = np.diag(matrix)
+    predicted_counts = matrix.sum(axis=0)
+    support = matrix.sum(axis=1)
+    precision = np.divide(true_positives, predicted_counts, out=np.zeros(num_classes), where=predicted_counts > 0)
+    recall = np.divide(true_positives, support, out=np.zeros(num_classes), where=support > 0)
+    f1 = np.divide(2 * precision * recall, precision + recall,
+                   out=np.zeros(num_classes), where=(precision + recall) > 0)
+
+    return {
+        "images": int(len(labels)),
+        "accuracy": float(np.mean(predicted == labels)),
+        "top3_accuracy": float(np.mean((top3 == labels[:, None]).any(axis=1))),
+        "images_per_second": len(labels) / seconds,
+        "model_images_per_second": len(labels) / model_seconds if model_seconds else None,
+        "seconds": seconds,
+        "per_class": {
+            class_names[i]: {"precision": float(precision[i]), "recall": float(recall[i]),
+                             "f1": float(f1[i]), "support": int(support[i])}
+            for i in range(num_classes)
+        },
+        "confusion_matrix": matrix.tolist(),
+    }
+
+
+def print_report(results, class_names):
+    print(f"\n{'class':35} {'precision':>9} {'recall':>7} {'f1':>6} {'support':>8}")
+    print("-" * 69)
+    for name, r in results["per_class"].items():
+        print(f"{name:35} {r['precision']:9.2%} {r['recall']:7.2%} {r['f1']:6.2f} {r['support']:8}")
+
+    # Confusion matrix, rows = true class, columns = predicted class (by index)
+    num_classes = len(class_names)
+    print("\nConfusion matrix (rows: true, columns: predicted)")
+    print("    " + "".join(f"{i:>6}" for i in range(num_classes)))
+    for i, row in enumerate(results["confusion_matrix"]):
+        print(f"{i:>3} " + "".join(f"{count:>6}" for count in row) + f"   {class_names[i]}")
+
+    print(f"\nImages: {results['images']}")
+    print(f"Top-1 accuracy: {results['accuracy']:.2%}")
+    print(f"Top-3 accuracy: {results['top3_accuracy']:.2%}")
+    print(f"Throughput: {results['images_per_second']:.1f} img/s end to end, "
+          f"{results['model_images_per_second']:.1f} img/s model only")
+
+
+def compare(current, baseline, tolerance):
+    """Accuracy drops of more than one point, throughput drops beyond tolerance"""
+    problems = []
+    for key in ("accuracy", "top3_accuracy"):
+        if current[key] < baseline[key] - 0.01:
+            problems.append(f"{key} {baseline[key]:.2%} -> {current[key]:.2%}")
+    for name, base in baseline["per_class"].items():
+        now = current["per_class"].get(name)
+        if now and base["support"] and now["recall"] < base["recall"] - 0.05:
+            problems.append(f"{name}: recall {base['recall']:.2%} -> {now['recall']:.2%}")
+    for key in ("images_per_second", "model_images_per_second"):
+        if baseline.get(key) and current[key] < baseline[key] * (1 - tolerance):
+            problems.append(f"{key} {baseline[key]:.1f} -> {current[key]:.1f}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate a model backend on a labelled image set")
+    parser.add_argument("--backend", default=config.MODEL_BACKEND, help="keras, tflite or fake")
+    parser.add_argument("--model", default=None, help="model file (default: the backend's default path)")
+    parser.add_argument("--class-names", default=config.CLASS_NAMES_PATH)
+    parser.add_argument("--data", default="dataset", help="folder of class folders")
+    parser.add_argument("--compiled", default="dataset_compiled",
+                        help="compiled dataset to read instead, when it exists and --data is dataset")
+    parser.add_argument("--split", choices=["val", "train", "all"], default="val")
+    parser.add_argument("--manifest", default=MANIFEST_PATH, help="check_dataset.py manifest with the pinned split")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=config.DECODE_WORKERS, help="decode threads")
+    parser.add_argument("--output", default=None, help="save the results as JSON")
+    parser.add_argument("--compare", default=None, help="baseline JSON to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed throughput drop")
+    args = parser.parse_args()
+
+    from backends import load_backend
+
+    if args.model:
+        model_path = args.model
+    elif args.backend == config.MODEL_BACKEND:
+        model_path = config.MODEL_PATH
+    else:
+        model_path = config.DEFAULT_MODEL_PATHS.get(args.backend, "")
+    with open(args.class_names) as f:
+        class_names = {int(idx): name for idx, name in json.load(f).items()}
+
+    print("=" * 60)
+    print("MODEL EVALUATION")
+    print("=" * 60)
+    print(f"Backend: {args.backend} ({model_path})")
+
+    use_compiled = args.data == "dataset" and os.path.exists(os.path.join(args.compiled, "index.json"))
+    if use_compiled:
+        from dataset_compiler import CompiledDataset
+
+        compiled = CompiledDataset(args.compiled)
+        if compiled.class_names != class_names:
+            raise SystemExit(f"✗ {args.compiled} was compiled with different class names")
+        if args.split == "all":
+            train_idx, val_idx = compiled.split(0.0)
+        else:
+            train_idx, val_idx = compiled.split(0.2, load_manifest(args.manifest))
+        indices = val_idx if args.split == "val" else train_idx
+        labels = compiled.labels[indices].astype(np.int64)
+        print(f"Data: {args.compiled} ({args.split} split, pre-decoded)")
+    else:
+        files, labels = list_labelled_files(args.data, class_names, args.split, args.manifest)
+        print(f"Data: {args.data} ({args.split} split)")
+    print(f"Images: {len(labels)}   Batch size: {args.batch_size}")
+    if not len(labels):
+        raise SystemExit("✗ No images to evaluate")
+
+    backend = load_backend(args.backend, model_path, img_size=config.IMG_SIZE)
+    dummy = np.zeros((args.batch_size, config.IMG_SIZE, config.IMG_SIZE, 3), dtype=np.float32)
+    warmup = np.asarray(backend.predict(dummy))  # build / allocate before timing
+    if warmup.shape[1] != len(class_names):
+        raise SystemExit(f"✗ Model has {warmup.shape[1]} outputs, {args.class_names} lists {len(class_names)} classes")
+
+    outputs, scored_labels = [], []
+    model_seconds = 0.0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        batches = (compiled_batches(compiled, indices, args.batch_size) if use_compiled
+                   else file_batches(files, labels, args.batch_size, pool))
+        for images, batch_labels in batches:
+            model_start = time.perf_counter()
+            outputs.append(np.asarray(backend.predict(images)))
+            model_seconds += time.perf_counter() - model_start
+            scored_labels.append(batch_labels)
+            done = sum(len(o) for o in outputs)
+            print(f"\r  {done}/{len(labels)} images", end="", flush=True)
+    seconds = time.perf_counter() - start
+    print()
+
+    results = summarize(np.concatenate(scored_labels), np.concatenate(outputs), class_names,
+                        seconds, model_seconds)
+    print_report(results, class_names)
+
+    report = {
+        "backend": args.backend,
+        "model": model_path,
+        "data": args.compiled if use_compiled else args.data,
+        "split": args.split,
+        "batch_size": args.batch_size,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n✓ Results saved to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        problems = compare(results, baseline["results"], args.tolerance)
+        print(f"\nCompared with {args.compare} ({baseline['backend']}, {baseline['model']}):")
+        if problems:
+            for problem in problems:
+                print(f"  ✗ {problem}")
+            raise SystemExit(1)
+        print("  ✓ No regressions")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
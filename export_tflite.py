@@ -0,0 +1,68 @@
+# export_tflite.py - convert the trained Keras model to TensorFlow Lite
+# Usage: python export_tflite.py [--model models/best_model.h5] [--variants float32 float16 int8]
+import argparse
+import os
+
+import tensorflow as tf
+
+VARIANTS = ("float32", "float16", "int8")
+
+
+def convert(model, variant, representative_dataset=None):
+    """
+    Convert a Keras model to a TFLite flatbuffer
+      float32 - plain conversion, same numerics as Keras
+      float16 - weights stored as float16 (half the size, float32 compute)
+      int8    - dynamic-range quantization: int8 weights, float32 inputs/outputs;
+                with a representative_dataset (a generator of [image] lists),
+                full-integer: activations are calibrated on it and int8 too
+    """
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if variant == "float16":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif variant == "int8":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        if representative_dataset is not None:
+            converter.representative_dataset = representative_dataset
+            converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    elif variant != "float32":
+        raise ValueError(f"Unknown variant '{variant}', expected one of {VARIANTS}")
+    return converter.convert()
+
+
+def output_path(model_path, variant):
+    """models/best_model.h5 -> models/best_model_float16.tflite"""
+    stem, _ = os.path.splitext(model_path)
+    return f"{stem}_{variant}.tflite"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the Keras model to TFLite")
+    parser.add_argument("--model", default="models/best_model.h5")
+    parser.add_argument("--variants", nargs="+", default=list(VARIANTS), choices=VARIANTS)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("EXPORTING MODEL TO TENSORFLOW LITE")
+    print("=" * 60)
+
+    model = tf.keras.models.load_model(args.model)
+    keras_size = os.path.getsize(args.model) / 1e6
+    print(f"✓ Loaded {args.model} ({keras_size:.1f} MB)")
+
+    for variant in args.variants:
+        path = output_path(args.model, variant)
+        flatbuffer = convert(model, variant)
+        with open(path, "wb") as f:
+            f.write(flatbuffer)
+        print(f"✓ {variant:8} -> {path} ({len(flatbuffer) / 1e6:.1f} MB)")
+
+    print("=" * 60)
+    print("Serve with: KRISHI_MODEL_BACKEND=tflite KRISHI_MODEL_PATH=<file> python app.py")
+    print("Check parity first: python compare_backends.py")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+# feature_cache.py - cached MobileNetV2 bottleneck features for head-only training
+# With base_model.trainable = False the base gives the same output every
+# epoch, so its pooled 1280-d features are computed once (for the original
+# images and optionally N fixed augmented views), stored as a memory-mapped
+# float16 array and the small Dense head trains on them directly.
+import hashlib
+import json
+import os
+
+import numpy as np
+import tensorflow as tf
+from tensorflow.keras import layers, models
+from tensorflow.keras.applications import MobileNetV2
+
+from data_pipeline import make_augmenter, make_dataset
+
+IMG_SIZE = 224
+FEATURE_DIM = 1280
+
+
+def dataset_fingerprint(files, labels, manifest=None):
+    """
+    Hash of the file list and labels plus each file's content hash from the
+    check_dataset.py manifest (or its size and mtime without one): changes
+    whenever the dataset does.
+    """
+    hashes = {}
+    if manifest is not None:
+        root = manifest["dataset"]
+        hashes = {os.path.normpath(os.path.join(root, path)): entry["sha256"]
+                  for path, entry in manifest["files"].items()}
+    digest = hashlib.sha256()
+    for path, label in sorted(zip(files, labels)):
+        content = hashes.get(os.path.normpath(path))
+        if content is None:
+            stat = os.stat(path)
+            content = f"{stat.st_size}\0{stat.st_mtime_ns}"
+        digest.update(f"{path}\0{content}\0{label}\n".encode())
+    return digest.hexdigest()
+
+
+def model_fingerprint(model):
+    """Hash of the model's weights"""
+    digest = hashlib.sha256()
+    for weight in model.get_weights():
+        digest.update(np.ascontiguousarray(weight).tobytes())
+    return digest.hexdigest()
+
+
+def build_base_model(img_size=IMG_SIZE, alpha=1.0):
+    """Frozen ImageNet MobileNetV2; alpha < 1 gives the narrower networks (pooled output stays 1280-d)"""
+    base_model = MobileNetV2(input_shape=(img_size, img_size, 3), alpha=alpha, include_top=False, weights='imagenet')
+    base_model.trainable = False
+    return base_model
+
+
+def compute_features(base_model, files, labels, cache_dir="models/feature_cache", views=0,
+                     augmentation=None, batch_size=64, img_size=IMG_SIZE, manifest=None):
+    """
+    Pooled base features for every image, computed once and cached.
+
+    Returns a read-only memmap of shape (views + 1, len(files), 1280) in
+    float16: view 0 is the original image, views 1..N are fixed augmented
+    copies (seeded, so the cache is reproducible). The cache key covers the
+    dataset fingerprint (from the manifest if given), the base weights, the
+    views and the augmentation.
+    """
+    augmentation = augmentation or {}
+    key_source = json.dumps({
+        "dataset": dataset_fingerprint(files, labels, manifest),
+        "base_model": model_fingerprint(base_model),
+        "views": views,
+        "augmentation": augmentation,
+        "img_size": img_size,
+    }, sort_keys=True)
+    key = hashlib.sha256(key_source.encode()).hexdigest()[:16]
+    path = os.path.join(cache_dir, f"features_{key}.npy")
+
+    if os.path.exists(path):
+        print(f"✓ Using cached features {path}")
+        return np.load(path, mmap_mode='r')
+
+    os.makedirs(cache_dir, exist_ok=True)
+    extractor = models.Sequential([base_model, layers.GlobalAveragePooling2D()])
+    forward = tf.function(lambda x: extractor(x, training=False), reduce_retracing=True)
+
+    tmp_path = f"{path}.tmp"
+    features = np.lib.format.open_memmap(
+        tmp_path, mode='w+', dtype=np.float16, shape=(views + 1, len(files), FEATURE_DIM)
+    )
+    for view in range(views + 1):
+        augment = make_augmenter(seed=view, **augmentation) if view > 0 else None
+        dataset = make_dataset(files, labels, num_classes=max(labels) + 1, batch_size=batch_size,
+                               augment=augment, img_size=img_size)
+        start = 0
+        for images, _ in dataset:
+            batch = forward(images).numpy()
+            features[view, start:start + len(batch)] = batch
+            start += len(batch)
+        print(f"  view {view}/{views}: {start} images")
+
+    features.flush()
+    del features
+    os.replace(tmp_path, path)
+    with open(os.path.join(cache_dir, f"features_{key}.json"), "w") as f:
+        f.write(key_source)
+    print(f"✓ Features cached to {path}")
+    return np.load(path, mmap_mode='r')
+
+
+def build_head(num_classes, dense_units=256, dropout=(0.3, 0.3)):
+    """The layers train.py puts after GlobalAveragePooling2D, on a feature input"""
+    return models.Sequential([
+        layers.Input(shape=(FEATURE_DIM,)),
+        layers.Dropout(dropout[0]),
+        layers.Dense(dense_units, activation='relu'),
+        layers.Dropout(dropout[1]),
+        layers.Dense(num_classes, activation='softmax')
+    ])
+
+
+def assemble(base_model, head, input_size=None):
+    """
+    Full image model with the same layer stack as train.py, so the saved
+    .h5 loads in the API exactly like a normally trained one. A base built
+    for a smaller resolution gets a Resizing layer in front, so the model
+    still takes the API's input_size images.
+    """
+    stack = [base_model, layers.GlobalAveragePooling2D(), *head.layers]
+    base_size = base_model.input_shape[1]
+    if input_size and input_size != base_size:
+        stack.insert(0, layers.Resizing(base_size, base_size))
+    model = models.Sequential(stack)
+    model.build((None, input_size or base_size, input_size or base_size, 3))
+    return model
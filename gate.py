@@ -0,0 +1,111 @@
+# gate.py - cheap plant-image checks that run before inference
+# Selfies, screenshots and blank frames are rejected before they reach the
+# model. Dimensions come from the image header (no decode); the colour
+# checks run vectorized on a ~32x32 sample of the small draft-mode decode
+# the prediction path makes anyway, so a check costs tens of microseconds.
+import threading
+
+import numpy as np
+from PIL import Image
+
+from metrics import IMAGE_GATE
+from preprocessing import IMG_SIZE, decode, open_image, resize
+
+MESSAGES = {
+    "too_small": "Image too small. Please upload a clearer image.",
+    "aspect_ratio": "Image aspect ratio unusual. Please crop to show only the leaf.",
+    "blank": "Image appears to be blank. Please upload a photo of a tomato leaf.",
+    "not_leaf": "Image doesn't appear to be a plant leaf. Please upload a tomato leaf image.",
+}
+
+
+class ImageRejected(ValueError):
+    """The image failed a gate check; reason is one of MESSAGES' keys"""
+
+    def __init__(self, reason):
+        super().__init__(MESSAGES[reason])
+        self.reason = reason
+
+
+class ImageGate:
+    """
+    Configurable pre-inference checks with accept/reject counters.
+
+    min_size: shortest side in pixels. max_aspect_ratio: long side / short
+    side. min_green_ratio: fraction of pixels whose green channel beats red
+    and blue. min_contrast: standard deviation of the grey levels (a flat,
+    blank frame is below it). 0 disables a check; enabled=False skips all.
+    """
+
+    def __init__(self, enabled=True, min_size=50, max_aspect_ratio=10.0,
+                 min_green_ratio=0.05, min_contrast=4.0, sample_size=32):
+        self.enabled = enabled
+        self.min_size = min_size
+        self.max_aspect_ratio = max_aspect_ratio
+        self.min_green_ratio = min_green_ratio
+        self.min_contrast = min_contrast
+        self.sample_size = sample_size
+        self._counts = {"accepted": 0}
+        self._lock = threading.Lock()
+
+    def _count(self, result):
+        with self._lock:
+            self._counts[result] = self._counts.get(result, 0) + 1
+        IMAGE_GATE.inc(result)
+
+    def _reject(self, reason):
+        self._count(reason)
+        raise ImageRejected(reason)
+
+    def check_header(self, image: Image.Image):
+        """Size and aspect ratio from an opened (not yet decoded) image"""
+        if not self.enabled:
+            return
+        width, height = image.size
+        if self.min_size and min(width, height) < self.min_size:
+            self._reject("too_small")
+        if self.max_aspect_ratio and max(width, height) > self.max_aspect_ratio * min(width, height):
+            self._reject("aspect_ratio")
+
+    def check_pixels(self, pixels: np.ndarray):
+        """Colour checks on a decoded uint8 (H, W, 3) image, counts it as accepted if it passes"""
+        if not self.enabled:
+            return
+        step = max(1, min(pixels.shape[:2]) // self.sample_size)
+        sample = pixels[::step, ::step].astype(np.int16)
+        red, green, blue = sample[..., 0], sample[..., 1], sample[..., 2]
+
+        if self.min_contrast and (red + green + blue).std() / 3 < self.min_contrast:
+            self._reject("blank")
+        if self.min_green_ratio and np.count_nonzero((green > red) & (green > blue)) < self.min_green_ratio * red.size:
+            self._reject("not_leaf")
+        self._count("accepted")
+
+    def check(self, image: Image.Image):
+        """
+        All checks for a standalone PIL image, on the same 224x224 decode
+        the API checks. The caller's image is left as it was: draft() runs
+        on a second copy opened from the still-undecoded source bytes.
+        """
+        self.check_header(image)
+        if not self.enabled:
+            return
+        if image.format == "JPEG" and getattr(image, "fp", None) is not None:
+            image.fp.seek(0)
+            image = open_image(image.fp.read())
+        size = (IMG_SIZE, IMG_SIZE)
+        self.check_pixels(np.asarray(resize(decode(image, size), size), dtype=np.uint8))
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self._counts)
+        checked = sum(counts.values())
+        rejected = checked - counts["accepted"]
+        return {
+            "enabled": self.enabled,
+            "checked": checked,
+            "accepted": counts["accepted"],
+            "rejected": rejected,
+            "rejection_rate": round(rejected / checked, 4) if checked else 0.0,
+            "rejected_by_reason": {reason: n for reason, n in counts.items() if reason != "accepted"},
+        }
@@ -0,0 +1,321 @@
+# hot_swap.py - serve one model version, switch to another without downtime
+# A new version is loaded and warmed up in a background thread while the
+# current one keeps serving; traffic then moves with a single reference
+# swap. Each request takes a snapshot of the active model when it starts,
+# so it is predicted, rendered and cached by one version even if a swap
+# happens half way through. The previous version stays loaded for an
+# instant rollback. A shadow version can score a sample of live traffic
+# after the response has been sent, to compare it with the active one.
+import asyncio
+import json
+import random
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+import numpy as np
+
+from backends import load_backend
+from batching import MicroBatcher
+from disease_info import DISEASE_DATABASE
+from metrics import MODEL_SWAPS, SHADOW_PREDICTIONS
+from responses import PredictionRenderer
+from startup import StartupState, warm_up
+
+
+class LoadedModel:
+    """One warmed-up model version with its own batching queue and response renderer"""
+
+    def __init__(self, metadata, backend, class_names, renderer, batcher, warmup, phases):
+        self.metadata = metadata
+        self.version = metadata["version"]
+        self.backend = backend
+        self.class_names = class_names
+        self.renderer = renderer
+        self.batcher = batcher
+        self.warmup = warmup   # batch size -> ms per warm-up round
+        self.phases = phases   # load step -> ms
+        self.loaded_at = time.time()
+        self.in_use = 0        # requests holding a snapshot of this version
+
+    @contextmanager
+    def use(self):
+        self.in_use += 1
+        try:
+            yield self
+        finally:
+            self.in_use -= 1
+
+    def info(self) -> dict:
+        return {
+            "version": self.version,
+            "backend": self.backend.name,
+            "classes": len(self.class_names),
+            "loaded_at": self.loaded_at,
+            "in_use": self.in_use,
+            "load_ms": dict(self.phases),
+            "warmup_ms": {str(size): times for size, times in self.warmup.items()},
+            "metrics": self.metadata.get("metrics", {}),
+            "backend_stats": self.backend.stats() if hasattr(self.backend, "stats") else None,
+        }
+
+
+class ModelManager:
+    """
+    Active, previous and shadow model versions from a ModelRegistry.
+
+    load_model(metadata) -> LoadedModel runs on a worker thread (backend,
+    class names, renderer, warm-up); the manager only decides which loaded
+    version gets traffic. Swaps are serialized, and a version that is no
+    longer active, previous or shadow is stopped once its last request ends.
+    """
+
+    def __init__(self, registry, executor, batcher_options, shadow_executor=None, img_size=224,
+                 warmup_batch_sizes=(1,), warmup_rounds=2, num_threads=None):
+        self.registry = registry
+        self.executor = executor
+        # Shadow forward passes get their own pool so they never queue ahead of live traffic
+        self.shadow_executor = shadow_executor
+        self.batcher_options = batcher_options
+        self.img_size = img_size
+        self.warmup_batch_sizes = warmup_batch_sizes
+        self.warmup_rounds = warmup_rounds
+        self.num_threads = num_threads
+
+        self.active = None
+        self.previous = None
+        self.shadow = None
+        self.loading = None       # version being loaded, for /models
+        self.last_error = None
+        self._lock = asyncio.Lock()
+        self._seen_active_file = None
+
+    def load_model(self, metadata, executor=None) -> LoadedModel:
+        """Blocking: load and warm up one version (run it off the event loop)"""
+        timer = StartupState()
+        with timer.phase("load_class_names"):
+            with open(metadata["class_names_path"]) as f:
+                class_names = json.load(f)
+        with timer.phase("load_model"):
+            backend = load_backend(metadata["backend"], metadata["model_path"], img_size=self.img_size,
+                                   num_threads=self.num_threads)
+        # Static part of every class's response, encoded once
+        with timer.phase("precompute_responses"):
+            renderer = PredictionRenderer(class_names, DISEASE_DATABASE, metadata["version"])
+        with timer.phase("warmup"):
+            warmup = warm_up(backend.predict, self.warmup_batch_sizes, img_size=self.img_size,
+                             rounds=self.warmup_rounds)
+
+        outputs = np.asarray(backend.predict(np.zeros((1, self.img_size, self.img_size, 3), np.float32)))
+        if outputs.shape[1] != len(class_names):
+            raise ValueError(f"Model {metadata['version']} has {outputs.shape[1]} outputs "
+                             f"but {len(class_names)} class names")
+        if hasattr(backend, "reset_stats"):
+            backend.reset_stats()  # warm-up batches are not traffic
+        batcher = MicroBatcher(backend.predict, executor=executor or self.executor, **self.batcher_options)
+        return LoadedModel(metadata, backend, class_names, renderer, batcher, warmup, timer.phases)
+
+    async def _load(self, version, executor=None) -> LoadedModel:
+        metadata = self.registry.resolve(version)
+        self.loading = metadata["version"]
+        try:
+            model = await asyncio.to_thread(self.load_model, metadata, executor)
+        finally:
+            self.loading = None
+        await model.batcher.start()
+        return model
+
+    async def start(self, version=None):
+        """Load the initial version; version=None serves whatever the registry has active"""
+        async with self._lock:
+            self._seen_active_file = self.registry.active_mtime()
+            self.active = await self._load(version)
+
+    async def activate(self, version, record=True) -> dict:
+        """Load, warm up and switch to version; the old active version becomes previous"""
+        async with self._lock:
+            if self.active is not None and version == self.active.version:
+                return self.status()
+            if self.previous is not None and version == self.previous.version:
+                candidate = self.previous
+            else:
+                candidate = await self._load(version)
+
+            retired = self.previous if self.previous is not candidate else None
+            self.previous, self.active = self.active, candidate
+            MODEL_SWAPS.inc("activate")
+            if record:
+                self.registry.set_active(candidate.version, previous=self.previous.version if self.previous else None)
+                self._seen_active_file = self.registry.active_mtime()
+            if retired is not None:
+                self._retire(retired)
+            return self.status()
+
+    async def rollback(self) -> dict:
+        """Switch back to the previous version, which is still loaded and warm"""
+        async with self._lock:
+            if self.previous is None:
+                raise LookupError("No previous model version to roll back to")
+            self.active, self.previous = self.previous, self.active
+            MODEL_SWAPS.inc("rollback")
+            self.registry.set_active(self.active.version, previous=self.previous.version)
+            self._seen_active_file = self.registry.active_mtime()
+            return self.status()
+
+    async def start_shadow(self, version, sample_rate, max_pending=32) -> dict:
+        async with self._lock:
+            model = await self._load(version, self.shadow_executor)
+            old, self.shadow = self.shadow, ShadowRunner(model, sample_rate, max_pending)
+            if old is not None:
+                self._retire(old.model)
+            return self.status()
+
+    async def stop_shadow(self) -> dict:
+        async with self._lock:
+            old, self.shadow = self.shadow, None
+            if old is not None:
+                self._retire(old.model)
+            return self.status()
+
+    def _retire(self, model):
+        """Stop a version's batcher once requests that still hold it have finished"""
+        if model is self.active or model is self.previous or (self.shadow and model is self.shadow.model):
+            return
+
+        async def drain():
+            while model.in_use or model.batcher.stats()["queue_depth"]:
+                await asyncio.sleep(0.05)
+            await model.batcher.stop()
+
+        asyncio.get_running_loop().create_task(drain())
+
+    async def watch(self, interval):
+        """
+        Follow active.json, so `python model_registry.py activate` (or a swap
+        made through another worker process) reaches this process too
+        """
+        while True:
+            await asyncio.sleep(interval)
+            mtime = self.registry.active_mtime()
+            if mtime is None or mtime == self._seen_active_file:
+                continue
+            self._seen_active_file = mtime
+            version = self.registry.read_active().get("version")
+            if not version or (self.active is not None and version == self.active.version):
+                continue
+            try:
+                await self.activate(version, record=False)
+                self.last_error = None
+                print(f"✓ Switched to model version {version}")
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+                print(f"✗ Could not switch to model version {version}: {self.last_error}")
+
+    async def stop(self):
+        for model in {self.active, self.previous, self.shadow and self.shadow.model} - {None}:
+            await model.batcher.stop()
+
+    def status(self) -> dict:
+        return {
+            "active": self.active.info() if self.active else None,
+            "previous": self.previous.version if self.previous else None,
+            "shadow": self.shadow.stats() if self.shadow else None,
+            "loading": self.loading,
+            "last_error": self.last_error,
+        }
+
+
+class ShadowRunner:
+    """
+    Scores a sampled fraction of live images with a candidate model.
+
+    Runs after the active model has answered, on the candidate's own
+    batching queue; when max_pending images are already waiting, new
+    samples are dropped instead of queueing behind them.
+    """
+
+    LATENCY_SAMPLES = 2048
+
+    def __init__(self, model, sample_rate, max_pending=32):
+        self.model = model
+        self.sample_rate = sample_rate
+        self.max_pending = max_pending
+        self.pending = 0
+        self.counts = Counter()          # sampled, compared, dropped, failed, agree, top3
+        self.confusions = Counter()      # (active class, shadow class) for disagreements
+        self.abs_diff_total = 0.0        # summed over comparisons with the same number of classes
+        self.abs_diff_count = 0
+        self.latency_ms = {"active": [], "shadow": []}
+        self._lock = threading.Lock()
+
+    def should_sample(self) -> bool:
+        return random.random() < self.sample_rate
+
+    def submit(self, image, probabilities, active_ms, active_model):
+        """Queue one comparison without waiting for it"""
+        self.counts["sampled"] += 1
+        if self.pending >= self.max_pending:
+            self.counts["dropped"] += 1
+            return
+        self.pending += 1
+        asyncio.get_running_loop().create_task(self._compare(image, probabilities, active_ms, active_model))
+
+    async def _compare(self, image, probabilities, active_ms, active_model):
+        started = time.perf_counter()
+        try:
+            with self.model.use():
+                shadow = await self.model.batcher.submit(image)
+        except Exception:
+            self.counts["failed"] += 1
+            return
+        finally:
+            self.pending -= 1
+        shadow_ms = (time.perf_counter() - started) * 1000
+
+        active_class = active_model.class_names[str(int(np.argmax(probabilities)))]
+        shadow_ranked = np.argsort(shadow)[::-1]
+        shadow_class = self.model.class_names[str(int(shadow_ranked[0]))]
+        top3 = {self.model.class_names[str(int(i))] for i in shadow_ranked[:3]}
+        agree = active_class == shadow_class
+
+        self.counts["compared"] += 1
+        self.counts["agree"] += agree
+        self.counts["top3"] += active_class in top3
+        SHADOW_PREDICTIONS.inc("agree" if agree else "disagree")
+        if not agree:
+            self.confusions[(active_class, shadow_class)] += 1
+        if len(probabilities) == len(shadow):
+            self.abs_diff_total += float(np.abs(np.asarray(probabilities) - shadow).max())
+            self.abs_diff_count += 1
+        with self._lock:
+            for name, ms in (("active", active_ms), ("shadow", shadow_ms)):
+                samples = self.latency_ms[name]
+                samples.append(ms)
+                if len(samples) > self.LATENCY_SAMPLES:
+                    del samples[:len(samples) - self.LATENCY_SAMPLES]
+
+    def stats(self) -> dict:
+        compared = self.counts["compared"]
+        with self._lock:
+            latency = {
+                name: {"p50": round(float(np.percentile(samples, 50)), 2),
+                       "p95": round(float(np.percentile(samples, 95)), 2)} if samples else None
+                for name, samples in self.latency_ms.items()
+            }
+        return {
+            "version": self.model.version,
+            "sample_rate": self.sample_rate,
+            "sampled": self.counts["sampled"],
+            "compared": compared,
+            "dropped": self.counts["dropped"],
+            "failed": self.counts["failed"],
+            "top1_agreement": round(self.counts["agree"] / compared, 4) if compared else None,
+            "top3_agreement": round(self.counts["top3"] / compared, 4) if compared else None,
+            "mean_max_abs_diff": round(self.abs_diff_total / self.abs_diff_count, 4) if self.abs_diff_count else None,
+            "latency_ms": latency,
+            "top_disagreements": [
+                {"active": active, "shadow": shadow, "count": count}
+                for (active, shadow), count in self.confusions.most_common(10)
+            ],
+        }
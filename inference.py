@@ -0,0 +1,64 @@
+# inference.py - keep CPU-heavy work off the asyncio event loop
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+
+class InferenceExecutor:
+    """
+    Bounded thread pool that async handlers await for blocking work.
+
+    At most max_pending jobs are handed to the pool at once; extra callers
+    wait on the event loop instead of piling up in the pool's queue, so
+    /health and other light endpoints keep getting scheduled under load.
+    """
+
+    def __init__(self, workers, max_pending=None, name="inference"):
+        self.workers = workers
+        self.max_pending = max_pending or workers * 4
+        self.name = name
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        self._slots = asyncio.Semaphore(self.max_pending)
+        self._running = 0
+
+    async def run(self, fn, *args):
+        """Run fn(*args) on a worker thread and await its result"""
+        async with self._slots:
+            self._running += 1
+            try:
+                return await asyncio.get_running_loop().run_in_executor(self._pool, fn, *args)
+            finally:
+                self._running -= 1
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        return {
+            "name": self.name,
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "in_progress": self._running,
+        }
+
+
+def compile_predict_fn(model, img_size=224):
+    """
+    Wrap a Keras model in a traced tf.function with a fixed input signature.
+
+    Calling this skips model.predict's per-call setup (data adapter,
+    callbacks, progress bar) and never retraces for a new batch size.
+    Returns a function mapping a float32 (N, H, W, 3) array to probabilities.
+    """
+    import tensorflow as tf
+
+    @tf.function(
+        input_signature=[tf.TensorSpec([None, img_size, img_size, 3], tf.float32)],
+        reduce_retracing=True
+    )
+    def forward(images):
+        return model(images, training=False)
+
+    def predict(images):
+        return forward(tf.convert_to_tensor(images, dtype=tf.float32)).numpy()
+
+    return predict
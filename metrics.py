@@ -0,0 +1,218 @@
+# metrics.py - low-overhead Prometheus metrics for the prediction path
+# A metric update is a bisect plus a couple of additions under an uncontended
+# lock (around a microsecond); rendering only happens when /metrics is scraped.
+import os
+import threading
+import time
+from bisect import bisect_left
+
+# Latency buckets in seconds, 100us .. 10s
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names, values, extra=""):
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = list(self._values.items())
+        for labels, value in sorted(values):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Gauge:
+    """A settable value, or a callback evaluated at scrape time"""
+
+    def __init__(self, name, documentation, callback=None):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount=1):
+        with self._lock:
+            self._value -= amount
+
+    def render(self):
+        value = self.callback() if self.callback is not None else self._value
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge",
+                f"{self.name} {value}"]
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def time(self, *labels):
+        """with histogram.time("decode"): ... observes the elapsed seconds"""
+        return _Timer(self, labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {labels: list(values) for labels, values in self._series.items()}
+        for labels, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                le = _format_labels(self.labelnames, labels, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            cumulative += values[len(self.buckets)]
+            le = _format_labels(self.labelnames, labels, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{le} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {values[-1]}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def resident_memory_bytes():
+    """Current RSS from /proc (Linux), falling back to peak RSS elsewhere"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+# Metrics for the prediction path, shared by app.py and batching.py
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "krishi_stage_seconds",
+    "Time spent in each stage of the prediction path",
+    labelnames=("stage",)
+))
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "krishi_request_seconds",
+    "End-to-end prediction handler latency",
+    labelnames=("endpoint",)
+))
+BATCH_SIZE = REGISTRY.register(Histogram(
+    "krishi_batch_size",
+    "Images per model forward pass",
+    buckets=(1, 2, 4, 8, 16, 32, 64)
+))
+PREDICTIONS = REGISTRY.register(Counter(
+    "krishi_predictions_total",
+    "Predictions served, by predicted class",
+    labelnames=("predicted_class",)
+))
+ERRORS = REGISTRY.register(Counter(
+    "krishi_prediction_errors_total",
+    "Failed predictions, by reason",
+    labelnames=("reason",)
+))
+IMAGE_GATE = REGISTRY.register(Counter(
+    "krishi_image_gate_total",
+    "Images checked before inference, by result (accepted or rejection reason)",
+    labelnames=("result",)
+))
+REJECTED_REQUESTS = REGISTRY.register(Counter(
+    "krishi_rejected_requests_total",
+    "Requests turned away by admission control, by reason",
+    labelnames=("reason",)
+))
+MODEL_SWAPS = REGISTRY.register(Counter(
+    "krishi_model_swaps_total",
+    "Active model version changes, by action (activate or rollback)",
+    labelnames=("action",)
+))
+SHADOW_PREDICTIONS = REGISTRY.register(Counter(
+    "krishi_shadow_predictions_total",
+    "Shadow model predictions compared with the active model, by top-1 result",
+    labelnames=("result",)
+))
+CASCADE_IMAGES = REGISTRY.register(Counter(
+    "krishi_cascade_images_total",
+    "Images answered by each stage of the cascade backend (fast or full)",
+    labelnames=("stage",)
+))
+STREAM_FRAMES = REGISTRY.register(Counter(
+    "krishi_stream_frames_total",
+    "WebSocket camera frames, by outcome (received, scored, duplicate, dropped, rejected, failed)",
+    labelnames=("outcome",)
+))
+TILES = REGISTRY.register(Counter(
+    "krishi_tiles_total",
+    "Windows of /predict/tiles images, by result (analyzed or background)",
+    labelnames=("result",)
+))
+IN_FLIGHT = REGISTRY.register(Gauge(
+    "krishi_requests_in_flight",
+    "Prediction requests currently being handled"
+))
+REGISTRY.register(Gauge(
+    "process_resident_memory_bytes",
+    "Resident memory size in bytes",
+    callback=resident_memory_bytes
+))
@@ -0,0 +1,260 @@
+# model_registry.py - versioned model artifacts for the API
+# Usage:
+#     python model_registry.py publish models/best_model.h5 --version 1.1 [--metrics eval.json]
+#     python model_registry.py list
+#     python model_registry.py activate 1.1     # running servers switch within seconds
+#
+# Layout (models/registry by default):
+#     1.1/model.h5            weights (.h5 for keras, .tflite for tflite, .json
+#                             cascade spec plus its fast/full stage files)
+#     1.1/class_names.json    class index -> name, as written by train.py
+#     1.1/metadata.json       backend, file sizes, creation time, evaluation metrics
+#     active.json             {"version": "1.1", "previous": "1.0"}
+# Published versions are never modified. active.json only selects one, so
+# switching and rolling back are a single atomic file replace.
+import argparse
+import json
+import os
+import re
+import shutil
+import time
+
+import config
+
+VERSION_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._-]*$")
+ACTIVE_FILE = "active.json"
+METADATA_FILE = "metadata.json"
+BACKEND_BY_EXTENSION = {".h5": "keras", ".keras": "keras", ".tflite": "tflite", ".json": "cascade"}
+
+
+class ModelRegistry:
+    """
+    Read and publish model versions under root.
+
+    fallback is the metadata of the model to serve while the registry is
+    still empty (the plain models/ files the API used before versioning).
+    """
+
+    def __init__(self, root, fallback=None):
+        self.root = root
+        self.fallback = fallback
+
+    def _dir(self, version):
+        if not VERSION_PATTERN.match(version):
+            raise ValueError(f"Invalid model version '{version}' (letters, digits, '.', '_' and '-' only)")
+        return os.path.join(self.root, version)
+
+    def versions(self) -> list:
+        """Metadata of every published version, oldest first"""
+        if not os.path.isdir(self.root):
+            return []
+        found = []
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name, METADATA_FILE)
+            if os.path.isfile(path):
+                with open(path) as f:
+                    found.append(json.load(f))
+        return sorted(found, key=lambda metadata: metadata["created"])
+
+    def get(self, version) -> dict:
+        """
+        Metadata for a version with model_path and class_names_path resolved.
+        Raises: KeyError if the version was never published
+        """
+        if self.fallback is not None and version == self.fallback["version"] \
+                and not os.path.isdir(os.path.join(self.root, version)):
+            return dict(self.fallback)
+
+        directory = self._dir(version)
+        path = os.path.join(directory, METADATA_FILE)
+        if not os.path.isfile(path):
+            raise KeyError(f"Model version '{version}' is not in {self.root}")
+        with open(path) as f:
+            metadata = json.load(f)
+        metadata["model_path"] = os.path.join(directory, metadata["model_file"]) if metadata["model_file"] else ""
+        metadata["class_names_path"] = os.path.join(directory, "class_names.json")
+        return metadata
+
+    def read_active(self) -> dict:
+        """{"version", "previous"} from active.json, empty if nothing was activated"""
+        path = os.path.join(self.root, ACTIVE_FILE)
+        if not os.path.isfile(path):
+            return {}
+        with open(path) as f:
+            return json.load(f)
+
+    def active_mtime(self):
+        """Modification time of active.json, for servers that poll it"""
+        try:
+            return os.stat(os.path.join(self.root, ACTIVE_FILE)).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def resolve(self, version=None) -> dict:
+        """
+        Metadata of the version to serve: the one asked for, else the
+        activated one, else the newest published, else the fallback
+        """
+        if not version:
+            version = self.read_active().get("version")
+        if not version:
+            published = self.versions()
+            if published:
+                version = published[-1]["version"]
+            elif self.fallback is not None:
+                return dict(self.fallback)
+            else:
+                raise KeyError(f"No model versions in {self.root}")
+        return self.get(version)
+
+    def set_active(self, version, previous=None):
+        """Point active.json at a published version (atomic replace)"""
+        self.get(version)  # must exist
+        os.makedirs(self.root, exist_ok=True)
+        path = os.path.join(self.root, ACTIVE_FILE)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"version": version, "previous": previous, "updated": time.time()}, f, indent=2)
+        os.replace(tmp_path, path)
+
+    def publish(self, version, model_path, class_names_path, backend=None, metrics=None, notes=""):
+        """
+        Copy a trained model and its class names into a new version directory.
+        Raises: FileExistsError if the version is already published
+        """
+        directory = self._dir(version)
+        if os.path.exists(directory):
+            raise FileExistsError(f"Model version '{version}' already exists in {self.root}")
+
+        extension = os.path.splitext(model_path)[1].lower() if model_path else ""
+        backend = backend or BACKEND_BY_EXTENSION.get(extension)
+        if backend is None:
+            raise ValueError(f"Cannot tell the backend of '{model_path}', pass --backend")
+        with open(class_names_path) as f:
+            class_names = json.load(f)
+
+        # Build in a temporary directory so a half-copied version is never visible
+        tmp_dir = f"{directory}.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        model_file = f"model{extension}" if model_path else ""
+        if backend == "cascade":
+            self._copy_cascade(model_path, tmp_dir, model_file)
+        elif model_file:
+            shutil.copyfile(model_path, os.path.join(tmp_dir, model_file))
+        with open(os.path.join(tmp_dir, "class_names.json"), "w") as f:
+            json.dump(class_names, f, indent=2)
+
+        metadata = {
+            "version": version,
+            "backend": backend,
+            "model_file": model_file,
+            "model_bytes": sum(os.path.getsize(os.path.join(tmp_dir, name)) for name in os.listdir(tmp_dir)
+                               if name != "class_names.json"),
+            "num_classes": len(class_names),
+            "source": os.path.abspath(model_path) if model_path else "",
+            "created": time.time(),
+            "notes": notes,
+            "metrics": metrics or {},
+        }
+        with open(os.path.join(tmp_dir, METADATA_FILE), "w") as f:
+            json.dump(metadata, f, indent=2)
+        os.replace(tmp_dir, directory)
+        return metadata
+
+    @staticmethod
+    def _copy_cascade(spec_path, directory, spec_file):
+        """Copy a calibrate_cascade.py spec and both stage models, pointing the spec at the copies"""
+        with open(spec_path) as f:
+            spec = json.load(f)
+        for stage in ("fast", "full"):
+            source = spec[stage]["model_file"]
+            if source:
+                copied = f"{stage}{os.path.splitext(source)[1]}"
+                shutil.copyfile(os.path.join(os.path.dirname(spec_path), source), os.path.join(directory, copied))
+                spec[stage]["model_file"] = copied
+        with open(os.path.join(directory, spec_file), "w") as f:
+            json.dump(spec, f, indent=2)
+
+
+def legacy_metadata() -> dict:
+    """The single model configured through KRISHI_MODEL_PATH / KRISHI_CLASS_NAMES_PATH"""
+    return {
+        "version": config.LEGACY_MODEL_VERSION,
+        "backend": config.MODEL_BACKEND,
+        "model_file": os.path.basename(config.MODEL_PATH),
+        "model_path": config.MODEL_PATH,
+        "class_names_path": config.CLASS_NAMES_PATH,
+        "created": 0,
+        "notes": "unversioned model from models/",
+        "metrics": {},
+    }
+
+
+def open_registry() -> ModelRegistry:
+    """The registry the API serves from (config.MODEL_REGISTRY_DIR)"""
+    return ModelRegistry(config.MODEL_REGISTRY_DIR, fallback=legacy_metadata())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage versioned models for the API")
+    parser.add_argument("--registry", default=config.MODEL_REGISTRY_DIR)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    publish = commands.add_parser("publish", help="add a trained model as a new version")
+    publish.add_argument("model", help="model file (.h5 or .tflite); '' for the fake backend")
+    publish.add_argument("--version", required=True)
+    publish.add_argument("--class-names", default=config.CLASS_NAMES_PATH)
+    publish.add_argument("--backend", default=None, help="keras, tflite or fake (default: from the extension)")
+    publish.add_argument("--metrics", default=None, help="evaluate.py --output JSON to store with the version")
+    publish.add_argument("--notes", default="")
+    publish.add_argument("--activate", action="store_true", help="also make it the active version")
+
+    commands.add_parser("list", help="show published versions")
+
+    activate = commands.add_parser("activate", help="switch the active version (servers follow within seconds)")
+    activate.add_argument("version")
+
+    commands.add_parser("rollback", help="switch back to the previously active version")
+    args = parser.parse_args()
+
+    registry = ModelRegistry(args.registry)
+    active = registry.read_active()
+
+    if args.command == "publish":
+        metrics = {}
+        if args.metrics:
+            with open(args.metrics) as f:
+                results = json.load(f)["results"]
+            metrics = {name: results[name] for name in ("accuracy", "top3_accuracy", "images")}
+        metadata = registry.publish(args.version, args.model, args.class_names, args.backend, metrics, args.notes)
+        print(f"✓ Published {metadata['version']} ({metadata['backend']}, {metadata['num_classes']} classes, "
+              f"{metadata['model_bytes'] / 1e6:.1f} MB)")
+        if args.activate:
+            registry.set_active(args.version, previous=active.get("version"))
+            print(f"✓ Active version: {args.version}")
+
+    elif args.command == "list":
+        print(f"{'version':16} {'backend':8} {'classes':>7} {'MB':>7}  {'created':19}  metrics")
+        print("-" * 80)
+        for metadata in registry.versions():
+            marker = " *" if metadata["version"] == active.get("version") else ""
+            created = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(metadata["created"]))
+            metrics = " ".join(f"{name}={value:.4f}" if isinstance(value, float) else f"{name}={value}"
+                               for name, value in metadata["metrics"].items())
+            print(f"{metadata['version'] + marker:16} {metadata['backend']:8} {metadata['num_classes']:>7} "
+                  f"{metadata['model_bytes'] / 1e6:7.1f}  {created}  {metrics}")
+
+    elif args.command == "activate":
+        registry.set_active(args.version, previous=active.get("version"))
+        print(f"✓ Active version: {args.version} (was {active.get('version')})")
+
+    elif args.command == "rollback":
+        if not active.get("previous"):
+            raise SystemExit("✗ No previous version to roll back to")
+        registry.set_active(active["previous"], previous=active["version"])
+        print(f"✓ Rolled back to {active['previous']} (was {active['version']})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# preprocessing.py - the one image decode/preprocess path
+# Used by the API, the test/evaluation scripts and the benchmarks, so the
+# model always sees images prepared exactly the same way.
+import io
+
+import numpy as np
+from PIL import Image, ImageOps
+
+IMG_SIZE = 224
+
+# Single resize filter everywhere (training uses the same one, see data_pipeline.py)
+RESAMPLE = Image.BILINEAR
+# Pillow first shrinks by an integer factor down to ~3x the target, then filters
+REDUCING_GAP = 3.0
+
+_SCALE = np.float32(1.0 / 255.0)
+EXIF_ORIENTATION = 0x0112
+
+
+def open_image(source) -> Image.Image:
+    """Open bytes, a path or a file object lazily (reads the header only)"""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    return Image.open(source)
+
+
+def decode(image: Image.Image, target_size=(IMG_SIZE, IMG_SIZE)) -> Image.Image:
+    """
+    Decode an opened image as upright RGB, as small as possible but not
+    smaller than target_size.
+
+    For JPEGs, draft() makes libjpeg decode at 1/2, 1/4 or 1/8 scale (DCT
+    scaling), so a 12 MP phone photo is never fully decoded.
+    """
+    if image.format == "JPEG":
+        image.draft("RGB", target_size)
+    # Only rotate when the camera actually recorded a non-default orientation;
+    # exif_transpose() would otherwise still return a full copy
+    if image.getexif().get(EXIF_ORIENTATION, 1) != 1:
+        image = ImageOps.exif_transpose(image)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    return image
+
+
+def resize(image: Image.Image, target_size=(IMG_SIZE, IMG_SIZE)) -> Image.Image:
+    if image.size == tuple(target_size):
+        return image
+    return image.resize(target_size, RESAMPLE, reducing_gap=REDUCING_GAP)
+
+
+def normalize(pixels: np.ndarray) -> np.ndarray:
+    """uint8 [0, 255] -> float32 [0, 1] in one pass, no float64 intermediate"""
+    return np.multiply(pixels, _SCALE, dtype=np.float32)
+
+
+def load_image(source, target_size=(IMG_SIZE, IMG_SIZE)) -> np.ndarray:
+    """Decode and resize to a uint8 (H, W, 3) array"""
+    image = resize(decode(open_image(source), target_size), target_size)
+    return np.asarray(image, dtype=np.uint8)
+
+
+def preprocess(source, target_size=(IMG_SIZE, IMG_SIZE)) -> np.ndarray:
+    """Bytes/path/file -> float32 (H, W, 3) model input in [0, 1]"""
+    return normalize(load_image(source, target_size))
+
+
+def preprocess_pil(image: Image.Image, target_size=(IMG_SIZE, IMG_SIZE)) -> np.ndarray:
+    """Same as preprocess() for an image that is already open"""
+    pixels = np.asarray(resize(decode(image, target_size), target_size), dtype=np.uint8)
+    return normalize(pixels)
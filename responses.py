@@ -0,0 +1,114 @@
+# responses.py - prediction responses serialized from precomputed bytes
+# Everything in a /predict response except confidence, risk level and the
+# top-3 list depends only on the predicted class, so it is encoded once per
+# class at startup. Per request only a few numbers are formatted and joined
+# with the cached byte segments; the output is identical to json.dumps of
+# the full dict.
+import json
+
+import numpy as np
+from starlette.responses import Response
+
+from utils import get_risk_level
+
+try:
+    import orjson
+except ImportError:  # optional, stdlib json is used without it
+    orjson = None
+
+# Used when a class has no entry in DISEASE_DATABASE
+UNKNOWN_DISEASE = {
+    "description": "Disease information not available",
+    "severity": "Unknown",
+    "treatment": {
+        "chemical": "Consult agricultural expert",
+        "organic": "Maintain plant hygiene",
+        "frequency": "As needed"
+    },
+    "prevention": ["Regular monitoring"],
+    "cultural_practices": ["Good sanitation"]
+}
+
+
+def dumps(content) -> bytes:
+    """Compact JSON bytes, with orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def _encode(value) -> bytes:
+    # Static segments use the stdlib encoder so they match JSONResponse byte for byte
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _number(value: float) -> bytes:
+    return repr(round(float(value), 2)).encode()
+
+
+class FastJSONResponse(Response):
+    """JSON response that passes bytes through untouched and encodes anything else with dumps()"""
+
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return dumps(content)
+
+
+class PredictionRenderer:
+    """Serialize prediction responses from per-class byte segments built once"""
+
+    def __init__(self, class_names: dict, database: dict, model_version: str):
+        self.class_names = {int(idx): name for idx, name in class_names.items()}
+        self._head = {}      # '{"success":true,...,"confidence":'
+        self._middle = {}    # ',"description":...,"top_3_predictions":'
+        self._severity = {}
+        self._top3_item = {}  # '{"disease":"...","confidence":'
+        for idx, name in self.class_names.items():
+            info = database.get(name, {"disease_name": name, **UNKNOWN_DISEASE})
+            self._head[idx] = (b'{"success":true,"predicted_class":' + _encode(name)
+                               + b',"disease":' + _encode(info["disease_name"]) + b',"confidence":')
+            self._middle[idx] = (b',"description":' + _encode(info["description"])
+                                 + b',"severity":' + _encode(info["severity"])
+                                 + b',"treatment":' + _encode(info["treatment"])
+                                 + b',"prevention":' + _encode(info["prevention"])
+                                 + b',"cultural_practices":' + _encode(info["cultural_practices"])
+                                 + b',"top_3_predictions":')
+            self._severity[idx] = info.get("severity", "Unknown")
+            self._top3_item[idx] = b'{"disease":' + _encode(name) + b',"confidence":'
+        self._tail = b',"model_version":' + _encode(model_version) + b',"timestamp":null}'
+        self._risk_levels = {level: b',"risk_level":' + _encode(level)
+                             for level in ("NONE", "LOW", "MEDIUM", "HIGH", "CRITICAL")}
+
+    def render(self, probabilities: np.ndarray, filename=None) -> tuple[str, bytes]:
+        """
+        (predicted class, JSON bytes) for one row of class probabilities.
+        With a filename the object starts with a "filename" field, as in
+        /predict/batch results.
+        """
+        percent = np.asarray(probabilities, dtype=np.float64) * 100
+        top_3 = np.argsort(percent)[-3:][::-1]
+        predicted_idx = int(np.argmax(percent))
+        confidence = float(percent[predicted_idx])
+        risk_level = get_risk_level(confidence, self._severity[predicted_idx])
+
+        parts = [self._head[predicted_idx], _number(confidence), self._risk_levels[risk_level],
+                 self._middle[predicted_idx], b"["]
+        for n, i in enumerate(top_3):
+            if n:
+                parts.append(b",")
+            parts += [self._top3_item[int(i)], _number(percent[i]), b"}"]
+        parts += [b"]", self._tail]
+
+        body = b"".join(parts)
+        if filename is not None:
+            body = b'{"filename":' + _encode(filename) + b"," + body[1:]
+        return self.class_names[predicted_idx], body
+
+
+def join_batch(results: list, **fields) -> bytes:
+    """{...fields, "results": [...]} where each result is JSON bytes or a dict"""
+    items = b",".join(r if isinstance(r, bytes) else _encode(r) for r in results)
+    return dumps(fields)[:-1] + b',"results":[' + items + b"]}"
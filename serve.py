@@ -0,0 +1,188 @@
+# serve.py - pre-fork multi-process API server
+# Usage: python serve.py --workers 4 [--port 8001] [--threads-per-worker 2]
+#
+# The master binds the port and imports the heavy libraries once, then forks
+# workers that inherit them copy-on-write. With the TFLite backend every
+# worker's interpreter memory-maps the same .tflite file, so the weights sit
+# in the page cache once instead of once per worker. Each worker is pinned
+# to its own CPUs and its thread pools are sized to them, so N workers never
+# run more compute threads than the node has cores.
+import argparse
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+# Knobs read by numpy/BLAS, TensorFlow and config.py, set per worker before import
+THREAD_ENV_VARS = (
+    "OMP_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "TF_NUM_INTRAOP_THREADS",
+    "KRISHI_TFLITE_THREADS",
+)
+
+
+def cpu_slices(workers):
+    """Split the CPUs this process may use into one contiguous slice per worker"""
+    cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else list(range(os.cpu_count() or 1))
+    per_worker = max(1, len(cpus) // workers)
+    slices = []
+    for i in range(workers):
+        start = (i * per_worker) % len(cpus)
+        slices.append(cpus[start:start + per_worker])
+    return slices
+
+
+def resolve_model():
+    """
+    Registry entry the workers will serve, looked up in a child process.
+    config.py reads the thread counts at import, so the master must not
+    import it: forked workers would inherit the master's values instead
+    of the ones run_worker sets for them.
+    """
+    script = (
+        "import json, config\n"
+        "from model_registry import open_registry\n"
+        "print(json.dumps(open_registry().resolve(config.MODEL_VERSION or None)))\n"
+    )
+    # Same working directory as the workers, so relative paths resolve alike;
+    # only the imports come from this script's directory
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [here, os.environ.get("PYTHONPATH")]))}
+    result = subprocess.run([sys.executable, "-c", script], env=env, stdout=subprocess.PIPE, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def preload(backend):
+    """Import everything workers need before forking so those pages are shared"""
+    import numpy  # noqa: F401
+    import PIL.Image  # noqa: F401
+    import fastapi  # noqa: F401
+    import uvicorn  # noqa: F401
+
+    if backend == "tflite":
+        try:
+            import tflite_runtime.interpreter  # noqa: F401
+        except ImportError:
+            # Importing TensorFlow is fork-safe; creating tensors is not,
+            # so the model itself is only loaded inside the workers
+            import tensorflow  # noqa: F401
+
+
+def warm_page_cache(model_path):
+    """Read the model file once so every worker's mmap hits the same cached pages"""
+    with open(model_path, "rb") as f:
+        while f.read(1 << 20):
+            pass
+
+
+def run_worker(index, sock, cpus, threads, args):
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpus)
+    for name in THREAD_ENV_VARS:
+        os.environ[name] = str(threads)
+    os.environ["TF_NUM_INTEROP_THREADS"] = "1"
+    os.environ.setdefault("KRISHI_DECODE_WORKERS", str(threads))
+
+    import uvicorn
+    from app import app
+
+    print(f"  worker {index} (pid {os.getpid()}): cpus={cpus} threads={threads}")
+    config = uvicorn.Config(app, log_level=args.log_level, access_log=False)
+    server = uvicorn.Server(config)
+    server.run(sockets=[sock])
+
+
+def spawn(index, sock, cpus, threads, args):
+    pid = os.fork()
+    if pid == 0:
+        # Own process group: Ctrl+C reaches only the master, which then sends
+        # each worker a single SIGTERM for a graceful uvicorn shutdown
+        os.setpgid(0, 0)
+        try:
+            run_worker(index, sock, cpus, threads, args)
+        finally:
+            os._exit(0)
+    return pid
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-fork multi-process API server")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads-per-worker", type=int, default=None,
+                        help="compute threads per worker (default: CPUs / workers)")
+    parser.add_argument("--log-level", default="warning")
+    args = parser.parse_args()
+
+    # Inherited by the lookup below and by every worker
+    os.environ.setdefault("KRISHI_MODEL_BACKEND", "tflite")
+
+    # Workers load this version themselves and follow later swaps through active.json
+    model = resolve_model()
+    backend = model["backend"]
+
+    slices = cpu_slices(args.workers)
+    threads = args.threads_per_worker or len(slices[0])
+
+    print("=" * 60)
+    print("STARTING PRE-FORK TOMATO DISEASE DETECTION API SERVER")
+    print("=" * 60)
+    print(f"Model: {model['version']} ({backend}: {model['model_path']})")
+    print(f"Workers: {args.workers} x {threads} threads on http://{args.host}:{args.port}")
+    if backend != "tflite":
+        print("⚠ Keras weights are copied into each worker's TensorFlow runtime and are")
+        print("  not shared; export with export_tflite.py to share them between workers.")
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    preload(backend)
+    if backend == "tflite" and os.path.exists(model["model_path"]):
+        warm_page_cache(model["model_path"])
+
+    workers = {}
+    for i in range(args.workers):
+        workers[spawn(i, sock, slices[i], threads, args)] = i
+    print("=" * 60)
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    # Restart workers that die, until asked to stop
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        index = workers.pop(pid, None)
+        if index is None or stopping:
+            continue
+        print(f"✗ worker {index} (pid {pid}) exited with status {status}, restarting")
+        time.sleep(1)
+        workers[spawn(index, sock, slices[index], threads, args)] = index
+
+    sock.close()
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
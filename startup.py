@@ -0,0 +1,64 @@
+# startup.py - model loading, warm-up and readiness tracking for the API
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+
+class StartupState:
+    """
+    Records how long each startup phase took and whether the API is ready.
+
+    Liveness (/health) only needs the process to be up; readiness (/ready)
+    flips to True once the model is loaded AND warmed up, so a load
+    balancer never routes traffic to a cold replica.
+    """
+
+    def __init__(self):
+        self.phases = {}    # phase name -> milliseconds, in the order they ran
+        self.warmup = {}    # batch size -> milliseconds per warm-up round
+        self.ready = False
+        self.error = None
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = round((time.perf_counter() - start) * 1000, 2)
+
+    def mark_ready(self):
+        self.ready = True
+        self.phases["total"] = round((time.perf_counter() - self._started) * 1000, 2)
+
+    def fail(self, error):
+        self.ready = False
+        self.error = f"{type(error).__name__}: {error}"
+
+    def report(self):
+        return {
+            "ready": self.ready,
+            "error": self.error,
+            "phases_ms": dict(self.phases),
+            "warmup_ms": {str(size): times for size, times in self.warmup.items()},
+        }
+
+
+def warm_up(predict_fn, batch_sizes, img_size=224, rounds=2):
+    """
+    Run synthetic batches at every size we serve so graph tracing, kernel
+    selection and tensor allocation happen before real traffic arrives.
+    Returns {batch_size: [ms per round]}.
+    """
+    rng = np.random.default_rng(0)
+    timings = {}
+    for batch_size in batch_sizes:
+        images = rng.random((batch_size, img_size, img_size, 3), dtype=np.float32)
+        timings[batch_size] = []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            predict_fn(images)
+            timings[batch_size].append(round((time.perf_counter() - start) * 1000, 2))
+    return timings
@@ -0,0 +1,237 @@
+# streaming.py - live camera-frame scanning over a WebSocket
+# The phone sends compressed frames as fast as it likes. The server keeps
+# only the newest frame it has not started on, so a slow model or a burst
+# of frames drops stale frames instead of building a backlog. A frame that
+# looks like the last scored one (its difference hash is within a few bits)
+# is skipped. The rest go through the model's micro-batcher, sharing forward
+# passes with every other stream and /predict upload, and each result is
+# pushed back with its confidence smoothed over the recent frames.
+import asyncio
+import json
+import time
+from collections import Counter
+
+import numpy as np
+from starlette.websockets import WebSocketState
+
+from batching import QueueFullError
+from gate import ImageRejected
+from metrics import STREAM_FRAMES
+
+HASH_SIZE = 8  # 8x8 gradient bits = 64-bit hash
+
+
+def dhash(pixels, size=HASH_SIZE) -> int:
+    """
+    Difference hash of an (H, W, 3) image: block-average the grey image
+    down to size x (size + 1) and record whether each block is brighter
+    than its left neighbour. Small shakes and exposure changes flip few
+    bits; a new scene flips about half of them.
+    """
+    grey = np.asarray(pixels, dtype=np.float32).mean(axis=2)
+    rows = np.linspace(0, grey.shape[0], size + 1).astype(int)
+    cols = np.linspace(0, grey.shape[1], size + 2).astype(int)
+    sums = np.add.reduceat(np.add.reduceat(grey, rows[:-1], axis=0), cols[:-1], axis=1)
+    blocks = sums / np.outer(np.diff(rows), np.diff(cols))
+    bits = (blocks[:, 1:] > blocks[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+class LatestFrame:
+    """One-slot mailbox between the socket reader and the scorer: put() replaces an unread frame"""
+
+    def __init__(self):
+        self.frame = None
+        self.dropped = 0
+        self.closed = False
+        self._ready = asyncio.Event()
+
+    def put(self, frame):
+        if self.frame is not None:
+            self.dropped += 1
+            STREAM_FRAMES.inc("dropped")
+        self.frame = frame
+        self._ready.set()
+
+    def close(self):
+        self.closed = True
+        self._ready.set()
+
+    async def get(self):
+        """Newest frame, or None once the reader has closed and nothing is left"""
+        while self.frame is None:
+            if self.closed:
+                return None
+            self._ready.clear()
+            await self._ready.wait()
+        frame, self.frame = self.frame, None
+        return frame
+
+
+class ConfidenceSmoother:
+    """Exponential moving average of class probabilities over the frames of one scene"""
+
+    def __init__(self, weight):
+        self.weight = weight  # share of the newest frame
+        self.state = None
+        self.frames = 0
+
+    def reset(self):
+        self.state = None
+        self.frames = 0
+
+    def update(self, probabilities):
+        probabilities = np.asarray(probabilities, dtype=np.float64)
+        if self.state is None or self.state.shape != probabilities.shape:
+            self.state = probabilities.copy()
+            self.frames = 0
+        else:
+            self.state = self.weight * probabilities + (1 - self.weight) * self.state
+        self.frames += 1
+        return self.state
+
+
+class StreamSession:
+    """
+    One WebSocket scanning session.
+
+    decode(bytes) -> (pixels, hash) and predict(pixels) -> (model, probabilities)
+    are coroutines supplied by the app, so frames use the same gate, decode
+    pool and batching queue as uploads. Binary messages are frames; every
+    scored frame is answered with a JSON "prediction" message, rejected or
+    unreadable frames with "rejected" / "error", and skipped or dropped
+    frames only show up in the counters.
+    """
+
+    def __init__(self, websocket, decode, predict, max_frame_bytes, duplicate_distance=4,
+                 scene_change_distance=20, smoothing=0.3):
+        self.websocket = websocket
+        self.decode = decode
+        self.predict = predict
+        self.max_frame_bytes = max_frame_bytes
+        self.duplicate_distance = duplicate_distance
+        self.scene_change_distance = scene_change_distance
+        self.frames = LatestFrame()
+        self.smoother = ConfidenceSmoother(smoothing)
+        self.counts = Counter()   # received, scored, duplicate, rejected, failed
+        self.last_hash = None     # hash of the last scored frame
+        self.model_version = None
+
+    async def run(self):
+        receiver = asyncio.create_task(self._receive())
+        try:
+            await self._score()
+        finally:
+            receiver.cancel()
+
+    async def _receive(self):
+        try:
+            while True:
+                message = await self.websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    return
+                data = message.get("bytes")
+                if data is None:
+                    await self._send({"type": "error", "error": "Send frames as binary messages"})
+                    continue
+                if len(data) > self.max_frame_bytes:
+                    # 1009: message too big
+                    await self.websocket.close(code=1009, reason="Frame too large")
+                    return
+                self.counts["received"] += 1
+                STREAM_FRAMES.inc("received")
+                self.frames.put((self.counts["received"], data, time.perf_counter()))
+        finally:
+            self.frames.close()
+
+    async def _score(self):
+        while True:
+            frame = await self.frames.get()
+            if frame is None:
+                return
+            frame_id, data, received_at = frame
+
+            try:
+                pixels, frame_hash = await self.decode(data)
+            except ImageRejected as e:
+                self._count("rejected")
+                await self._send({"type": "rejected", "frame_id": frame_id, "error": str(e), "reason": e.reason})
+                continue
+            except Exception as e:
+                self._count("failed")
+                await self._send({"type": "error", "frame_id": frame_id, "error": f"Could not decode frame: {e}"})
+                continue
+
+            if self.last_hash is not None:
+                distance = hamming(frame_hash, self.last_hash)
+                if distance <= self.duplicate_distance:
+                    self._count("duplicate")
+                    continue
+                if distance >= self.scene_change_distance:
+                    self.smoother.reset()  # the camera moved to another plant
+
+            try:
+                model, probabilities = await self.predict(pixels)
+            except QueueFullError:
+                # The server is behind; a newer frame will come
+                self.frames.dropped += 1
+                STREAM_FRAMES.inc("dropped")
+                continue
+            except Exception as e:
+                self._count("failed")
+                await self._send({"type": "error", "frame_id": frame_id, "error": f"Prediction failed: {e}"})
+                continue
+
+            self.last_hash = frame_hash
+            if model.version != self.model_version:
+                self.smoother.reset()
+                self.model_version = model.version
+            self._count("scored")
+            await self._send(self._result(frame_id, model, probabilities, received_at))
+
+    def _count(self, outcome):
+        self.counts[outcome] += 1
+        STREAM_FRAMES.inc(outcome)
+
+    def _result(self, frame_id, model, probabilities, received_at) -> dict:
+        smoothed = self.smoother.update(probabilities)
+        ranked = np.argsort(smoothed)[::-1][:3]
+        frame_top = int(np.argmax(probabilities))
+        return {
+            "type": "prediction",
+            "frame_id": frame_id,
+            "model_version": model.version,
+            "predicted_class": model.class_names[str(int(ranked[0]))],
+            "confidence": round(float(smoothed[ranked[0]]), 4),
+            "smoothed_frames": self.smoother.frames,
+            "frame_prediction": {
+                "predicted_class": model.class_names[str(frame_top)],
+                "confidence": round(float(probabilities[frame_top]), 4),
+            },
+            "top3": [
+                {"class": model.class_names[str(int(i))], "confidence": round(float(smoothed[i]), 4)}
+                for i in ranked
+            ],
+            "latency_ms": round((time.perf_counter() - received_at) * 1000, 1),
+            "frames": self.stats(),
+        }
+
+    def stats(self) -> dict:
+        return {
+            "received": self.counts["received"],
+            "scored": self.counts["scored"],
+            "duplicate": self.counts["duplicate"],
+            "dropped": self.frames.dropped,
+            "rejected": self.counts["rejected"],
+            "failed": self.counts["failed"],
+        }
+
+    async def _send(self, message):
+        if (self.websocket.client_state != WebSocketState.CONNECTED
+                or self.websocket.application_state != WebSocketState.CONNECTED):
+            return  # the phone hung up while this frame was being scored
+        await self.websocket.send_text(json.dumps(message))
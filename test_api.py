@@ -2,7 +2,7 @@
 import requests
 import json
 
-API_URL = "http://localhost:8000/predict"
+API_URL = "http://localhost:8001/predict"
 
 def test_prediction(image_path):
     """Test the API with an image"""
@@ -1,10 +1,10 @@
 # test_model.py - COMPLETE TEST SCRIPT
 import tensorflow as tf
 import numpy as np
-from PIL import Image
 import json
 import os
 import glob
+from preprocessing import preprocess
 
 print("="*60)
 print("TESTING TRAINED TOMATO DISEASE MODEL")
@@ -36,14 +36,8 @@ for idx, name in class_names.items():
 
 def predict_image(image_path):
     """Predict disease from image"""
-    # Load image
-    img = Image.open(image_path).convert('RGB')
-    
-    # Resize to model input size
-    img = img.resize((224, 224))
-    
-    # Convert to array and normalize
-    img_array = np.array(img) / 255.0
+    # Load, resize and normalize exactly like the API does
+    img_array = preprocess(image_path)
     
     # Add batch dimension
     img_array = np.expand_dims(img_array, axis=0)
@@ -0,0 +1,121 @@
+# tiling.py - tiled analysis of high-resolution field and drone photos
+# Instead of squashing a whole bed into one 224x224 input, overlapping
+# 224x224 windows are cut from the full-resolution image. Background and
+# soil windows are dropped first with the gate's green-pixel test, computed
+# for every window at once from an integral image. The remaining windows
+# are copied into one fixed-size batch at a time, so memory stays bounded
+# however large the photo is. The result is a per-tile class grid, a
+# disease heatmap and field-level class proportions.
+import numpy as np
+
+from disease_info import DISEASE_DATABASE
+from preprocessing import normalize
+
+GREEN_SAMPLE_STEP = 4  # green test on every 4th pixel, as the gate samples too
+
+
+def tile_starts(length, tile, stride):
+    """Window offsets covering [0, length); the last window is aligned with the far edge"""
+    if length <= tile:
+        return [0]
+    starts = list(range(0, length - tile + 1, stride))
+    if starts[-1] != length - tile:
+        starts.append(length - tile)
+    return starts
+
+
+class TileGrid:
+    """Overlapping tile x tile windows over an (H, W, 3) image, as a rows x cols grid"""
+
+    def __init__(self, height, width, tile=224, overlap=0.5):
+        self.tile = tile
+        self.stride = max(1, int(round(tile * (1 - overlap))))
+        self.ys = np.array(tile_starts(height, tile, self.stride))
+        self.xs = np.array(tile_starts(width, tile, self.stride))
+
+    @property
+    def shape(self):
+        return len(self.ys), len(self.xs)
+
+    def green_fractions(self, pixels, step=GREEN_SAMPLE_STEP):
+        """
+        Fraction of green pixels (green channel above red and blue, the
+        gate's test) in every window, from one integral image of the
+        sampled mask: four lookups per window instead of a pass over it.
+        """
+        sample = pixels[::step, ::step]
+        green = (sample[..., 1] > sample[..., 0]) & (sample[..., 1] > sample[..., 2])
+        integral = np.zeros((green.shape[0] + 1, green.shape[1] + 1), dtype=np.int32)
+        np.cumsum(np.cumsum(green, axis=0, dtype=np.int32), axis=1, out=integral[1:, 1:])
+
+        y0, y1 = -(-self.ys // step), -(-(self.ys + self.tile) // step)
+        x0, x1 = -(-self.xs // step), -(-(self.xs + self.tile) // step)
+        counts = (integral[np.ix_(y1, x1)] - integral[np.ix_(y0, x1)]
+                  - integral[np.ix_(y1, x0)] + integral[np.ix_(y0, x0)])
+        return counts / np.outer(y1 - y0, x1 - x0)
+
+    def batch(self, pixels, cells):
+        """float32 model input for the windows at [(row, col)], copied from the image"""
+        tiles = np.empty((len(cells), self.tile, self.tile, 3), dtype=np.uint8)
+        for n, (row, col) in enumerate(cells):
+            y, x = self.ys[row], self.xs[col]
+            tiles[n] = pixels[y:y + self.tile, x:x + self.tile]
+        return normalize(tiles)
+
+
+def is_healthy(class_name):
+    """Healthy classes have severity "None" in DISEASE_DATABASE (risk level NONE)"""
+    return DISEASE_DATABASE.get(class_name, {}).get("severity") == "None"
+
+
+def summarize(grid, cells, probabilities, class_names):
+    """
+    Response fields for the scored windows: class and confidence per tile
+    (null for background), a disease heatmap (1 - probability of the
+    healthy classes) and field-level proportions over the analyzed tiles
+    """
+    rows, cols = grid.shape
+    names = [class_names[str(i)] for i in range(len(class_names))]
+    healthy = np.array([is_healthy(name) for name in names])
+
+    class_grid = [[None] * cols for _ in range(rows)]
+    confidence_grid = [[None] * cols for _ in range(rows)]
+    heatmap = [[None] * cols for _ in range(rows)]
+    predicted = probabilities.argmax(axis=1) if len(cells) else np.zeros(0, dtype=int)
+    disease_scores = 1 - probabilities[:, healthy].sum(axis=1) if len(cells) else np.zeros(0)
+    for (row, col), idx, p, score in zip(cells, predicted, probabilities, disease_scores):
+        class_grid[row][col] = int(idx)
+        confidence_grid[row][col] = round(float(p[idx]) * 100, 2)
+        heatmap[row][col] = round(float(score), 4)
+
+    analyzed = len(cells)
+    counts = np.bincount(predicted, minlength=len(names))
+    mean_probability = probabilities.mean(axis=0) if analyzed else np.zeros(len(names))
+    proportions = {
+        name: {"tile_share": round(float(counts[i]) / analyzed, 4), "mean_probability": round(float(mean_probability[i]), 4)}
+        for i, name in enumerate(names) if counts[i] or mean_probability[i] >= 0.01
+    }
+    diseased = [i for i in np.argsort(-counts) if counts[i] and not healthy[i]]
+    dominant = None
+    if diseased:
+        name = names[diseased[0]]
+        info = DISEASE_DATABASE.get(name, {"disease_name": name, "severity": "Unknown"})
+        dominant = {"predicted_class": name, "disease": info["disease_name"], "severity": info["severity"],
+                    "tile_share": round(float(counts[diseased[0]]) / analyzed, 4)}
+
+    return {
+        "grid": {
+            "rows": rows,
+            "cols": cols,
+            "classes": names,
+            "class_index": class_grid,
+            "confidence": confidence_grid,
+            "heatmap": heatmap,
+        },
+        "field_summary": {
+            "analyzed_tiles": analyzed,
+            "affected_share": round(float(counts[~healthy].sum()) / analyzed, 4) if analyzed else 0.0,
+            "dominant_disease": dominant,
+            "proportions": proportions,
+        },
+    }
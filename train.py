@@ -2,7 +2,7 @@
 import tensorflow as tf
 from tensorflow.keras import layers, models
 from tensorflow.keras.applications import MobileNetV2
-from tensorflow.keras.preprocessing.image import ImageDataGenerator
+from data_pipeline import load_datasets, make_augmenter
 import json
 import os
 
@@ -11,6 +11,7 @@ DATASET_PATH = 'dataset'  # Your 12000 images folder
 IMG_SIZE = 224
 BATCH_SIZE = 32
 EPOCHS = 15  # Can increase for better accuracy
+COMPILED_PATH = 'dataset_compiled'  # Used instead when dataset_compiler.py has been run
 
 print("=" * 50)
 print("TOMATO DISEASE DETECTION - MODEL TRAINING")
@@ -22,9 +23,8 @@ if not os.path.exists(DATASET_PATH):
     print("Please create the dataset folder and organize images by disease class.")
     exit(1)
 
-# Data Augmentation
-train_datagen = ImageDataGenerator(
-    rescale=1./255,
+# Data Augmentation (applied per batch on the tf.data workers)
+augment = make_augmenter(
     rotation_range=20,
     width_shift_range=0.2,
     height_shift_range=0.2,
@@ -32,35 +32,21 @@ train_datagen = ImageDataGenerator(
     zoom_range=0.2,
     horizontal_flip=True,
     vertical_flip=True,
-    fill_mode='nearest',
-    validation_split=0.2  # 80% train, 20% validation
+    fill_mode='nearest'
 )
 
-# Training data
+# Training and validation data (80% train, 20% validation; validation is not augmented)
 print("\nLoading training data...")
-train_generator = train_datagen.flow_from_directory(
+class_names, (train_dataset, train_labels), (validation_dataset, val_labels) = load_datasets(
     DATASET_PATH,
-    target_size=(IMG_SIZE, IMG_SIZE),
     batch_size=BATCH_SIZE,
-    class_mode='categorical',
-    subset='training',
-    shuffle=True
-)
-
-# Validation data
-print("Loading validation data...")
-validation_generator = train_datagen.flow_from_directory(
-    DATASET_PATH,
-    target_size=(IMG_SIZE, IMG_SIZE),
-    batch_size=BATCH_SIZE,
-    class_mode='categorical',
-    subset='validation',
-    shuffle=False
+    augment=augment,
+    validation_split=0.2,
+    compiled_path=COMPILED_PATH,
+    img_size=IMG_SIZE
 )
 
 # Save class names
-class_indices = train_generator.class_indices
-class_names = {v: k for k, v in class_indices.items()}
 
 os.makedirs('models', exist_ok=True)
 with open('models/class_names.json', 'w') as f:
@@ -70,8 +56,8 @@ print(f"\n✓ Found {len(class_names)} disease classes:")
 for idx, name in class_names.items():
     print(f"  {idx}: {name}")
 
-print(f"\n✓ Training samples: {train_generator.samples}")
-print(f"✓ Validation samples: {validation_generator.samples}")
+print(f"\n✓ Training samples: {len(train_labels)}")
+print(f"✓ Validation samples: {len(val_labels)}")
 
 # Build model with Transfer Learning
 print("\nBuilding model with MobileNetV2...")
@@ -128,8 +114,8 @@ print("\nStarting training...")
 print("=" * 50)
 
 history = model.fit(
-    train_generator,
-    validation_data=validation_generator,
+    train_dataset,
+    validation_data=validation_dataset,
     epochs=EPOCHS,
     callbacks=callbacks,
     verbose=1
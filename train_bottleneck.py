@@ -0,0 +1,140 @@
+# train_bottleneck.py - train the head on cached MobileNetV2 features
+# Same model as train.py, but the frozen base runs once per image (and per
+# augmented view) instead of once per epoch. Later runs with the same dataset
+# and base weights reuse the cached features and train in seconds.
+#
+# A narrower, lower-resolution network for the cascade backend's first stage:
+#     python train_bottleneck.py --alpha 0.35 --img-size 128 --output models/fast_model.h5
+import argparse
+import tensorflow as tf
+from check_dataset import MANIFEST_PATH, load_manifest, load_split
+from feature_cache import assemble, build_base_model, build_head, compute_features
+import numpy as np
+import json
+import os
+
+# Configuration
+DATASET_PATH = 'dataset'
+IMG_SIZE = 224
+BATCH_SIZE = 64
+EPOCHS = 50  # Epochs over features are cheap; early stopping ends training
+AUGMENTED_VIEWS = 4  # Fixed augmented copies per training image (0 = none)
+FEATURE_CACHE_DIR = 'models/feature_cache'
+
+# train.py's augmentation settings
+AUGMENTATION = dict(
+    rotation_range=20,
+    width_shift_range=0.2,
+    height_shift_range=0.2,
+    shear_range=0.2,
+    zoom_range=0.2,
+    horizontal_flip=True,
+    vertical_flip=True,
+    fill_mode='nearest'
+)
+
+parser = argparse.ArgumentParser(description="Train the classifier head on cached MobileNetV2 features")
+parser.add_argument('--alpha', type=float, default=1.0, help="MobileNetV2 width multiplier (0.35, 0.5, 0.75, 1.0)")
+parser.add_argument('--img-size', type=int, default=IMG_SIZE,
+                    help="base input resolution; the saved model still takes 224x224 images")
+parser.add_argument('--output', default=None,
+                    help="save only this file instead of models/best_model.h5 and models/tomato_model.h5")
+args = parser.parse_args()
+
+print("=" * 50)
+print("TOMATO DISEASE DETECTION - BOTTLENECK TRAINING")
+print("=" * 50)
+print(f"Base: MobileNetV2 alpha={args.alpha} at {args.img_size}x{args.img_size}")
+
+if not os.path.exists(DATASET_PATH):
+    print(f"ERROR: Dataset folder '{DATASET_PATH}' not found!")
+    exit(1)
+
+# Split pinned by check_dataset.py's manifest (80/20 per class without one)
+class_names, (train_files, train_labels), (val_files, val_labels) = load_split(
+    DATASET_PATH, MANIFEST_PATH, validation_split=0.2
+)
+manifest = load_manifest(MANIFEST_PATH)
+num_classes = len(class_names)
+
+os.makedirs('models', exist_ok=True)
+with open('models/class_names.json', 'w') as f:
+    json.dump(class_names, f, indent=2)
+
+print(f"\n✓ Found {num_classes} disease classes")
+print(f"✓ Training samples: {len(train_files)} x {AUGMENTED_VIEWS + 1} views")
+print(f"✓ Validation samples: {len(val_files)}")
+
+# Features (computed once, then read from the memory-mapped cache)
+print("\nExtracting training features...")
+base_model = build_base_model(args.img_size, alpha=args.alpha)
+train_features = compute_features(
+    base_model, train_files, train_labels,
+    cache_dir=FEATURE_CACHE_DIR,
+    views=AUGMENTED_VIEWS,
+    augmentation=AUGMENTATION,
+    img_size=args.img_size,
+    manifest=manifest
+)
+print("Extracting validation features...")
+val_features = compute_features(
+    base_model, val_files, val_labels,
+    cache_dir=FEATURE_CACHE_DIR,
+    img_size=args.img_size,
+    manifest=manifest
+)
+
+# Every view of an image keeps the image's label
+x_train = train_features.reshape(-1, train_features.shape[-1])
+y_train = tf.keras.utils.to_categorical(np.tile(train_labels, AUGMENTED_VIEWS + 1), num_classes)
+x_val = val_features[0]
+y_val = tf.keras.utils.to_categorical(val_labels, num_classes)
+
+# Train the head
+head = build_head(num_classes)
+head.compile(
+    optimizer=tf.keras.optimizers.Adam(learning_rate=0.001),
+    loss='categorical_crossentropy',
+    metrics=['accuracy']
+)
+
+callbacks = [
+    tf.keras.callbacks.EarlyStopping(
+        monitor='val_loss',
+        patience=5,
+        restore_best_weights=True
+    ),
+    tf.keras.callbacks.ReduceLROnPlateau(
+        monitor='val_loss',
+        factor=0.5,
+        patience=3,
+        verbose=1
+    )
+]
+
+print("\nTraining head on features...")
+print("=" * 50)
+history = head.fit(
+    x_train, y_train,
+    validation_data=(x_val, y_val),
+    batch_size=BATCH_SIZE,
+    epochs=EPOCHS,
+    shuffle=True,
+    callbacks=callbacks,
+    verbose=2
+)
+
+# Put the base back in front of the head and save the deployable model
+model = assemble(base_model, head, input_size=IMG_SIZE)
+model.compile(optimizer='adam', loss='categorical_crossentropy', metrics=['accuracy'])
+saved = [args.output] if args.output else ['models/best_model.h5', 'models/tomato_model.h5']
+for path in saved:
+    model.save(path)
+
+print("\n" + "=" * 50)
+print("TRAINING COMPLETE!")
+print("=" * 50)
+print(f"✓ Model saved to: {' and '.join(saved)}")
+print(f"✓ Feature cache: {FEATURE_CACHE_DIR}")
+print(f"✓ Best validation accuracy: {max(history.history['val_accuracy']):.2%}")
+print("=" * 50)
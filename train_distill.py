@@ -0,0 +1,267 @@
+# train_distill.py - distill the trained model into a smaller, faster student
+# Usage:
+#     python train_distill.py [--teacher models/best_model.h5] [--alpha 0.5] [--img-size 160]
+#
+# The student is a narrower MobileNetV2 at a lower resolution, built from
+# scratch (weights=None, so nothing is downloaded). It learns from the
+# teacher's temperature-softened probabilities plus the true labels. A
+# Resizing layer in front lets it take the same 224x224 input and
+# class_names.json as the teacher, so the saved .h5 is a drop-in model for
+# the API, model_registry.py or the cascade backend's fast stage.
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import tensorflow as tf
+from tensorflow.keras import layers, models
+from tensorflow.keras.applications import MobileNetV2
+
+from data_pipeline import load_datasets, make_augmenter
+
+# Configuration
+DATASET_PATH = 'dataset'
+IMG_SIZE = 224  # API input size, for teacher and student alike
+BATCH_SIZE = 32
+EPOCHS = 60  # Trained from scratch, so more epochs than train.py; early stopping ends it
+COMPILED_PATH = 'dataset_compiled'
+LATENCY_ROUNDS = 30
+
+
+class Distiller(tf.keras.Model):
+    """
+    Trains student (which outputs logits) against a frozen teacher (which
+    outputs probabilities). The loss is alpha * cross-entropy with the
+    labels + (1 - alpha) * T^2 * KL(teacher || student), both softened by
+    temperature T.
+    """
+
+    def __init__(self, student, teacher, temperature=4.0, alpha=0.3):
+        super().__init__()
+        self.student = student
+        self.teacher = teacher
+        self.temperature = temperature
+        self.alpha = alpha
+        self.loss_tracker = tf.keras.metrics.Mean(name="loss")
+        self.accuracy = tf.keras.metrics.CategoricalAccuracy(name="accuracy")
+
+    @property
+    def metrics(self):
+        return [self.loss_tracker, self.accuracy]
+
+    def soften(self, probabilities):
+        # Teacher logits are log-probabilities up to a constant, which softmax ignores
+        return tf.nn.softmax(tf.math.log(probabilities + 1e-7) / self.temperature)
+
+    def train_step(self, data):
+        images, labels = data
+        soft_targets = self.soften(self.teacher(images, training=False))
+        with tf.GradientTape() as tape:
+            logits = self.student(images, training=True)
+            hard_loss = tf.keras.losses.categorical_crossentropy(labels, logits, from_logits=True)
+            soft_loss = tf.keras.losses.kl_divergence(soft_targets, tf.nn.softmax(logits / self.temperature))
+            loss = tf.reduce_mean(self.alpha * hard_loss
+                                  + (1 - self.alpha) * self.temperature ** 2 * soft_loss)
+        gradients = tape.gradient(loss, self.student.trainable_variables)
+        self.optimizer.apply_gradients(zip(gradients, self.student.trainable_variables))
+        self.loss_tracker.update_state(loss)
+        self.accuracy.update_state(labels, logits)
+        return {metric.name: metric.result() for metric in self.metrics}
+
+    def test_step(self, data):
+        images, labels = data
+        logits = self.student(images, training=False)
+        loss = tf.keras.losses.categorical_crossentropy(labels, logits, from_logits=True)
+        self.loss_tracker.update_state(tf.reduce_mean(loss))
+        self.accuracy.update_state(labels, logits)
+        return {metric.name: metric.result() for metric in self.metrics}
+
+    def call(self, images, training=False):
+        return self.student(images, training=training)
+
+
+def build_student(num_classes, alpha, img_size, input_size=IMG_SIZE, dropout=0.2):
+    """
+    (logits model for training, softmax model to deploy); both share the
+    same layers and take input_size images
+    """
+    inputs = layers.Input(shape=(input_size, input_size, 3))
+    x = layers.Resizing(img_size, img_size)(inputs) if img_size != input_size else inputs
+    base = MobileNetV2(input_shape=(img_size, img_size, 3), alpha=alpha, include_top=False, weights=None)
+    x = base(x)
+    x = layers.GlobalAveragePooling2D()(x)
+    x = layers.Dropout(dropout)(x)
+    logits = layers.Dense(num_classes, name='logits')(x)
+    probabilities = layers.Softmax(name='probabilities')(logits)
+    return models.Model(inputs, logits), models.Model(inputs, probabilities)
+
+
+def evaluate(model, dataset):
+    """Top-1 accuracy, top-3 accuracy and predicted classes over a dataset"""
+    predicted, top3_hits, labels = [], [], []
+    for images, one_hot in dataset:
+        probabilities = model(images, training=False).numpy()
+        truth = one_hot.numpy().argmax(axis=1)
+        predicted.append(probabilities.argmax(axis=1))
+        top3_hits.append((np.argsort(probabilities, axis=1)[:, -3:] == truth[:, None]).any(axis=1))
+        labels.append(truth)
+    predicted, labels = np.concatenate(predicted), np.concatenate(labels)
+    return float(np.mean(predicted == labels)), float(np.mean(np.concatenate(top3_hits))), predicted
+
+
+def cpu_latency(model_path):
+    """Median ms for one image and images/s at batch 32, through the API's Keras backend"""
+    from backends import KerasBackend
+
+    backend = KerasBackend(model_path, IMG_SIZE)
+    rng = np.random.default_rng(0)
+    single = rng.random((1, IMG_SIZE, IMG_SIZE, 3), dtype=np.float32)
+    batch = rng.random((32, IMG_SIZE, IMG_SIZE, 3), dtype=np.float32)
+    backend.predict(single)
+    backend.predict(batch)
+
+    times = []
+    for _ in range(LATENCY_ROUNDS):
+        start = time.perf_counter()
+        backend.predict(single)
+        times.append((time.perf_counter() - start) * 1000)
+    start = time.perf_counter()
+    for _ in range(5):
+        backend.predict(batch)
+    return float(np.median(times)), 5 * 32 / (time.perf_counter() - start)
+
+
+parser = argparse.ArgumentParser(description="Distill the trained model into a smaller student")
+parser.add_argument('--teacher', default='models/best_model.h5')
+parser.add_argument('--class-names', default='models/class_names.json', help="the teacher's class mapping")
+parser.add_argument('--alpha', type=float, default=0.5, help="student MobileNetV2 width multiplier")
+parser.add_argument('--img-size', type=int, default=160, help="student input resolution (e.g. 160 or 128)")
+parser.add_argument('--temperature', type=float, default=4.0)
+parser.add_argument('--hard-weight', type=float, default=0.3, help="weight of the true-label loss (rest: teacher)")
+parser.add_argument('--epochs', type=int, default=EPOCHS)
+parser.add_argument('--output', default='models/student_model.h5')
+parser.add_argument('--report', default='models/student_report.json')
+args = parser.parse_args()
+
+print("=" * 50)
+print("TOMATO DISEASE DETECTION - DISTILLATION TRAINING")
+print("=" * 50)
+
+if not os.path.exists(DATASET_PATH):
+    print(f"ERROR: Dataset folder '{DATASET_PATH}' not found!")
+    exit(1)
+if not os.path.exists(args.teacher):
+    print(f"ERROR: Teacher model '{args.teacher}' not found! Train it with train.py first.")
+    exit(1)
+
+augment = make_augmenter(
+    rotation_range=20,
+    width_shift_range=0.2,
+    height_shift_range=0.2,
+    shear_range=0.2,
+    zoom_range=0.2,
+    horizontal_flip=True,
+    vertical_flip=True,
+    fill_mode='nearest'
+)
+
+print("\nLoading training data...")
+class_names, (train_dataset, train_labels), (validation_dataset, val_labels) = load_datasets(
+    DATASET_PATH,
+    batch_size=BATCH_SIZE,
+    augment=augment,
+    validation_split=0.2,
+    compiled_path=COMPILED_PATH,
+    img_size=IMG_SIZE
+)
+
+# The student must answer with the teacher's class indices
+with open(args.class_names) as f:
+    teacher_classes = json.load(f)
+if {str(idx): name for idx, name in class_names.items()} != teacher_classes:
+    print(f"ERROR: Dataset classes differ from {args.class_names}; the student would not match the API's mapping.")
+    exit(1)
+
+print(f"✓ {len(class_names)} classes, {len(train_labels)} training / {len(val_labels)} validation images")
+
+teacher = tf.keras.models.load_model(args.teacher)
+teacher.trainable = False
+student_logits, student = build_student(len(class_names), args.alpha, args.img_size)
+print(f"✓ Teacher: {args.teacher} ({teacher.count_params():,} parameters)")
+print(f"✓ Student: MobileNetV2 alpha={args.alpha} at {args.img_size}x{args.img_size} "
+      f"({student.count_params():,} parameters, random init)")
+
+distiller = Distiller(student_logits, teacher, temperature=args.temperature, alpha=args.hard_weight)
+distiller.compile(optimizer=tf.keras.optimizers.Adam(learning_rate=0.001))
+
+callbacks = [
+    tf.keras.callbacks.EarlyStopping(
+        monitor='val_accuracy',
+        mode='max',
+        patience=8,
+        restore_best_weights=True
+    ),
+    tf.keras.callbacks.ReduceLROnPlateau(
+        monitor='val_loss',
+        factor=0.5,
+        patience=3,
+        verbose=1
+    )
+]
+
+print("\nDistilling...")
+print("=" * 50)
+history = distiller.fit(
+    train_dataset,
+    validation_data=validation_dataset,
+    epochs=args.epochs,
+    callbacks=callbacks,
+    verbose=1
+)
+
+os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+student.compile(optimizer='adam', loss='categorical_crossentropy', metrics=['accuracy'])
+student.save(args.output)
+
+# Teacher vs student on the validation split
+print("\nComparing teacher and student...")
+teacher_accuracy, teacher_top3, teacher_predicted = evaluate(teacher, validation_dataset)
+student_accuracy, student_top3, student_predicted = evaluate(student, validation_dataset)
+teacher_ms, teacher_throughput = cpu_latency(args.teacher)
+student_ms, student_throughput = cpu_latency(args.output)
+
+report = {
+    "student": {"alpha": args.alpha, "img_size": args.img_size, "temperature": args.temperature,
+                "hard_weight": args.hard_weight, "epochs": len(history.history['loss'])},
+    "agreement": float(np.mean(teacher_predicted == student_predicted)),
+    "models": {
+        name: {
+            "path": path,
+            "accuracy": accuracy,
+            "top3_accuracy": top3,
+            "parameters": int(model.count_params()),
+            "file_mb": os.path.getsize(path) / 1e6,
+            "latency_ms_batch1": ms,
+            "images_per_second_batch32": throughput,
+        }
+        for name, path, model, accuracy, top3, ms, throughput in (
+            ("teacher", args.teacher, teacher, teacher_accuracy, teacher_top3, teacher_ms, teacher_throughput),
+            ("student", args.output, student, student_accuracy, student_top3, student_ms, student_throughput),
+        )
+    },
+}
+with open(args.report, 'w') as f:
+    json.dump(report, f, indent=2)
+
+print("\n" + "=" * 50)
+print("DISTILLATION COMPLETE!")
+print("=" * 50)
+print(f"{'':8} {'top-1':>7} {'top-3':>7} {'params':>11} {'MB':>6} {'ms/img':>7} {'img/s':>7}")
+for name, r in report["models"].items():
+    print(f"{name:8} {r['accuracy']:7.2%} {r['top3_accuracy']:7.2%} {r['parameters']:11,} "
+          f"{r['file_mb']:6.1f} {r['latency_ms_batch1']:7.2f} {r['images_per_second_batch32']:7.1f}")
+print(f"Top-1 agreement with the teacher: {report['agreement']:.2%}")
+print(f"✓ Student saved to: {args.output} (same class_names.json as the teacher)")
+print(f"✓ Report saved to: {args.report}")
+print("=" * 50)
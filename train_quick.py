@@ -2,8 +2,8 @@
 import tensorflow as tf
 from tensorflow.keras import layers, models
 from tensorflow.keras.applications import MobileNetV2
-from tensorflow.keras.preprocessing.image import ImageDataGenerator
 from sklearn.utils import class_weight
+from data_pipeline import load_datasets, make_augmenter
 import numpy as np
 import json
 import os
@@ -12,53 +12,36 @@ DATASET_PATH = 'dataset'
 IMG_SIZE = 224
 BATCH_SIZE = 32
 EPOCHS = 10  # Quick training
+COMPILED_PATH = 'dataset_compiled'
 
 print("="*60)
 print("QUICK BALANCED TRAINING")
 print("="*60)
 
-# Data with augmentation
-train_datagen = ImageDataGenerator(
-    rescale=1./255,
-    rotation_range=20,
-    horizontal_flip=True,
-    validation_split=0.2
-)
-
-# Load data
-train_gen = train_datagen.flow_from_directory(
-    DATASET_PATH,
-    target_size=(IMG_SIZE, IMG_SIZE),
-    batch_size=BATCH_SIZE,
-    class_mode='categorical',
-    subset='training',
-    shuffle=True
-)
-
-val_gen = train_datagen.flow_from_directory(
+# Load data (with augmentation for training)
+class_names, (train_ds, train_labels), (val_ds, val_labels) = load_datasets(
     DATASET_PATH,
-    target_size=(IMG_SIZE, IMG_SIZE),
     batch_size=BATCH_SIZE,
-    class_mode='categorical',
-    subset='validation',
-    shuffle=False
+    augment=make_augmenter(rotation_range=20, horizontal_flip=True),
+    validation_split=0.2,
+    compiled_path=COMPILED_PATH,
+    img_size=IMG_SIZE
 )
 
 # Calculate class weights to handle imbalance
 class_weights = class_weight.compute_class_weight(
     'balanced',
-    classes=np.unique(train_gen.classes),
-    y=train_gen.classes
+    classes=np.unique(train_labels),
+    y=np.array(train_labels)
 )
 class_weight_dict = dict(enumerate(class_weights))
 
 print(f"\nClass weights (to balance dataset):")
 for idx, weight in class_weight_dict.items():
-    class_name = list(train_gen.class_indices.keys())[idx]
+    class_name = class_names[idx]
     print(f"  {class_name}: {weight:.2f}")
 
 # Save class names
-class_names = {v: k for k, v in train_gen.class_indices.items()}
 os.makedirs('models', exist_ok=True)
 with open('models/class_names.json', 'w') as f:
     json.dump(class_names, f, indent=2)
@@ -91,8 +74,8 @@ print("="*60)
 
 # Train with class weights
 history = model.fit(
-    train_gen,
-    validation_data=val_gen,
+    train_ds,
+    validation_data=val_ds,
     epochs=EPOCHS,
     class_weight=class_weight_dict,  # THIS FIXES IMBALANCE!
     callbacks=[
@@ -1,63 +1,41 @@
 # utils.py
+import io
+import os
+import tarfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
 import numpy as np
 from PIL import Image
+from gate import ImageGate, ImageRejected
+from preprocessing import preprocess_pil
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+_gate = ImageGate()
 
 def validate_plant_image(image: Image.Image) -> tuple[bool, str]:
     """
     Validate if uploaded image is likely a plant leaf
     Returns: (is_valid, error_message)
     """
-    # Check minimum size
-    if image.width < 50 or image.height < 50:
-        return False, "Image too small. Please upload a clearer image."
-    
-    # Check aspect ratio
-    aspect_ratio = max(image.width, image.height) / min(image.width, image.height)
-    if aspect_ratio > 10:
-        return False, "Image aspect ratio unusual. Please crop to show only the leaf."
-    
-    # Color validation - check for greenish tones
-    img_array = np.array(image.resize((100, 100)))
-    
-    if len(img_array.shape) == 3 and img_array.shape[2] >= 3:
-        green = img_array[:, :, 1]
-        red = img_array[:, :, 0]
-        blue = img_array[:, :, 2]
-        
-        # Count greenish pixels
-        green_pixels = np.sum((green > red) & (green > blue))
-        total_pixels = img_array.shape[0] * img_array.shape[1]
-        green_ratio = green_pixels / total_pixels
-        
-        # Plants should have at least some green
-        if green_ratio < 0.05:
-            return False, "Image doesn't appear to be a plant leaf. Please upload a tomato leaf image."
-    
+    # Same checks the API runs before inference (see gate.py)
+    try:
+        _gate.check(image)
+    except ImageRejected as e:
+        return False, str(e)
     return True, ""
 
 def preprocess_image(image: Image.Image, target_size=(224, 224)) -> np.ndarray:
     """
     Preprocess image for model prediction
+    Returns: float32 array of shape (1, H, W, 3) in [0, 1]
     """
-    # Resize
-    image = image.resize(target_size)
-    
-    # Convert to array
-    img_array = np.array(image)
-    
-    # Handle different image modes
-    if len(img_array.shape) == 2:  # Grayscale
-        img_array = np.stack([img_array] * 3, axis=-1)
-    elif img_array.shape[2] == 4:  # RGBA
-        img_array = img_array[:, :, :3]
-    
-    # Normalize to [0, 1]
-    img_array = img_array.astype('float32') / 255.0
+    # Same decode/resize/normalize path as the API (see preprocessing.py)
+    img_array = preprocess_pil(image, target_size)
     
     # Add batch dimension
-    img_array = np.expand_dims(img_array, axis=0)
-    
-    return img_array
+    return img_array[np.newaxis]
 
 def get_risk_level(confidence: float, severity: str) -> str:
     """Calculate risk level"""
@@ -71,3 +49,85 @@ def get_risk_level(confidence: float, severity: str) -> str:
         return "MEDIUM" if confidence > 70 else "LOW"
     else:
         return "LOW"
+
+def is_image_filename(name: str) -> bool:
+    """True for .jpg/.jpeg/.png files that are not hidden or macOS metadata"""
+    base = os.path.basename(name)
+    if not base or base.startswith('.') or '__MACOSX' in name:
+        return False
+    return base.lower().endswith(IMAGE_EXTENSIONS)
+
+def extract_archive_images(data: bytes, max_files: int, max_file_bytes: Optional[int] = None,
+                           max_total_bytes: Optional[int] = None) -> Optional[list[tuple[str, bytes]]]:
+    """
+    Unpack image files from a zip or tar archive held in memory
+    Returns: list of (filename, bytes), or None if data is not an archive
+    Raises: ValueError if the archive holds more than max_files images, or
+    an image larger than max_file_bytes or more than max_total_bytes in all
+    once uncompressed (checked from the headers, before anything is read)
+    """
+    buffer = io.BytesIO(data)
+    images = []
+    total = 0
+
+    def admit(name, size):
+        nonlocal total
+        if len(images) >= max_files:
+            raise ValueError(f"Archive contains more than {max_files} images")
+        if max_file_bytes is not None and size > max_file_bytes:
+            raise ValueError(f"{name} is larger than {max_file_bytes / (1024 * 1024):g} MB uncompressed")
+        total += size
+        if max_total_bytes is not None and total > max_total_bytes:
+            raise ValueError(f"Archive images are larger than {max_total_bytes / (1024 * 1024):g} MB uncompressed")
+
+    if zipfile.is_zipfile(buffer):
+        with zipfile.ZipFile(buffer) as archive:
+            for info in archive.infolist():
+                if info.is_dir() or not is_image_filename(info.filename):
+                    continue
+                # Reads stop at file_size, so the header bounds the memory used
+                admit(info.filename, info.file_size)
+                images.append((info.filename, archive.read(info)))
+        return images
+
+    buffer.seek(0)
+    try:
+        archive = tarfile.open(fileobj=buffer, mode='r:*')
+    except tarfile.TarError:
+        return None
+
+    with archive:
+        for member in archive:
+            if not member.isfile() or not is_image_filename(member.name):
+                continue
+            admit(member.name, member.size)
+            images.append((member.name, archive.extractfile(member).read()))
+    return images
+
+def _list_class(folder: str) -> list[str]:
+    with os.scandir(folder) as entries:
+        return sorted(e.name for e in entries if e.is_file() and is_image_filename(e.name))
+
+def list_image_files(dataset_path: str, validation_split: float = 0.2):
+    """
+    Scan class folders in parallel and split them like flow_from_directory:
+    classes in sorted order, and per class the first validation_split of the
+    sorted files go to validation, the rest to training.
+    Returns: class_names {index: name}, (train_files, train_labels), (val_files, val_labels)
+    """
+    classes = sorted(d.name for d in os.scandir(dataset_path) if d.is_dir())
+    folders = [os.path.join(dataset_path, name) for name in classes]
+    with ThreadPoolExecutor(max_workers=min(16, len(folders) or 1)) as pool:
+        listings = list(pool.map(_list_class, folders))
+
+    train_files, train_labels, val_files, val_labels = [], [], [], []
+    for label, (folder, files) in enumerate(zip(folders, listings)):
+        split = int(validation_split * len(files))
+        paths = [os.path.join(folder, f) for f in files]
+        val_files += paths[:split]
+        val_labels += [label] * split
+        train_files += paths[split:]
+        train_labels += [label] * (len(files) - split)
+
+    class_names = dict(enumerate(classes))
+    return class_names, (train_files, train_labels), (val_files, val_labels)